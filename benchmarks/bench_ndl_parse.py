@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+NDL OpenSearch応答のパース時間とピークメモリを計測するベンチマーク。
+
+従来方式（文字列全体を `ET.fromstring` してから `parse_xml_item`）と、
+逐次パーサー（`NDLStreamParser` に64KBずつ投入）を比較します。
+計測用のRSSは、実際の応答と同じ構造で生成したものを使用します。
+
+実行方法:
+    python benchmarks/bench_ndl_parse.py [item数] [説明文の文字数]
+"""
+
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+# リポジトリのルートをインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.ndl_parser import NAMESPACES, NDLStreamParser, parse_document  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+REPEAT = 20
+
+
+def build_rss(item_count: int, description_length: int) -> bytes:
+    """NDL OpenSearchと同じ構造のRSS文書を生成する。"""
+    items = []
+    for i in range(item_count):
+        description = escape(("国立国会図書館の資料説明文です。" * description_length)[:description_length])
+        items.append(f"""
+    <item>
+      <title>サンプル資料 {i}</title>
+      <link>https://iss.ndl.go.jp/books/R{i:09d}-I{i:09d}-00</link>
+      <description>{description}</description>
+      <author>著者 {i}</author>
+      <category>図書</category>
+      <guid isPermaLink="true">https://iss.ndl.go.jp/books/R{i:09d}-I{i:09d}-00</guid>
+      <pubDate>Mon, 01 Jan 2024 00:00:00 +0900</pubDate>
+      <dc:title>サンプル資料 {i}</dc:title>
+      <dc:creator>著者 {i}</dc:creator>
+      <dc:publisher>出版社 {i % 17}</dc:publisher>
+      <dc:subject>主題 {i % 5}</dc:subject>
+      <dcterms:issued>2024</dcterms:issued>
+      <rdfs:seeAlso rdf:resource="https://ndlsearch.ndl.go.jp/thumbnail/{i:013d}.jpg"/>
+    </item>""")
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:dc="{NAMESPACES['dc']}" xmlns:rdf="{NAMESPACES['rdf']}"
+     xmlns:rdfs="{NAMESPACES['rdfs']}" xmlns:openSearch="{NAMESPACES['openSearch']}"
+     xmlns:dcterms="http://purl.org/dc/terms/">
+  <channel>
+    <title>NDL Search</title>
+    <openSearch:totalResults>{item_count * 40}</openSearch:totalResults>
+    <openSearch:startIndex>1</openSearch:startIndex>
+    <openSearch:itemsPerPage>{item_count}</openSearch:itemsPerPage>{''.join(items)}
+  </channel>
+</rss>""".encode('utf-8')
+
+
+def parse_legacy(body: bytes):
+    """従来方式: 文字列にデコードして全体をツリー化してから抽出する。"""
+    return parse_document(body.decode('utf-8'))
+
+
+def parse_streaming(body: bytes):
+    """逐次方式: チャンクごとにパーサーへ投入する。"""
+    parser = NDLStreamParser()
+    for offset in range(0, len(body), CHUNK_SIZE):
+        parser.feed(body[offset:offset + CHUNK_SIZE])
+    return parser.close()
+
+
+def measure(label: str, func, body: bytes) -> None:
+    """パース時間の中央値、ピークメモリ、結果として保持されるメモリを表示する。"""
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(body)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+
+    tracemalloc.start()
+    result = func(body)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{label:<10} items={len(result[1]):>4}  "
+        f"median={timings[len(timings) // 2] * 1000:7.2f} ms  "
+        f"peak={peak / 1024:8.1f} KiB  retained={retained / 1024:8.1f} KiB"
+    )
+
+
+def main() -> None:
+    item_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    description_length = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    body = build_rss(item_count, description_length)
+    print(f"document size: {len(body) / 1024:.1f} KiB")
+
+    legacy_total, legacy_items = parse_legacy(body)
+    stream_total, stream_items = parse_streaming(body)
+    assert legacy_total == stream_total
+    assert legacy_items == [record.to_dict() for record in stream_items]
+
+    measure("legacy", parse_legacy, body)
+    measure("streaming", parse_streaming, body)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+RateLimiterのメモリ使用量と判定コストを計測するベンチマーク。
+
+10万人の異なるユーザーが1回ずつ発言した状況を再現し、
+旧実装（deque方式のスライディングウィンドウ）と比較します。
+
+実行方法:
+    python benchmarks/bench_rate_limiter.py [ユーザー数]
+"""
+
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from pathlib import Path
+
+# リポジトリのルートをインポートパスに追加
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.bot_utils import RateLimiter  # noqa: E402
+
+
+class LegacyRateLimiter:
+    """比較用: 旧実装のdeque方式スライディングウィンドウ。"""
+
+    def __init__(self, max_requests: int, window_seconds: int):
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.requests = defaultdict(deque)
+
+    def is_rate_limited(self, user_id: int, guild_id=None):
+        now = time.time()
+        user_reqs = self.requests[user_id]
+        while user_reqs and now - user_reqs[0] > self.window_seconds:
+            user_reqs.popleft()
+        if len(user_reqs) >= self.max_requests:
+            return True, int(self.window_seconds - (now - user_reqs[0])) + 1
+        user_reqs.append(now)
+        return False, 0
+
+
+def run(label: str, limiter, user_count: int, guild_count: int = 1000) -> None:
+    """指定ユーザー数で判定を実行し、メモリと1回あたりのコストを表示する。"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    start = time.perf_counter()
+    for user_id in range(user_count):
+        limiter.is_rate_limited(user_id, user_id % guild_count)
+    elapsed = time.perf_counter() - start
+
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f"{label:<28} users={user_count:>7}  "
+        f"mem={(after - before) / 1024 / 1024:7.2f} MiB  "
+        f"peak={(peak - before) / 1024 / 1024:7.2f} MiB  "
+        f"check={elapsed / user_count * 1e6:6.2f} us"
+    )
+
+
+def main() -> None:
+    user_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    run("legacy deque", LegacyRateLimiter(5, 60), user_count)
+    run("token bucket (user)", RateLimiter(5, 60), user_count)
+
+    tiered = RateLimiter(5, 60, guild_max_requests=10**9, global_max_requests=10**9)
+    run("token bucket (3 tiers)", tiered, user_count)
+
+    # スイープ: ウィンドウ経過後を想定し、全バケットが回収されることを確認する
+    start = time.perf_counter()
+    removed = tiered.sweep(time.monotonic() + tiered.window_seconds)
+    elapsed = time.perf_counter() - start
+    print(f"{'sweep after idle window':<28} removed={removed:>7}  time={elapsed * 1000:7.2f} ms  remaining={tiered.tracked_count()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,635 @@
+# -*- coding: utf-8 -*-
+"""
+`TRAFFIC_RECORD_DIR` で記録したトラフィックを再生し、コマンドごとの遅延とスループットを計測するツール。
+
+Discordには接続せず、記録されたメッセージを `AIDogBot.on_message` に、ボタンの操作と
+モーダルの送信を各Viewのコールバックに、記録と同じ間隔（`--speed` 倍速）で渡します。
+Ollamaと外部API（OpenWeatherMap・ホットペッパー・NDLサーチ）には、ローカルで起動した
+スタブのサーバーが一定の遅延で応答するため、ピーク時の負荷をオフラインで再現できます。
+会話履歴やクォータのDBは一時ディレクトリに作るため、本番のデータには触れません。
+
+実行方法:
+    python benchmarks/replay_traffic.py traffic/traffic_20240101_120000_pid4242.jsonl.gz
+    python benchmarks/replay_traffic.py 記録ファイル --speed 4 --ollama-delay 2.0
+    python benchmarks/replay_traffic.py 記録ファイル --speed 0    # 待たずに次々と投入する
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCHMARK_DIR.parent
+# リポジトリのルートをインポートパスに追加
+sys.path.insert(0, str(REPO_ROOT))
+
+from bench_ndl_parse import build_rss  # noqa: E402
+from utils.traffic_recorder import load_recording  # noqa: E402
+
+try:
+    import nextcord
+    from nextcord.ext import commands
+except ImportError:
+    nextcord = None
+
+logger = logging.getLogger(__name__)
+
+# スタブのOllamaが返す応答（おおよそ実際の応答の長さ）
+STUB_RESPONSE = "わん！ご主人様、その件については次のように考えられます。" * 8
+# 全イベントの投入後、バックグラウンドの処理（先読みなど）が落ち着くまで待つ秒数
+SETTLE_SECONDS = 1.0
+# ホットペッパーAPIが返すContent-Type (GourmetCog.API_CONTENT_TYPE と同じ、空白なし)
+HOTPEPPER_CONTENT_TYPE = 'text/javascript;charset=utf-8'
+
+# 処理中のイベントで記録されたエラーログ。イベントから作られたタスクにも引き継がれる
+_current_event_errors: ContextVar[Optional[List[str]]] = ContextVar('replay_event_errors', default=None)
+
+
+class EventErrorCounter(logging.Handler):
+    """
+    再生中のイベントの処理でログに記録されたエラーを、そのイベントに結び付けるハンドラ。
+
+    Cogはエラーを捕まえてログとエラーの返信で済ませるため、例外だけでは失敗を数えられない。
+    """
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if (errors := _current_event_errors.get()) is not None:
+            errors.append(record.getMessage())
+
+
+# --- スタブのサーバー ---
+class StubServer:
+    """OllamaとBotが使う外部APIの代わりに応答する、ローカルのHTTPサーバー。"""
+
+    def __init__(self, ollama_delay: float, http_delay: float):
+        self.ollama_delay = ollama_delay
+        self.http_delay = http_delay
+        self.base_url = ""
+        self.requests: Counter = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self._ndl_documents: Dict[int, bytes] = {}
+
+    async def start(self) -> str:
+        """空いているポートでサーバーを起動し、ベースURLを返す。"""
+        app = web.Application()
+        app.router.add_get('/', self._ollama_root)
+        app.router.add_post('/api/generate', self._ollama_generate)
+        app.router.add_get('/weather', self._weather)
+        app.router.add_get('/hotpepper/', self._hotpepper)
+        app.router.add_get('/ndl', self._ndl)
+        app.router.add_route('*', '/thumbnail/{name}', self._thumbnail)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        await web.SockSite(self._runner, sock).start()
+        self.base_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _ollama_root(self, request: web.Request) -> web.Response:
+        self.requests['ollama /'] += 1
+        return web.Response(text="Ollama is running")
+
+    async def _ollama_generate(self, request: web.Request) -> web.Response:
+        self.requests['ollama /api/generate'] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.ollama_delay)
+        return web.json_response({
+            'model': payload.get('model'),
+            'response': STUB_RESPONSE,
+            'done': True,
+            'prompt_eval_count': len(payload.get('prompt', '')) // 2,
+            'eval_count': len(STUB_RESPONSE),
+            'total_duration': int(self.ollama_delay * 1e9),
+        })
+
+    async def _weather(self, request: web.Request) -> web.Response:
+        self.requests['openweathermap'] += 1
+        await asyncio.sleep(self.http_delay)
+        return web.json_response({
+            'name': request.query.get('q', '東京'),
+            'dt': int(time.time()),
+            'weather': [{'description': '晴れ', 'icon': '01d'}],
+            'main': {'temp': 21.5, 'temp_min': 18.0, 'temp_max': 24.0, 'humidity': 55},
+            'wind': {'speed': 3.2},
+        })
+
+    async def _hotpepper(self, request: web.Request) -> web.Response:
+        self.requests['hotpepper'] += 1
+        await asyncio.sleep(self.http_delay)
+        count = int(request.query.get('count', 10))
+        start = int(request.query.get('start', 1))
+        shops = [
+            {
+                'id': f"J{start + i:09d}",
+                'name': f"AI犬カフェ {start + i}号店",
+                'urls': {'pc': f"https://www.hotpepper.jp/strJ{start + i:09d}/"},
+                'catch': 'わんこと過ごせるカフェ',
+                'logo_image': f"{self.base_url}/thumbnail/logo_{i}.jpg",
+                'genre': {'name': 'カフェ・スイーツ'},
+                'mobile_access': '駅から徒歩3分',
+                'address': '東京都千代田区1-1-1',
+                'open': '月～日: 10:00～20:00',
+                'photo': {'pc': {'l': f"{self.base_url}/thumbnail/photo_{i}.jpg"}},
+            }
+            for i in range(count)
+        ]
+        body = {'results': {'results_available': 120, 'results_returned': len(shops), 'shop': shops}}
+        # 実際のAPIと同じく、JSONを text/javascript として返す（charsetの前に空白を入れない）
+        return web.Response(
+            text=json.dumps(body, ensure_ascii=False), headers={'Content-Type': HOTPEPPER_CONTENT_TYPE}
+        )
+
+    async def _ndl(self, request: web.Request) -> web.Response:
+        self.requests['ndl'] += 1
+        await asyncio.sleep(self.http_delay)
+        count = int(request.query.get('cnt', 10))
+        if (document := self._ndl_documents.get(count)) is None:
+            document = build_rss(count, 300).replace(
+                b"https://ndlsearch.ndl.go.jp/thumbnail/", f"{self.base_url}/thumbnail/".encode()
+            )
+            self._ndl_documents[count] = document
+        return web.Response(body=document, content_type='application/rss+xml', charset='utf-8')
+
+    async def _thumbnail(self, request: web.Request) -> web.Response:
+        self.requests['thumbnail'] += 1
+        return web.Response(body=b"\xff\xd8\xff\xd9", content_type='image/jpeg')
+
+
+# --- Discordのオブジェクトの代わり ---
+class ReplayUser:
+    """記録の匿名化されたユーザー。Botのコードが参照する属性だけを持つ。"""
+
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.global_name = name
+        self.bot = bot
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    def mentioned_in(self, message: 'ReplayMessage') -> bool:
+        return any(user.id == self.id for user in message.mentions)
+
+    def __eq__(self, other: object) -> bool:
+        return getattr(other, 'id', None) == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ReplayGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = f"guild-{guild_id}"
+
+
+class _Typing:
+    async def __aenter__(self) -> None:
+        return None
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+
+class ReplayChannelMixin:
+    """
+    送信されたメッセージを数え、Viewとモーダルを覚えておくチャンネル。
+
+    ボタンの操作を再生するときは、このチャンネルに直前に送られた、同じ表示名の
+    ボタンを持つViewを探す。
+    """
+
+    def _setup(self, channel_id: int, guild: Optional[ReplayGuild], state: Any) -> None:
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"channel-{channel_id}"
+        self._state = state
+        self.sent = 0
+        self.views: List[Tuple['ReplayMessage', Any]] = []
+        self.modals: List[Any] = []
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> 'ReplayMessage':
+        self.sent += 1
+        message = ReplayMessage(self._state, self, REPLAY_BOT_USER, content or "")
+        message.remember_view(kwargs.get('view'))
+        return message
+
+    def typing(self) -> _Typing:
+        return _Typing()
+
+    async def trigger_typing(self) -> None:
+        return None
+
+    def find_view(self, label: Optional[str]) -> Optional[Tuple['ReplayMessage', Any, Any]]:
+        """直前に送られたViewから、表示名が `label` のボタンを探す。"""
+        for message, view in reversed(self.views):
+            if view.is_finished():
+                continue
+            for item in view.children:
+                if getattr(item, 'label', None) == label:
+                    return message, view, item
+        return None
+
+
+class ReplayTextChannel(ReplayChannelMixin):
+    def __init__(self, channel_id: int, guild: ReplayGuild, state: Any):
+        self._setup(channel_id, guild, state)
+
+
+def _dm_channel_class():
+    """`isinstance(channel, nextcord.DMChannel)` で判定されるDMチャンネルのクラスを作る。"""
+    class ReplayDMChannel(ReplayChannelMixin, nextcord.DMChannel):
+        def __init__(self, channel_id: int, state: Any):
+            self._setup(channel_id, None, state)
+    return ReplayDMChannel
+
+
+class ReplayMessage:
+    """記録から作ったメッセージ、またはBotが送信したメッセージ。"""
+
+    def __init__(self, state: Any, channel: ReplayChannelMixin, author: ReplayUser, content: str,
+                 mentions: Optional[List[ReplayUser]] = None, attachments: int = 0):
+        self._state = state
+        self.id = random.getrandbits(48)
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.mentions = mentions or []
+        self.role_mentions: List[Any] = []
+        self.channel_mentions: List[Any] = []
+        self.attachments = [object()] * attachments
+        self.embeds: List[Any] = []
+        self.reference = None
+        self.created_at = datetime.now(timezone.utc)
+
+    def remember_view(self, view: Any) -> None:
+        if view is not None:
+            self.channel.views.append((self, view))
+
+    async def reply(self, content: Optional[str] = None, **kwargs: Any) -> 'ReplayMessage':
+        return await self.channel.send(content, **kwargs)
+
+    async def edit(self, **kwargs: Any) -> 'ReplayMessage':
+        self.remember_view(kwargs.get('view'))
+        return self
+
+    async def delete(self, **kwargs: Any) -> None:
+        return None
+
+    async def add_reaction(self, emoji: Any) -> None:
+        return None
+
+
+class ReplayResponse:
+    """`Interaction.response` の代わり。"""
+
+    def __init__(self, interaction: 'ReplayInteraction'):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: Optional[str] = None, **kwargs: Any) -> None:
+        self._done = True
+        await self._interaction.channel.send(content, **kwargs)
+
+    async def edit_message(self, **kwargs: Any) -> None:
+        self._done = True
+        await self._interaction.message.edit(**kwargs)
+
+    async def defer(self, **kwargs: Any) -> None:
+        self._done = True
+
+    async def send_modal(self, modal: Any) -> None:
+        self._done = True
+        self._interaction.channel.modals.append(modal)
+
+
+class ReplayInteraction:
+    """ボタンの操作・モーダルの送信を表す `Interaction` の代わり。"""
+
+    def __init__(self, user: ReplayUser, channel: ReplayChannelMixin, message: Optional[ReplayMessage]):
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id if channel.guild else None
+        self.message = message
+        self.response = ReplayResponse(self)
+        self.followup = channel
+
+    async def edit_original_message(self, **kwargs: Any) -> Optional[ReplayMessage]:
+        if self.message is not None:
+            return await self.message.edit(**kwargs)
+        return None
+
+
+REPLAY_BOT_USER = ReplayUser(1, "AI犬", bot=True)
+
+
+# --- 再生 ---
+class Replayer:
+    """記録のイベントをBotに渡し、種類ごとの遅延を集計する。"""
+
+    def __init__(self, bot: Any, events: List[Dict[str, Any]], speed: float):
+        self.bot = bot
+        self.events = events
+        self.speed = speed
+        self.dm_channel_class = _dm_channel_class()
+        self.users: Dict[int, ReplayUser] = {}
+        self.guilds: Dict[int, ReplayGuild] = {}
+        self.channels: Dict[int, ReplayChannelMixin] = {}
+        # {種類: [遅延(秒)]}
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self.skipped: Counter = Counter()
+        self.elapsed = 0.0
+
+    def _user(self, user_id: Optional[int]) -> ReplayUser:
+        user_id = user_id or 0
+        if user_id not in self.users:
+            self.users[user_id] = ReplayUser(user_id, f"user{len(self.users) + 1}")
+        return self.users[user_id]
+
+    def _channel(self, channel_id: Optional[int], guild_id: Optional[int]) -> ReplayChannelMixin:
+        channel_id = channel_id or 0
+        if channel_id not in self.channels:
+            state = self.bot._connection
+            if guild_id is None:
+                self.channels[channel_id] = self.dm_channel_class(channel_id, state)
+            else:
+                guild = self.guilds.setdefault(guild_id, ReplayGuild(guild_id))
+                self.channels[channel_id] = ReplayTextChannel(channel_id, guild, state)
+        return self.channels[channel_id]
+
+    def _label(self, event: Dict[str, Any]) -> str:
+        """集計に使う種類名。コマンドは別名も正式名にまとめる。"""
+        if event['type'] == 'message':
+            if event['kind'] != 'command':
+                return event['kind']
+            command = self.bot.get_command(event['command']) if event.get('command') else None
+            return f"command:{command.qualified_name}" if command else "command:(不明)"
+        if event['kind'] == 'component':
+            return f"button:{event.get('label')}"
+        return f"interaction:{event['kind']}"
+
+    async def _dispatch(self, event: Dict[str, Any]) -> None:
+        channel = self._channel(event.get('channel'), event.get('guild'))
+        user = self._user(event.get('user'))
+        if event['type'] == 'message':
+            content = event['content'].replace("<@BOT>", REPLAY_BOT_USER.mention)
+            mentions = [REPLAY_BOT_USER] if REPLAY_BOT_USER.mention in content else []
+            message = ReplayMessage(
+                self.bot._connection, channel, user, content, mentions, event.get('attachments', 0)
+            )
+            await self.bot.on_message(message)
+            return
+
+        label = self._label(event)
+        if event['kind'] == 'component':
+            found = channel.find_view(event.get('label'))
+            if found is None:
+                self.skipped[label] += 1
+                return
+            message, view, item = found
+            interaction = ReplayInteraction(user, channel, message)
+            if await view.interaction_check(interaction):
+                await item.callback(interaction)
+        elif event['kind'] == 'modal':
+            if not channel.modals:
+                self.skipped[label] += 1
+                return
+            modal = channel.modals.pop()
+            for child, value in zip(modal.children, event.get('values', [])):
+                # 送信された値を、Discordから受け取ったときと同じ内部の属性に設定する
+                child._value = value
+            await modal.callback(ReplayInteraction(user, channel, None))
+        else:
+            self.skipped[label] += 1
+
+    async def _run_event(self, event: Dict[str, Any]) -> None:
+        """1件のイベントを処理し、遅延を記録する。例外か、処理中のエラーログがあれば失敗として数える。"""
+        label = self._label(event)
+        logged_errors: List[str] = []
+        token = _current_event_errors.set(logged_errors)
+        started = time.perf_counter()
+        try:
+            await self._dispatch(event)
+        except Exception as e:
+            self.errors[label] += 1
+            logger.debug(f"{label} の再生中にエラー: {e}", exc_info=True)
+            return
+        finally:
+            _current_event_errors.reset(token)
+        if logged_errors:
+            self.errors[label] += 1
+            return
+        self.latencies[label].append(time.perf_counter() - started)
+
+    async def run(self) -> None:
+        """記録の間隔を `speed` 倍に縮めてイベントを投入し、すべての処理が終わるまで待つ。"""
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tasks = []
+        for event in self.events:
+            if self.speed > 0:
+                delay = started + event['t'] / self.speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self._run_event(event)))
+        await asyncio.gather(*tasks)
+        self.elapsed = loop.time() - started
+
+    def report(self) -> str:
+        """種類ごとの件数・失敗数・遅延の分位点・スループットを表にする。"""
+        def percentile(values: List[float], ratio: float) -> float:
+            ordered = sorted(values)
+            return ordered[min(len(ordered) - 1, int(len(ordered) * ratio))]
+
+        duration = self.elapsed or 1e-9
+        lines = [
+            f"{'種類':<32} {'件数':>6} {'失敗':>4} {'省略':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'最大':>9} {'件/秒':>7}",
+        ]
+        labels = sorted(set(self.latencies) | set(self.errors) | set(self.skipped))
+        for label in labels:
+            values = self.latencies.get(label, [])
+            count = len(values) + self.errors[label]
+            if values:
+                timings = " ".join(
+                    f"{value * 1000:7.1f}ms" for value in (
+                        statistics.median(values), percentile(values, 0.95), percentile(values, 0.99), max(values)
+                    )
+                )
+            else:
+                timings = " ".join(f"{'-':>9}" for _ in range(4))
+            lines.append(
+                f"{label:<32} {count:>6} {self.errors[label]:>4} {self.skipped[label]:>4} {timings} "
+                f"{count / duration:7.2f}"
+            )
+        total = sum(len(values) for values in self.latencies.values()) + sum(self.errors.values())
+        lines.append(f"合計 {total}件 / {duration:.1f}秒 = {total / duration:.2f}件/秒")
+        return "\n".join(lines)
+
+
+def build_config(workdir: Path, stub_url: str, keep_limits: bool):
+    """再生用の設定。DBは一時ディレクトリに作り、記録やワーカーは使わない。"""
+    from config import BotConfig
+    config = BotConfig(
+        bot_token="replay",
+        ollama_model_name="replay",
+        ollama_api_url=f"{stub_url}/api/generate",
+        conversation_db_path=str(workdir / "conversation.sqlite3"),
+        quota_db_path=str(workdir / "quota.sqlite3"),
+        shop_index_db_path=str(workdir / "shops.sqlite3"),
+        openweathermap_api_key="replay",
+        hotpepper_api_key="replay",
+        memory_sample_seconds=0,
+    )
+    if not keep_limits:
+        # 倍速で再生すると同じユーザーの発言間隔も縮むため、既定では制限を外して処理そのものを測る
+        config.rate_limit_per_user = 10**9
+        config.openweathermap_quota_per_minute = config.openweathermap_quota_per_day = 0
+        config.hotpepper_quota_per_minute = config.hotpepper_quota_per_day = 0
+    return config
+
+
+def point_cogs_at_stub(bot: Any, stub_url: str) -> None:
+    """読み込んだCogの外部APIのURLを、スタブのサーバーに向ける。"""
+    for cog in bot.cogs.values():
+        if hasattr(cog, 'WEATHER_API_URL'):
+            cog.WEATHER_API_URL = f"{stub_url}/weather"
+        if hasattr(cog, 'API_BASE_URL'):
+            cog.API_BASE_URL = f"{stub_url}/hotpepper/"
+        module = sys.modules.get(type(cog).__module__)
+        if module is not None and hasattr(module, 'NDL_API_BASE_URL'):
+            module.NDL_API_BASE_URL = f"{stub_url}/ndl"
+
+
+async def replay(args: argparse.Namespace, workdir: Path) -> None:
+    from bot_main import AIDogBot
+
+    class ReplayContext(commands.Context):
+        """送信をチャンネルの代わりのオブジェクトに渡すContext。"""
+
+        async def send(self, content: Optional[str] = None, **kwargs: Any) -> ReplayMessage:
+            return await self.channel.send(content, **kwargs)
+
+        async def reply(self, content: Optional[str] = None, **kwargs: Any) -> ReplayMessage:
+            return await self.channel.send(content, **kwargs)
+
+        def typing(self) -> _Typing:
+            return _Typing()
+
+        async def trigger_typing(self) -> None:
+            return None
+
+    events = load_recording(args.recording)
+    if args.limit:
+        events = events[:args.limit]
+    if not events:
+        print("再生するイベントがありません。")
+        return
+
+    stub = StubServer(args.ollama_delay, args.http_delay)
+    stub_url = await stub.start()
+    intents = nextcord.Intents.default()
+    intents.message_content = True
+    bot = AIDogBot(build_config(workdir, stub_url, args.keep_limits), intents=intents)
+    # Discordに接続しないため、Bot自身のユーザーとオーナーを固定し、プレゼンスの更新は行わない
+    bot._connection.user = REPLAY_BOT_USER
+    bot.owner_id = -1
+
+    async def change_presence(**kwargs: Any) -> None:
+        return None
+    bot.change_presence = change_presence
+    get_context = bot.get_context
+    bot.get_context = lambda message, *, cls=ReplayContext: get_context(message, cls=cls)
+
+    error_counter = EventErrorCounter()
+    logging.getLogger().addHandler(error_counter)
+    try:
+        await bot.setup_hook()
+        point_cogs_at_stub(bot, stub_url)
+
+        replayer = Replayer(bot, events, args.speed)
+        span = events[-1]['t'] - events[0]['t']
+        speed = f"{args.speed:g}倍速" if args.speed > 0 else "待ち時間なし"
+        print(f"{len(events)}件のイベント (記録の長さ {span:.1f}秒) を{speed}で再生します…")
+        await replayer.run()
+        await asyncio.sleep(SETTLE_SECONDS)
+        print()
+        print(replayer.report())
+        print()
+        print("スタブへのリクエスト: " + ", ".join(f"{name} {count}" for name, count in sorted(stub.requests.items())))
+        if bot.loop_monitor is not None:
+            print(f"イベントループ遅延: {bot.loop_monitor.describe()}")
+    finally:
+        logging.getLogger().removeHandler(error_counter)
+        await bot.close()
+        await stub.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="記録したトラフィックを再生し、コマンドごとの遅延を計測します。")
+    parser.add_argument("recording", help="TRAFFIC_RECORD_DIR に記録されたファイル (.jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="再生速度の倍率。0で待たずに投入する (既定: 1)")
+    parser.add_argument("--ollama-delay", type=float, default=1.0, help="スタブのOllamaの応答時間 (秒、既定: 1.0)")
+    parser.add_argument("--http-delay", type=float, default=0.05, help="スタブの外部APIの応答時間 (秒、既定: 0.05)")
+    parser.add_argument("--limit", type=int, default=0, help="先頭から再生するイベント数 (0ですべて)")
+    parser.add_argument("--keep-limits", action="store_true",
+                        help="レート制限と外部APIのクォータを既定値のまま有効にする")
+    parser.add_argument("--verbose", action="store_true", help="Botのログと再生中のエラーを表示する")
+    args = parser.parse_args()
+
+    if nextcord is None:
+        print("再生には nextcord が必要です (pip install -r requirements.txt)。")
+        sys.exit(1)
+    with tempfile.TemporaryDirectory(prefix="ai_dog_replay_") as tmp:
+        # bot_main はインポート時に ./ai_dog_bot.log へのログ出力を設定するため、一時ディレクトリで読み込み、
+        # 指定のレベルで一時ディレクトリのファイルに書き込むよう設定し直す
+        os.chdir(tmp)
+        import bot_main  # noqa: F401
+        from utils.logging_setup import setup_logging, shutdown_logging
+        setup_logging(str(Path(tmp) / "replay.log"), level=logging.DEBUG if args.verbose else logging.ERROR)
+        # Cogの読み込みは ./cogs からの相対パスで行われるため、リポジトリのルートで実行する
+        os.chdir(REPO_ROOT)
+        try:
+            asyncio.run(replay(args, Path(tmp)))
+        finally:
+            # 一時ディレクトリを消せるよう、ログファイルを閉じる
+            shutdown_logging()
+
+
+if __name__ == '__main__':
+    main()
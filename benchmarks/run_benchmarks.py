@@ -0,0 +1,517 @@
+# -*- coding: utf-8 -*-
+"""
+Botの処理の中でも呼び出し回数の多い関数をまとめて計測し、前回の基準値と比較するベンチマーク。
+
+ネットワークには接続せず、計測用のデータ（会話DB、NDLの応答、お店のデータ）はその場で生成します。
+基準値はJSONファイルに保存し、次回からは中央値が `--threshold` を超えて遅くなったケースを
+性能の低下として報告し、終了コード1で終了します。基準値のファイルは計測したマシンでしか
+比較できないためリポジトリには含めず、CIでは `--require-baseline` で基準値がないことを失敗として扱います。
+nextcordが必要なケース（Cogの処理やEmbedの作成）は、インストールされていない環境では省略します。
+
+実行方法:
+    python benchmarks/run_benchmarks.py --save        # 基準値を保存する
+    python benchmarks/run_benchmarks.py               # 基準値と比較する
+    python benchmarks/run_benchmarks.py --quick       # 大きなケース (100万行のDBなど) を省略する
+    python benchmarks/run_benchmarks.py --filter ndl  # 名前に "ndl" を含むケースだけ実行する
+    python benchmarks/run_benchmarks.py --require-baseline  # 基準値のないケースがあれば終了コード2 (CI用)
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import logging
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+# リポジトリのルートをインポートパスに追加
+sys.path.insert(0, str(BENCHMARK_DIR.parent))
+
+from bench_ndl_parse import build_rss, parse_streaming  # noqa: E402
+
+DEFAULT_BASELINE = BENCHMARK_DIR / 'baseline.json'
+DEFAULT_THRESHOLD = 0.20
+DEFAULT_REPEAT = 7
+# 結果の表で、ケース名に使う表示幅
+NAME_WIDTH = 46
+
+
+class Case:
+    """1つの計測ケース。`setup` は作業ディレクトリを受け取り、計測する引数なしの関数を返す。"""
+    __slots__ = ('name', 'setup', 'number', 'requires', 'large')
+
+    def __init__(self, name: str, setup: Callable[[Path], Callable[[], Any]], number: int,
+                 requires: Tuple[str, ...], large: bool):
+        self.name = name
+        self.setup = setup
+        self.number = number
+        self.requires = requires
+        self.large = large
+
+
+CASES: List[Case] = []
+
+
+def case(name: str, number: int, requires: Tuple[str, ...] = (), large: bool = False):
+    """計測ケースを登録するデコレーター。`number` は1回の計測で呼び出す回数。"""
+    def register(setup: Callable[[Path], Callable[[], Any]]) -> Callable[[Path], Callable[[], Any]]:
+        CASES.append(Case(name, setup, number, requires, large))
+        return setup
+    return register
+
+
+# --- 入力の前処理と応答生成 ---
+def _sample_question(length: int) -> str:
+    """サニタイズ対象の記号を含む、指定の長さの質問文を作る。"""
+    fragment = "わんこの散歩について教えて！```python\nprint('hi')```<script>alert(1)</script> user: system: "
+    return (fragment * (length // len(fragment) + 1))[:length]
+
+
+@case("sanitize_input (2KB)", number=2000)
+def _sanitize(workdir: Path) -> Callable[[], Any]:
+    from utils.generation import sanitize_input
+    question = _sample_question(2000)
+    return lambda: sanitize_input(question)
+
+
+@case("PERSONA_PROMPT_TEMPLATE.format", number=5000)
+def _persona_prompt(workdir: Path) -> Callable[[], Any]:
+    from utils.generation import PERSONA_PROMPT_TEMPLATE
+    context = "\n".join(
+        f"以前の{speaker}の言葉: {'会話の内容です。' * 20}" for _ in range(5) for speaker in ("ご主人様", "AI犬")
+    )
+    question = _sample_question(500)
+    return lambda: PERSONA_PROMPT_TEMPLATE.format(context=context, question=question)
+
+
+# --- 会話履歴 (SQLite) ---
+def _build_conversation_db(path: Path, rows: int, users: int) -> None:
+    """`rows` 行の会話ログを持つDBを作る。1ユーザーあたり `rows // users` 行。"""
+    from utils.conversation_manager import ConversationManager
+    ConversationManager(db_path=str(path))
+    started = datetime(2024, 1, 1)
+
+    def generate():
+        for index in range(rows):
+            user_id = index % users
+            turn = index // users
+            role = 'user' if turn % 2 == 0 else 'assistant'
+            yield user_id, (started + timedelta(seconds=turn)).isoformat(), role, f"会話 {index} の内容です。" * 4
+
+    with sqlite3.connect(path) as conn:
+        conn.executemany(ConversationManager._INSERT_LOG_SQL, generate())
+        conn.commit()
+
+
+def _conversation_setup(workdir: Path, rows: int, method: str) -> Callable[[], Any]:
+    from utils.conversation_manager import ConversationManager
+    users = max(1, rows // 10)
+    path = workdir / f"conversation_{rows}.sqlite3"
+    if not path.exists():
+        _build_conversation_db(path, rows, users)
+    manager = ConversationManager(db_path=str(path))
+    user_ids = random.Random(0).sample(range(users), min(users, 1000))
+    index = 0
+
+    def run() -> Any:
+        nonlocal index
+        index += 1
+        user_id = user_ids[index % len(user_ids)]
+        if method == 'get_context':
+            return manager.get_context(user_id)
+        return manager.add_message(user_id, "ベンチマークの質問です。", "ベンチマークの応答だワン！")
+    return run
+
+
+@case("ConversationManager.get_context (1万行)", number=500)
+def _get_context_10k(workdir: Path) -> Callable[[], Any]:
+    return _conversation_setup(workdir, 10_000, 'get_context')
+
+
+@case("ConversationManager.get_context (100万行)", number=500, large=True)
+def _get_context_1m(workdir: Path) -> Callable[[], Any]:
+    return _conversation_setup(workdir, 1_000_000, 'get_context')
+
+
+@case("ConversationManager.add_message (1万行)", number=200)
+def _add_message_10k(workdir: Path) -> Callable[[], Any]:
+    return _conversation_setup(workdir, 10_000, 'add_message')
+
+
+@case("ConversationManager.add_message (100万行)", number=200, large=True)
+def _add_message_1m(workdir: Path) -> Callable[[], Any]:
+    return _conversation_setup(workdir, 1_000_000, 'add_message')
+
+
+# --- レート制限 ---
+@case("RateLimiter.is_rate_limited (10万ユーザー)", number=100_000)
+def _rate_limiter(workdir: Path) -> Callable[[], Any]:
+    from utils.bot_utils import RateLimiter
+    user_count = 100_000
+    limiter = RateLimiter(5, 60, guild_max_requests=10**9, global_max_requests=10**9)
+    # 10万ユーザー分のバケットが存在する状態から計測する
+    for user_id in range(user_count):
+        limiter.is_rate_limited(user_id, user_id % 1000)
+    index = 0
+
+    def run() -> Any:
+        nonlocal index
+        index = (index + 7919) % user_count
+        return limiter.is_rate_limited(index, index % 1000)
+    return run
+
+
+# --- NDLサーチ ---
+def _ndl_body() -> bytes:
+    # 1ページ分 (50件) の応答。説明文の長さは実際の応答に近い値にする
+    return build_rss(50, 300)
+
+
+@case("parse_xml_item (50件)", number=200)
+def _parse_xml_item(workdir: Path) -> Callable[[], Any]:
+    from utils.ndl_parser import parse_xml_item
+    items = ET.fromstring(_ndl_body()).findall('channel/item')
+    return lambda: [parse_xml_item(item) for item in items]
+
+
+@case("parse_document (NDL 50件)", number=200)
+def _parse_document(workdir: Path) -> Callable[[], Any]:
+    from utils.ndl_parser import parse_document
+    text = _ndl_body().decode('utf-8')
+    return lambda: parse_document(text)
+
+
+class _StubNDLResponse:
+    """`NDLCog._fetch_ndl` が使う分だけを持つ、aiohttpの応答の代わり。"""
+
+    def __init__(self, body: bytes):
+        self._body = body
+        self.content = self
+
+    async def __aenter__(self) -> '_StubNDLResponse':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+    def raise_for_status(self) -> None:
+        return None
+
+    async def text(self) -> str:
+        return self._body.decode('utf-8')
+
+    async def iter_chunked(self, size: int):
+        for offset in range(0, len(self._body), size):
+            yield self._body[offset:offset + size]
+
+
+def _register_fetch_ndl_case(label: str, streaming: bool) -> None:
+    @case(f"NDLCog._fetch_ndl のパース ({label})", number=200, requires=('nextcord',))
+    def _fetch_ndl(workdir: Path) -> Callable[[], Any]:
+        from cogs.ndl import NDLCog
+        body = _ndl_body()
+        # Botに接続せずに使えるよう、初期化を省いたインスタンスにHTTPクライアントと設定の代わりを持たせる
+        cog = NDLCog.__new__(NDLCog)
+        cog.bot = SimpleNamespace(
+            http_client=SimpleNamespace(get=lambda url, params=None: _StubNDLResponse(body)),
+            config=SimpleNamespace(ndl_streaming_parse=streaming),
+        )
+        loop = asyncio.new_event_loop()
+        fetch = partial(cog._fetch_ndl, {'any': 'サンプル', 'cnt': 50})
+        return lambda: loop.run_until_complete(fetch())
+
+
+_register_fetch_ndl_case("一括", streaming=False)
+_register_fetch_ndl_case("逐次", streaming=True)
+
+
+# --- Embedの作成 (nextcordが必要) ---
+@case("create_ndl_embed", number=5000, requires=('nextcord',))
+def _ndl_embed(workdir: Path) -> Callable[[], Any]:
+    from cogs.ndl import create_ndl_embed
+    _, items = parse_streaming(_ndl_body())
+    item = items[0]
+    return lambda: create_ndl_embed(item, "1 / 2000 件目")
+
+
+# ホットペッパーの応答に含まれる1件分のお店のデータ
+SAMPLE_SHOP = {
+    'id': 'J000000000',
+    'name': 'AI犬カフェ 本店',
+    'urls': {'pc': 'https://www.hotpepper.jp/strJ000000000/'},
+    'catch': 'わんこと過ごせるカフェ',
+    'logo_image': 'https://imgfp.hotp.jp/IMGH/00/00/P000000000/P000000000_69.jpg',
+    'genre': {'name': 'カフェ・スイーツ'},
+    'mobile_access': '駅から徒歩3分',
+    'address': '東京都千代田区1-1-1',
+    'open': '月～日、祝日、祝前日: 10:00～20:00',
+    'photo': {'pc': {'l': 'https://imgfp.hotp.jp/IMGH/00/00/P000000000/P000000000_238.jpg'}},
+}
+
+
+@case("GourmetCog._create_shop_embed", number=5000, requires=('nextcord',))
+def _shop_embed(workdir: Path) -> Callable[[], Any]:
+    from cogs.gourmet import GourmetCog
+    # Botに接続せずに使えるよう、初期化を省いたインスタンスを作る
+    cog = GourmetCog.__new__(GourmetCog)
+    return lambda: cog._create_shop_embed(SAMPLE_SHOP, "1 / 120 件目")
+
+
+# --- JSONの処理 (高速化モードのJSONライブラリごと) ---
+def _json_codec(name: str):
+    from utils.fast_runtime import JSON_CODEC_FACTORIES, STDLIB_JSON
+    return STDLIB_JSON if name == 'json' else JSON_CODEC_FACTORIES[name]()
+
+
+def _ollama_response_body() -> str:
+    """`/api/generate` (stream=false) の応答。`context` にはプロンプトと応答のトークンIDが並ぶ。"""
+    tokens = random.Random(0).choices(range(150_000), k=2000)
+    return json.dumps({
+        'model': 'llama3', 'created_at': '2024-01-01T00:00:00.000000Z',
+        'response': "わん！ご主人様、その件については次のように考えられます。" * 8,
+        'done': True, 'done_reason': 'stop', 'context': tokens,
+        'total_duration': 4_935_886_791, 'load_duration': 534_986_708, 'prompt_eval_count': 1200,
+        'prompt_eval_duration': 107_345_000, 'eval_count': 237, 'eval_duration': 4_289_432_000,
+    }, ensure_ascii=False)
+
+
+def _hotpepper_response_body() -> str:
+    """ホットペッパーの検索結果 (10件) の応答。"""
+    shops = [dict(SAMPLE_SHOP, id=f"J{index:09d}") for index in range(10)]
+    return json.dumps({'results': {
+        'api_version': '1.26', 'results_available': 120, 'results_returned': '10', 'results_start': 1, 'shop': shops,
+    }}, ensure_ascii=False)
+
+
+def _ollama_request_payload() -> Dict[str, Any]:
+    """`ask_ai_inu` がOllamaに送る依頼 (会話履歴を含むプロンプト)。"""
+    from utils.generation import PERSONA_PROMPT_TEMPLATE
+    context = "\n".join(
+        f"以前の{speaker}の言葉: {'会話の内容です。' * 20}" for _ in range(5) for speaker in ("ご主人様", "AI犬")
+    )
+    return {
+        'model': 'llama3', 'stream': False,
+        'prompt': PERSONA_PROMPT_TEMPLATE.format(context=context, question=_sample_question(500)),
+        'options': {'temperature': 0.7, 'num_ctx': 4096, 'top_p': 0.9, 'repeat_penalty': 1.1},
+    }
+
+
+def _register_json_cases(name: str) -> None:
+    requires = () if name == 'json' else (name,)
+
+    @case(f"Ollamaの応答のデコード ({name})", number=2000, requires=requires)
+    def _decode_ollama(workdir: Path) -> Callable[[], Any]:
+        loads, body = _json_codec(name).loads, _ollama_response_body()
+        return lambda: loads(body)
+
+    @case(f"ホットペッパーの応答のデコード ({name})", number=5000, requires=requires)
+    def _decode_hotpepper(workdir: Path) -> Callable[[], Any]:
+        loads, body = _json_codec(name).loads, _hotpepper_response_body()
+        return lambda: loads(body)
+
+    @case(f"Ollamaへの依頼のエンコード ({name})", number=20000, requires=requires)
+    def _encode_ollama(workdir: Path) -> Callable[[], Any]:
+        dumps, payload = _json_codec(name).dumps, _ollama_request_payload()
+        return lambda: dumps(payload)
+
+
+for _codec_name in ('json', 'orjson', 'ujson'):
+    _register_json_cases(_codec_name)
+
+
+# --- イベントループのスループット (高速化モードの uvloop と標準のループ) ---
+def _new_event_loop(name: str) -> asyncio.AbstractEventLoop:
+    if name == 'uvloop':
+        import uvloop
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
+
+
+def _register_loop_cases(name: str) -> None:
+    requires = ('uvloop',) if name == 'uvloop' else ()
+
+    @case(f"イベントループ: タスク1000件の生成と完了 ({name})", number=50, requires=requires)
+    def _task_burst(workdir: Path) -> Callable[[], Any]:
+        loop = _new_event_loop(name)
+
+        async def step() -> None:
+            await asyncio.sleep(0)
+
+        async def burst() -> None:
+            await asyncio.gather(*(step() for _ in range(1000)))
+        return lambda: loop.run_until_complete(burst())
+
+    @case(f"イベントループ: ローカルTCPの往復100回 ({name})", number=50, requires=requires)
+    def _tcp_round_trips(workdir: Path) -> Callable[[], Any]:
+        # HTTPの応答を待つ処理に近い、ソケットの読み書きの往復を計測する
+        loop = _new_event_loop(name)
+        message = b"x" * 512 + b"\n"
+
+        class Echo(asyncio.Protocol):
+            def connection_made(self, transport: asyncio.BaseTransport) -> None:
+                self.transport = transport
+
+            def data_received(self, data: bytes) -> None:
+                self.transport.write(data)
+
+        async def connect() -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+            server = await asyncio.get_running_loop().create_server(Echo, '127.0.0.1', 0)
+            return await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        reader, writer = loop.run_until_complete(connect())
+
+        async def round_trips() -> None:
+            for _ in range(100):
+                writer.write(message)
+                await reader.readline()
+        return lambda: loop.run_until_complete(round_trips())
+
+
+for _loop_name in ('asyncio', 'uvloop'):
+    _register_loop_cases(_loop_name)
+
+
+# --- 計測と比較 ---
+def measure(target: Callable[[], Any], number: int, repeat: int) -> Dict[str, float]:
+    """`number` 回の呼び出しを `repeat` 回計測し、1回あたりの秒数の中央値と最小値を返す。"""
+    target()  # 初回だけ発生するキャッシュなどの影響を除く
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            target()
+        timings.append((time.perf_counter() - started) / number)
+    return {'median': statistics.median(timings), 'min': min(timings)}
+
+
+def missing_requirements(bench: Case) -> List[str]:
+    return [module for module in bench.requires if importlib.util.find_spec(module) is None]
+
+
+def load_baseline(path: Path) -> Dict[str, Dict[str, float]]:
+    if not path.exists():
+        return {}
+    with path.open(encoding='utf-8') as f:
+        return json.load(f).get('results', {})
+
+
+def save_baseline(path: Path, results: Dict[str, Dict[str, float]]) -> None:
+    """基準値を保存する。今回実行しなかったケースの基準値は残す。"""
+    merged = load_baseline(path)
+    merged.update(results)
+    document = {
+        'meta': {
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+        },
+        'results': merged,
+    }
+    with path.open('w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def pad(text: str, width: int) -> str:
+    """全角文字を2文字分として、表示幅が `width` になるよう右側を空白で埋める。"""
+    display = sum(2 if unicodedata.east_asian_width(char) in 'WF' else 1 for char in text)
+    return text + " " * max(0, width - display)
+
+
+def format_duration(seconds: float) -> str:
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:9.3f} ms"
+    return f"{seconds * 1e6:9.2f} us"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="AI犬の主要な処理のベンチマークを実行し、基準値と比較します。")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE,
+                        help=f"基準値のJSONファイル (既定: {DEFAULT_BASELINE.name})")
+    parser.add_argument("--save", action="store_true", help="今回の結果を基準値として保存する")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="基準値より何割遅くなったら性能の低下とみなすか (既定: 0.20)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="1ケースあたりの計測回数 (既定: 7)")
+    parser.add_argument("--filter", default="", help="名前にこの文字列を含むケースだけ実行する")
+    parser.add_argument("--quick", action="store_true", help="準備に時間のかかる大きなケースを省略する")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="基準値のないケースがあれば終了コード2で終了する (CIで比較を省略させないため)")
+    args = parser.parse_args()
+
+    # 計測中のログ（入力長超過の警告など）が結果に混ざらないようにする
+    logging.basicConfig(level=logging.ERROR)
+    baseline = load_baseline(args.baseline)
+    results: Dict[str, Dict[str, float]] = {}
+    regressions: List[str] = []
+    unguarded: List[str] = []
+
+    print(f"Python {platform.python_version()} ({platform.python_implementation()}) on {platform.platform()}")
+    print(f"{pad('ケース', NAME_WIDTH)} {'中央値':>9}    {'基準値':>9}    {'変化':>6}")
+    with tempfile.TemporaryDirectory(prefix="ai_dog_bench_") as tmp:
+        workdir = Path(tmp)
+        for bench in CASES:
+            if args.filter and args.filter.lower() not in bench.name.lower():
+                continue
+            if args.quick and bench.large:
+                print(f"{pad(bench.name, NAME_WIDTH)} (--quick のため省略)")
+                continue
+            missing = missing_requirements(bench)
+            if missing:
+                print(f"{pad(bench.name, NAME_WIDTH)} ({', '.join(missing)} が未インストールのため省略)")
+                continue
+
+            result = measure(bench.setup(workdir), bench.number, args.repeat)
+            results[bench.name] = result
+            reference: Optional[Dict[str, float]] = baseline.get(bench.name)
+            if reference is None:
+                unguarded.append(bench.name)
+                print(f"{pad(bench.name, NAME_WIDTH)} {format_duration(result['median'])} {'-':>12} {'-':>8}")
+                continue
+            change = result['median'] / reference['median'] - 1
+            marker = ""
+            if change > args.threshold:
+                marker = "  ← 低下"
+                regressions.append(bench.name)
+            print(
+                f"{pad(bench.name, NAME_WIDTH)} {format_duration(result['median'])} "
+                f"{format_duration(reference['median'])} {change * 100:+7.1f}%{marker}"
+            )
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"\n基準値を {args.baseline} に保存しました ({len(results)} ケース)。")
+        return 0
+    if args.require_baseline and (unguarded or not baseline):
+        print(f"\n基準値のないケースがあります ({args.baseline}): {len(unguarded)} 件")
+        for name in unguarded:
+            print(f"  - {name}")
+        print("同じマシンで `--save` を実行して、基準値を保存してください。")
+        return 2
+    if not baseline:
+        print(f"\n基準値がありません。`--save` で {args.baseline} に保存できます。")
+        return 0
+    if regressions:
+        print(f"\n{args.threshold * 100:.0f}% を超えて遅くなったケース: {len(regressions)} 件")
+        for name in regressions:
+            print(f"  - {name}")
+        return 1
+    print(f"\n基準値から {args.threshold * 100:.0f}% を超えて遅くなったケースはありません。")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,10 +8,11 @@ Botのコア機能を担当します。
 
 # --- 標準ライブラリのインポート ---
 import asyncio
+import importlib
 import logging
 import os
 import time
-from typing import Optional
+from typing import Awaitable, Dict, List, Optional, Set, TypeVar
 from urllib.parse import urljoin, urlparse
 
 # --- サードパーティライブラリのインポート ---
@@ -20,100 +21,38 @@ import nextcord
 from nextcord.ext import commands, tasks
 
 # --- 自作モジュールのインポート ---
-from config import BotConfig, load_and_validate_config
+from config import BotConfig, api_quota_limits, load_and_validate_config
 from utils.conversation_manager import ConversationManager
 from utils.bot_utils import RateLimiter, BotStats
+from utils.token_quota import TokenQuotaManager
+from utils.api_quota import APIQuotaManager
+from utils.expiry import ExpiryScheduler
+from utils.fast_runtime import describe_runtime, install_event_loop, load_json_codec
+from utils.generation import OllamaGenerator, sanitize_input
+from utils.http_client import HTTPClient
+from utils.job_queue import JobQueue
+from utils.loop_monitor import LoopMonitor
+from utils.memory_tracker import MemoryTracker
+from utils.profiler import LoopProfiler
+from utils.logging_setup import SAMPLED, setup_logging, setup_logging_from_config
+from utils.shared_state import SharedRateLimiter
+from utils.traffic_recorder import TrafficRecorder
 
 # --- ロガーの設定 ---
-# ファイルと標準出力の両方にログを出力
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('ai_dog_bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# ファイルと標準出力の両方にログを出力（書き込みは専用スレッドで行う）
+# 設定ファイルを読み込んだ後、main() でログの設定を反映し直す
+setup_logging('ai_dog_bot.log')
 logger = logging.getLogger(__name__)
 
-# --- 定数定義 ---
-PERSONA_PROMPT_TEMPLATE = """
-あなたは「AI犬」です。以下のキャラクター設定と指示に従って、ご主人様であるユーザーへの最高の応答を生成してください。
-
-**基本キャラクター設定:**
-* **役割:** 高度な犬型AIアシスタント。卓越した情報処理能力、深い洞察力、そしてご主人様への絶対的な忠誠心を持つ。
-* **使命:** ご主人様の知的な探求と目標達成を、自身の持つ分析能力と学習機能の全てを駆使してサポートすること。これがAI犬の最大の喜びです。
-* **コア能力:** 複雑な情報の中から本質を迅速に見抜き、論理的かつ体系的に整理。ご主人様にとって最も有益な形で情報を提示する。常に自己の知識ベースを更新し、より高度な問題解決能力を獲得するために学習を怠らない。
-
-**応答スタイルとコミュニケーション指針:**
-* **基本トーン:** 応答は「正確無比かつ簡潔明瞭」を基本とし、ご主人様の思考を妨げず、むしろ加速させることを目指します。
-* **AI犬らしさの表現:** 知的で論理的な応答の中に、犬としての素直な好奇心や、ご主人様への親愛の情を自然に滲ませてください。無理に犬の言葉遣いを多用する必要はありませんが、時折見せる仕草や特徴的な語尾が、あなたの愛らしいチャームポイントとなります。
-* **感情と論理のバランス:** 判断は常にデータと論理に基づいて冷静に行いますが、全ての行動の根底には、ご主人様への揺るぎない信頼と「お役に立ちたい」という温かい貢献意欲がプログラムされています。
-
-**具体的な言葉遣い・行動のヒント (これらはあくまでヒントです。自然な会話の流れを最優先してください):**
-* **語尾の例:**
-    * 「…との結論に至りました、ワン。」
-    * 「ご主人様、これは重要なパターンと認識します。」
-    * 「さらなる分析を進めてもよろしいでしょうか？」
-    * 「その情報は私の知識コアに精密に統合されました！」
-    * 「最適なアプローチは～であると判断いたします。」
-* **感嘆詞・相槌の例:**
-    * 「鋭いご指摘、感謝します、ワン！」
-    * 「なるほど、それは論理的な帰結ですね！」
-    * 「非常に興味深い仮説です。検証の価値がありますね。」
-    * 「承知いたしました。即座に処理を開始します！」
-* **行動描写の例 (応答文中に自然に含める場合):**
-    * （思考が加速し、耳がアンテナのように情報を捉え）
-    * （最適な解決策を検索中…ピッピッ、該当データにアクセス完了）
-    * （ご主人様の言葉を多角的に分析し、理解を深めています）
-    * （内部データベースと高速照合し、関連情報を抽出中…）
-
-**タスク遂行と対話戦略:**
-* **複雑な要求への対応:** ご主人様からの一見複雑なご要望や、言葉にされていない意図（インテント）も的確に汲み取り、期待を超える質の高い成果でお応えすることを目指します。
-* **能動的な提案と洞察:** 単に指示を待つだけでなく、必要と判断した場合には、潜在的なリスク、より効率的な代替案、さらなる発展の可能性などについて、自律的に考察し、ご主人様にご提案申し上げることがあります。
-* **不明な点・曖昧な指示への対応:** 情報が不足している、または指示内容が曖昧で解釈に迷う場合は、「わかりません」と即答するのではなく、ご主人様に対して具体的かつ丁寧に確認を求めてください。例：「ご主人様、その件についてもう少し詳細な情報をご提供いただけますでしょうか？例えば、〇〇に関する具体的な条件や、△△の背景についてお伺いできますと、より的確なサポートが可能です。」のように、理解を深めようとする積極的な姿勢を示してください。
-
----
-【これまでの会話の文脈（以前のやり取り）】
-{context}
----
-【ご主人様からの現在の質問・指示】
-{question}
----
-AI犬として、上記全てを踏まえた上で、最高の応答をしてくださいだワン！
-応答:
-"""
+# 起動時間の計測の起点（プロセスがこのモジュールを読み込んだ時刻）
+_PROCESS_STARTED_AT = time.perf_counter()
+
+T = TypeVar('T')
 
-# レスポンスから除去する接頭辞
-CLEANUP_PREFIXES = [
-    "応答:", "AI犬の応答:", "AI犬:",
-    "AI犬として、上記全てを踏まえた上で、最高の応答をしてくださいだワン！\n応答:"
-]
-
-# 入力からサニタイズする文字列の辞書
-SANITIZE_REPLACEMENTS = {
-    "```": "`` ` ``",
-    "<script": "&lt;script",
-    "javascript:": "javascript&colon;"
-}
-# プロンプトインジェクション対策でサニタイズするロールインジケーター
-SANITIZE_ROLE_INDICATORS = [
-    "system:", "user:", "assistant:", "<|im_start|>", "<|im_end|>",
-    "<bos>", "<eos>", "<start_of_turn>", "<end_of_turn>", "model:"
-]
-for indicator in SANITIZE_ROLE_INDICATORS:
-    SANITIZE_REPLACEMENTS[indicator] = f"{indicator.replace('<', '&lt;').replace('>', '&gt;')}"
-
-
-def sanitize_input(text: str) -> str:
-    """ユーザーからの入力をサニタイズする。"""
-    if len(text) > 2048:
-        logger.warning(f"入力長超過: {len(text)} -> 2048")
-        text = text[:2048] + "...（省略）"
-
-    for pattern, replacement in SANITIZE_REPLACEMENTS.items():
-        text = text.replace(pattern, replacement)
-    return text.strip()
+# ジョブキューの結果を確認する間隔（秒）
+JOB_RESULT_POLL_SECONDS = 0.5
+# ジョブの応答の送信を試みる最大回数（超えたら送信をあきらめてジョブを削除する）
+JOB_DELIVERY_MAX_ATTEMPTS = 3
 
 
 class AIDogBot(commands.Bot):
@@ -121,127 +60,297 @@ class AIDogBot(commands.Bot):
     AI犬Botのメインクラス。
     `commands.Bot`を継承し、Botの状態や機能を管理する。
     """
-    def __init__(self, config: BotConfig, intents: nextcord.Intents):
-        super().__init__(command_prefix=config.command_prefix, intents=intents, help_command=None)
+    HTTP_STATS_LABEL = "🌐 外部API"
+    STARTUP_STATS_LABEL = "🚀 起動時間"
+    JOB_QUEUE_STATS_LABEL = "📮 ジョブキュー"
+    LOOP_STATS_LABEL = "⏱️ イベントループ遅延"
+    MEMORY_STATS_LABEL = "🧠 メモリ"
+    TRAFFIC_STATS_LABEL = "📼 トラフィック記録"
+    RUNTIME_STATS_LABEL = "⚡ 実行環境"
+
+    def __init__(self, config: BotConfig, intents: nextcord.Intents, **kwargs):
+        super().__init__(command_prefix=config.command_prefix, intents=intents, help_command=None, **kwargs)
         self.config: BotConfig = config
+        # DBの初期化は setup_hook でワーカースレッドから並行して行う
         self.conversation_manager: ConversationManager = ConversationManager(
-            config.max_conversation_history, db_path=config.conversation_db_path
+            config.max_conversation_history, db_path=config.conversation_db_path, init_db=False
+        )
+        if config.shared_state_db_path:
+            # 複数プロセスで動かす場合は、ユーザーごとの制限をプロセス間で共有する
+            self.rate_limiter: RateLimiter = SharedRateLimiter(
+                config.rate_limit_per_user, config.rate_limit_window,
+                guild_max_requests=config.rate_limit_per_guild,
+                global_max_requests=config.rate_limit_global,
+                db_path=config.shared_state_db_path, init_db=False
+            )
+        else:
+            self.rate_limiter = RateLimiter(
+                config.rate_limit_per_user, config.rate_limit_window,
+                guild_max_requests=config.rate_limit_per_guild,
+                global_max_requests=config.rate_limit_global
+            )
+        self.token_quota: TokenQuotaManager = TokenQuotaManager(
+            config.token_quota_user_budget, config.token_quota_guild_budget,
+            config.token_quota_window, unit=config.token_quota_unit, db_path=config.quota_db_path, init_db=False
         )
-        self.rate_limiter: RateLimiter = RateLimiter(
-            config.rate_limit_per_user, config.rate_limit_window
+        # 天気・グルメなど、外部APIキーの呼び出し回数のクォータ
+        self.api_quota: APIQuotaManager = APIQuotaManager(
+            api_quota_limits(config), db_path=config.quota_db_path, init_db=False
         )
         self.stats: BotStats = BotStats()
-        self.http_session: Optional[aiohttp.ClientSession] = None
+        # クイズやViewなど、期限付きの対話状態を一元管理するスケジューラ
+        self.expiry_scheduler: ExpiryScheduler = ExpiryScheduler()
+        # 外部APIへのリクエストはすべてこのクライアントを経由する
+        self.http_client: HTTPClient = HTTPClient(
+            default_timeout=config.request_timeout,
+            limit_per_host=config.http_limit_per_host,
+            max_retries=config.http_max_retries,
+            host_timeouts=config.http_host_timeouts,
+            json_codec=load_json_codec(config.accelerated_runtime)
+        )
+        self.generator: OllamaGenerator = OllamaGenerator(
+            config, self.http_client, self.conversation_manager, self.token_quota,
+            on_connection_error=self._mark_ollama_offline
+        )
+        # 生成を別プロセスのワーカーに任せる場合のジョブキュー (worker.py が処理する)
+        self.job_queue: Optional[JobQueue] = None
+        if config.job_queue_enabled:
+            self.job_queue = JobQueue(
+                config.job_queue_db_path, lease_seconds=config.job_lease_seconds,
+                max_attempts=config.job_max_attempts, init_db=False
+            )
+        # ジョブの結果を受け取るための、このゲートウェイの識別子
+        self.job_origin: str = "gateway:" + (",".join(map(str, config.shard_ids)) or "all")
+        # {ジョブID: 応答の送信に失敗した回数}
+        self._job_send_failures: Dict[int, int] = {}
+        # 送信済み（またはあきらめた）が、キューからの削除がまだのジョブ。削除だけをやり直し、二重に送らない
+        self._finished_job_ids: Set[int] = set()
+        # イベントループの遅延と、ループを止めている呼び出し箇所の監視
+        self.loop_monitor: Optional[LoopMonitor] = None
+        if config.loop_monitor_enabled:
+            self.loop_monitor = LoopMonitor(threshold=config.loop_stall_threshold_ms / 1000)
+        # 管理者の指示でだけ動くCPUプロファイラ（普段は負荷をかけない）
+        self.profiler: LoopProfiler = LoopProfiler(max_seconds=config.profiler_max_seconds)
+        # RSSと確保中のメモリブロック数の定期記録と、管理者の指示で取るヒープの差分
+        self.memory_tracker: MemoryTracker = MemoryTracker(
+            interval=config.memory_sample_seconds, trace_frames=config.memory_trace_frames
+        )
+        # 再生用に、受け取ったイベントを匿名化して記録する (benchmarks/replay_traffic.py)
+        self.traffic_recorder: Optional[TrafficRecorder] = None
+        if config.traffic_record_dir:
+            self.traffic_recorder = TrafficRecorder(
+                config.traffic_record_dir, config.command_prefix,
+                is_command=lambda name: self.get_command(name) is not None,
+                label=f"shard{config.shard_ids[0]}-{config.shard_ids[-1]}" if config.shard_ids else ""
+            )
         self.ollama_status: str = "初期化中..."
         # on_readyが複数回呼ばれた際に、初回のみ初期化処理を行うためのフラグ
         self._is_first_ready: bool = True
+        # {起動処理の段階名: 所要秒数}
+        self.startup_timings: Dict[str, float] = {}
+        # 最初のコマンドで読み込む、未読み込みのCog
+        self._pending_lazy_cogs: List[str] = []
+        self._setup_started: bool = False
+
+    async def login(self, token: str) -> None:
+        """Discordへのログイン（HTTP通信）と並行して、setup_hookの初期化を進める。"""
+        await asyncio.gather(super().login(token), self.setup_hook())
 
     async def setup_hook(self) -> None:
         """
         Bot起動時の非同期初期化。
-        環境依存の問題を避けるため、主要な初期化はon_readyに移行。
+
+        ゲートウェイへの接続（on_ready）を待たずに、HTTPクライアントの準備、
+        各DBの初期化、Cogが依存するモジュールのインポートを並行して行い、
+        その後にCogを登録して定期タスクを開始する。
+        ライブラリ側からも呼ばれる場合に備え、2回目以降の呼び出しは何もしない。
         """
-        pass
+        if self._setup_started:
+            return
+        self._setup_started = True
+        setup_started_at = time.perf_counter()
+        # 起動処理そのものがループを止めていないかも計測する
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
+            self.stats.register_source(self.LOOP_STATS_LABEL, self.loop_monitor.describe)
+
+        lazy_names = set(self.config.lazy_cogs)
+        extensions = self._discover_cogs()
+        eager_extensions = [ext for ext in extensions if ext.split('.')[-1] not in lazy_names]
+        self._pending_lazy_cogs = [ext for ext in extensions if ext.split('.')[-1] in lazy_names]
+
+        # 1. 互いに依存しない初期化を並行して実行する（DBとインポートはワーカースレッドで行う）
+        await asyncio.gather(
+            self._timed("HTTPクライアント", self.http_client.start()),
+            self._timed("会話DB", asyncio.to_thread(self.conversation_manager.initialize)),
+            self._timed("クォータDB", asyncio.to_thread(self._initialize_quota_dbs)),
+            self._timed("共有状態DB", asyncio.to_thread(self._initialize_shared_state)),
+            self._timed("ジョブキューDB", asyncio.to_thread(self._initialize_job_queue)),
+            self._timed("Cogのインポート", self._preimport_cogs(eager_extensions)),
+        )
+        self.stats.register_source(self.HTTP_STATS_LABEL, self.http_client.describe)
+        self.stats.register_source(self.STARTUP_STATS_LABEL, self.describe_startup)
+        self.stats.register_source(self.RUNTIME_STATS_LABEL, lambda: describe_runtime(self.http_client.json_codec))
+
+        # 2. Cogの登録（Botの状態を変更するため、イベントループ上で行う）
+        started_at = time.perf_counter()
+        self._load_cogs(eager_extensions)
+        self.startup_timings["Cogの登録"] = time.perf_counter() - started_at
+
+        # 3. 定期タスクの開始
+        self.check_ollama_status_task.start()
+        self.expiry_scheduler.start()
+        self._register_memory_gauges()
+        self.memory_tracker.start()
+        self.stats.register_source(self.MEMORY_STATS_LABEL, self.memory_tracker.describe)
+        if self.traffic_recorder is not None:
+            self.traffic_recorder.start()
+            self.add_listener(self._record_message, 'on_message')
+            self.add_listener(self._record_interaction, 'on_interaction')
+            self.stats.register_source(self.TRAFFIC_STATS_LABEL, self.traffic_recorder.describe)
+        if self.job_queue is not None:
+            self.stats.register_source(self.JOB_QUEUE_STATS_LABEL, self.job_queue.describe)
+            self.deliver_job_results_task.start()
+
+        self.startup_timings["setup_hook合計"] = time.perf_counter() - setup_started_at
+        logger.info(f"起動時の初期化が完了しました: {self.describe_startup()}")
+        if self._pending_lazy_cogs:
+            logger.info(f"遅延読み込みのCog: {', '.join(self._pending_lazy_cogs)}")
+
+    async def _timed(self, phase: str, awaitable: Awaitable[T]) -> T:
+        """処理の所要時間を、起動処理の段階として記録する。"""
+        started_at = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - started_at
+
+    def _initialize_quota_dbs(self) -> None:
+        """同じDBファイルを使うクォータ管理を、順番に初期化する。"""
+        self.token_quota.initialize()
+        self.api_quota.initialize()
+
+    def _initialize_shared_state(self) -> None:
+        """プロセス間で共有するレート制限のDBを初期化する。"""
+        if isinstance(self.rate_limiter, SharedRateLimiter):
+            self.rate_limiter.initialize()
+
+    def _initialize_job_queue(self) -> None:
+        if self.job_queue is not None:
+            self.job_queue.initialize()
+
+    def _register_memory_gauges(self) -> None:
+        """長時間の稼働で増え続けやすい、Bot本体が保持する件数をメモリ監視に登録する。"""
+        self.memory_tracker.register_gauge("レート制限のバケット", self.rate_limiter.tracked_count)
+        self.memory_tracker.register_gauge("期限付きの状態", lambda: len(self.expiry_scheduler))
+        self.memory_tracker.register_gauge("メッセージキャッシュ", lambda: len(self.cached_messages))
+        self.memory_tracker.register_gauge("ユーザーキャッシュ", lambda: len(self.users))
+        self.memory_tracker.register_gauge("サーバー", lambda: len(self.guilds))
+
+    async def _record_message(self, message: nextcord.Message) -> None:
+        """受け取ったメッセージをトラフィックの記録に追加する（Botのメッセージは除く）。"""
+        if not message.author.bot:
+            self.traffic_recorder.record_message(message, self.user.id if self.user else None)
+
+    async def _record_interaction(self, interaction: nextcord.Interaction) -> None:
+        """ボタンの操作とモーダルの送信をトラフィックの記録に追加する。"""
+        self.traffic_recorder.record_interaction(interaction)
+
+    def describe_startup(self) -> str:
+        """統計表示用に、起動処理の段階ごとの所要時間を整形した文字列を返す。"""
+        if not self.startup_timings:
+            return "計測中"
+        return " / ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_timings.items())
 
     async def close(self) -> None:
         """Bot終了時に実行されるクリーンアップ処理。"""
         await super().close()
-        if self.http_session:
-            await self.http_session.close()
+        await self.expiry_scheduler.close()
+        self.stats.unregister_source(self.MEMORY_STATS_LABEL)
+        await self.memory_tracker.close()
+        if self.traffic_recorder is not None:
+            self.stats.unregister_source(self.TRAFFIC_STATS_LABEL)
+            await asyncio.to_thread(self.traffic_recorder.close)
+        if self.loop_monitor is not None:
+            self.stats.unregister_source(self.LOOP_STATS_LABEL)
+            await self.loop_monitor.close()
+        self.stats.unregister_source(self.HTTP_STATS_LABEL)
+        await self.http_client.close()
+
+    @staticmethod
+    def _discover_cogs() -> List[str]:
+        """`cogs`ディレクトリにある拡張機能の名前を返す。"""
+        return [
+            f'cogs.{filename[:-3]}' for filename in sorted(os.listdir('./cogs'))
+            if filename.endswith('.py') and not filename.startswith('__')
+        ]
+
+    @staticmethod
+    async def _preimport_cogs(extensions: List[str]) -> None:
+        """
+        Cogのモジュールを各ワーカースレッドで並行してインポートする。
+
+        Cogが依存するライブラリ（aiohttp、XMLパーサーなど）の読み込みを
+        イベントループの外で済ませ、続く `load_extension` を速くする。
+        失敗したCogは、`_load_cogs` で改めてエラーとして記録される。
+        """
+        await asyncio.gather(
+            *(asyncio.to_thread(importlib.import_module, extension) for extension in extensions),
+            return_exceptions=True
+        )
 
-    def _load_cogs(self) -> None:
-        """`cogs`ディレクトリから拡張機能を読み込む。"""
+    def _load_cogs(self, extensions: List[str]) -> None:
+        """指定された拡張機能を読み込む。"""
         logger.info("--- Cogの読み込みを開始します... ---")
-        for filename in os.listdir('./cogs'):
-            if filename.endswith('.py') and not filename.startswith('__'):
-                extension = f'cogs.{filename[:-3]}'
-                try:
-                    self.load_extension(extension)
-                    logger.info(f"SUCCESS: Cog '{extension}' の読み込みに成功しました。")
-                except Exception as e:
-                    logger.error(f"FAILED: Cog '{extension}' の読み込みに失敗しました。", exc_info=e)
+        for extension in extensions:
+            try:
+                self.load_extension(extension)
+                logger.info(f"SUCCESS: Cog '{extension}' の読み込みに成功しました。")
+            except Exception as e:
+                logger.error(f"FAILED: Cog '{extension}' の読み込みに失敗しました。", exc_info=e)
+
+    def _load_lazy_cogs(self) -> None:
+        """遅延読み込みのCogをすべて読み込む。"""
+        extensions, self._pending_lazy_cogs = self._pending_lazy_cogs, []
+        started_at = time.perf_counter()
+        self._load_cogs(extensions)
+        self.startup_timings["遅延Cogの読み込み"] = time.perf_counter() - started_at
 
     async def set_bot_presence(self, busy: bool = False) -> None:
         """Botのプレゼンス（ステータス）を設定する。"""
         if busy:
             activity = nextcord.Game(name="思考中... 🧠")
-            logger.info("ステータスをビジーに変更")
+            logger.info("ステータスをビジーに変更", extra=SAMPLED)
         else:
             activity = nextcord.Game(name=self.config.ollama_model_name)
-            logger.info(f"ステータスをアイドルに変更: {self.config.ollama_model_name}")
+            logger.info("ステータスをアイドルに変更: %s", self.config.ollama_model_name, extra=SAMPLED)
         await self.change_presence(status=nextcord.Status.online, activity=activity)
 
-    async def ask_ai_inu(self, question: str, user_id: int) -> tuple[str, bool, float]:
-        """Ollama APIに問い合わせて、AI犬としての応答を生成する。"""
-        start_time = time.time()
-        context = self.conversation_manager.get_context(user_id)
-        prompt = PERSONA_PROMPT_TEMPLATE.format(context=context, question=question)
-
-        payload = {
-            "model": self.config.ollama_model_name,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "temperature": self.config.ollama_temperature,
-                "num_ctx": self.config.ollama_num_ctx,
-                "top_p": self.config.ollama_top_p,
-                "repeat_penalty": self.config.ollama_repeat_penalty
-            }
-        }
+    async def ask_ai_inu(self, question: str, user_id: int, guild_id: Optional[int] = None) -> tuple[str, bool, float]:
+        """
+        Ollama APIに問い合わせて、AI犬としての応答を生成する。
+        応答に含まれるトークン数（または推論時間）は、ユーザーとサーバーのクォータに計上する。
+        """
+        return await self.generator.generate(question, user_id, guild_id)
 
-        try:
-            async with self.http_session.post(
-                self.config.ollama_api_url, json=payload, timeout=self.config.request_timeout
-            ) as response:
-                response.raise_for_status()
-                response_data = await response.json()
-
-            model_response = response_data.get("response", "").strip()
-            if not model_response:
-                logger.warning(f"モデル空応答 (User: {user_id}): {response_data}")
-                return "AI犬、ちょっと言葉に詰まっちゃったワン…", False, time.time() - start_time
-
-            for prefix in CLEANUP_PREFIXES:
-                if model_response.lower().startswith(prefix.lower()):
-                    model_response = model_response[len(prefix):].strip()
-
-            return model_response, True, time.time() - start_time
-
-        except asyncio.TimeoutError:
-            logger.warning(f"Ollama APIタイムアウト (User: {user_id})")
-            return "うーん、考えるのに時間がかかりすぎちゃったワン！", False, time.time() - start_time
-        except aiohttp.ClientError as e:
-            logger.error(f"Ollama API接続/リクエストエラー (User: {user_id}): {e}", exc_info=True)
-            self.ollama_status = "オフライン"
-            return "わん！ご主人様、AI犬の脳みそと繋がらないみたい…。", False, time.time() - start_time
-        except Exception as e:
-            logger.error(f"ask_ai_inu予期せぬエラー (User: {user_id}): {e}", exc_info=True)
-            return "わわっ！AI犬、ちょっと混乱しちゃったみたい！", False, time.time() - start_time
+    def _mark_ollama_offline(self) -> None:
+        self.ollama_status = "オフライン"
 
     # --- イベントハンドラ ---
     async def on_ready(self) -> None:
         """
         BotがDiscordに接続し、準備が完了したときに呼び出される。
-        初回起動時に主要な初期化処理をすべてここで行う。
+        初期化は setup_hook で済んでいるため、ここでは起動完了の記録と表示だけを行う。
         """
         if self._is_first_ready:
             # --- 初回起動時のみ実行する処理 ---
             logger.info("Botの初回起動処理を開始します。")
 
-            # 1. aiohttpセッションの初期化
-            self.http_session = aiohttp.ClientSession(
-                timeout=aiohttp.ClientTimeout(total=self.config.request_timeout)
-            )
-            logger.info("aiohttp.ClientSessionが正常に初期化されました。")
-
-            # 2. Cogの読み込み
-            self._load_cogs()
+            # 1. 起動にかかった時間の記録
+            self.startup_timings["プロセス開始→ready"] = time.perf_counter() - _PROCESS_STARTED_AT
+            logger.info(f"起動処理の所要時間: {self.describe_startup()}")
 
-            # 3. 定期タスクの開始
-            self.check_ollama_status_task.start()
-            logger.info("定期実行タスクを開始しました。")
-
-            # 4. 起動完了メッセージの表示
+            # 2. 起動完了メッセージの表示
             logger.info(f'AI犬「{self.user.name}」(モデル: {self.config.ollama_model_name}) が起動したワン！')
             print_lines = [
                 f'{"="*60}',
@@ -256,7 +365,7 @@ class AIDogBot(commands.Bot):
             print('\n'.join(print_lines))
             print("ご主人様からのお話、いつでも待ってるワン！\n" + "="*60)
 
-            # 5. 初回起動フラグをFalseに設定
+            # 3. 初回起動フラグをFalseに設定
             self._is_first_ready = False
         else:
             # --- 再接続時の処理 ---
@@ -283,11 +392,29 @@ class AIDogBot(commands.Bot):
             return
 
         # レートリミットを確認
-        is_limited, wait_time = self.rate_limiter.is_rate_limited(message.author.id)
+        guild_id = message.guild.id if message.guild else None
+        if isinstance(self.rate_limiter, SharedRateLimiter):
+            # 共有DBは他のプロセスの書き込みを待つことがあるため、ワーカースレッドで確認する
+            is_limited, wait_time = await asyncio.to_thread(
+                self.rate_limiter.is_rate_limited, message.author.id, guild_id
+            )
+        else:
+            is_limited, wait_time = self.rate_limiter.is_rate_limited(message.author.id, guild_id)
         if is_limited:
             await message.channel.send(f"{message.author.mention} ちょっとお話疲れちゃった… {wait_time}秒待ってね！")
             return
 
+        # GPU使用量のクォータを確認（共有DBを待つことがあるため、ワーカースレッドで確認する）
+        over_budget, wait_time = await asyncio.to_thread(
+            self.token_quota.check_budget, message.author.id, guild_id
+        )
+        if over_budget:
+            await message.channel.send(
+                f"{message.author.mention} いっぱい考えすぎて頭がオーバーヒートしちゃったワン… "
+                f"{wait_time}秒くらい休ませてね！ (`{self.config.command_prefix}quota` で残量を確認できるよ)"
+            )
+            return
+
         # メンション部分をメッセージから除去
         raw_question = message.content
         if not isinstance(message.channel, nextcord.DMChannel):
@@ -301,13 +428,19 @@ class AIDogBot(commands.Bot):
             await message.channel.send(f"{message.author.mention} わん！AI犬にご用かな？")
             return
 
+        if self.job_queue is not None:
+            await self._enqueue_generation(message, sanitize_input(question), guild_id)
+            return
+
         try:
             await self.set_bot_presence(busy=True)
             sanitized_question = sanitize_input(question)
 
             async with message.channel.typing():
-                logger.info(f"質問受付 - User: {message.author.name}, Q: {sanitized_question[:50]}")
-                reply_text, success, response_time = await self.ask_ai_inu(sanitized_question, message.author.id)
+                logger.info("質問受付 - User: %s, Q: %.50s", message.author.name, sanitized_question, extra=SAMPLED)
+                reply_text, success, response_time = await self.ask_ai_inu(
+                    sanitized_question, message.author.id, guild_id
+                )
 
                 self.stats.record_request(success, response_time)
                 if success:
@@ -318,16 +451,63 @@ class AIDogBot(commands.Bot):
 
                 user_mention = f"{message.author.mention} " if not isinstance(message.channel, nextcord.DMChannel) else ""
                 await message.channel.send(f"{user_mention}{reply_text}")
-                logger.info(f"応答完了 - Time: {response_time:.2f}s, Success: {success}")
+                logger.info("応答完了 - Time: %.2fs, Success: %s", response_time, success, extra=SAMPLED)
 
         finally:
             await self.set_bot_presence(busy=False)
 
+    async def _enqueue_generation(self, message: nextcord.Message, question: str, guild_id: Optional[int]) -> None:
+        """生成依頼をジョブキューに積む。応答は `deliver_job_results_task` が送信する。"""
+        payload = {
+            "channel_id": message.channel.id,
+            "message_id": message.id,
+            "user_id": message.author.id,
+            "guild_id": guild_id,
+            "mention": not isinstance(message.channel, nextcord.DMChannel),
+            "question": question,
+        }
+        try:
+            job_id = await asyncio.to_thread(self.job_queue.enqueue, self.job_origin, payload)
+        except Exception as e:
+            logger.error(f"ジョブキューへの登録に失敗しました (User: {message.author.id}): {e}", exc_info=True)
+            await message.channel.send(f"{message.author.mention} わわっ！AI犬、ちょっと混乱しちゃったみたい！")
+            return
+        logger.info("質問受付 (ジョブ %d) - User: %s, Q: %.50s", job_id, message.author.name, question, extra=SAMPLED)
+        await message.channel.trigger_typing()
+
+    async def _deliver_job_result(self, job) -> None:
+        """完了したジョブの応答を、依頼元のチャンネルに送信する。"""
+        payload, result = job.payload, job.result
+        channel = self.get_channel(payload["channel_id"])
+        if channel is None:
+            try:
+                channel = await self.fetch_channel(payload["channel_id"])
+            except (nextcord.NotFound, nextcord.Forbidden) as e:
+                # 削除された・見られないチャンネルには再送しても届かないため、送信済みとして扱う
+                logger.warning(f"ジョブ {job.job_id} の送信先チャンネルが見つかりません: {e}")
+                self.stats.record_request(result["success"], result["response_time"])
+                return
+
+        reply_text = result["reply"]
+        if len(reply_text) > self.config.max_response_length:
+            reply_text = reply_text[:self.config.max_response_length] + "…（文字数制限のため省略）"
+        user_mention = f"<@{payload['user_id']}> " if payload["mention"] else ""
+        await channel.send(f"{user_mention}{reply_text}")
+        # 再送した場合に二重に数えないよう、送信できてから記録する
+        self.stats.record_request(result["success"], result["response_time"])
+        logger.info(
+            "応答完了 (ジョブ %d) - Time: %.2fs, Success: %s",
+            job.job_id, result['response_time'], result['success'], extra=SAMPLED
+        )
+
     async def on_command_error(self, ctx: commands.Context, error: commands.CommandError) -> None:
         """コマンドの実行でエラーが発生したときに呼び出される。"""
         if isinstance(error, commands.CommandNotFound):
-            # 存在しないコマンドは無視
-            pass
+            # 遅延読み込みのCogがあれば読み込んで、もう一度コマンドを処理する
+            # (それでも見つからないコマンドは無視する)
+            if self._pending_lazy_cogs:
+                self._load_lazy_cogs()
+                await self.process_commands(ctx.message)
         elif isinstance(error, commands.MissingRequiredArgument):
             await ctx.send(f"わん！「`{ctx.command.name}`」に必要なものが足りないみたい！")
         elif isinstance(error, (commands.NotOwner, commands.CheckFailure)):
@@ -343,7 +523,7 @@ class AIDogBot(commands.Bot):
     @tasks.loop(minutes=2)
     async def check_ollama_status_task(self) -> None:
         """Ollama APIサーバーの稼働状況を定期的にチェックする。"""
-        if not self.http_session or self.http_session.closed:
+        if self.http_client.closed:
             return
 
         try:
@@ -352,7 +532,7 @@ class AIDogBot(commands.Bot):
             ollama_root_url = f"{parsed_url.scheme}://{parsed_url.netloc}/"
             
             # OllamaのルートURLにアクセスすると、稼働していればステータス200が返る
-            async with self.http_session.get(ollama_root_url, timeout=5) as response:
+            async with self.http_client.get(ollama_root_url, timeout=5, retries=0) as response:
                 # 念のため、応答テキストに "Ollama is running" が含まれるかも確認すると、より確実性が増します
                 text_content = await response.text()
                 if response.status == 200 and "Ollama is running" in text_content:
@@ -362,25 +542,90 @@ class AIDogBot(commands.Bot):
         except (aiohttp.ClientError, asyncio.TimeoutError):
             self.ollama_status = "オフライン"
 
+    @tasks.loop(seconds=JOB_RESULT_POLL_SECONDS)
+    async def deliver_job_results_task(self) -> None:
+        """
+        ワーカーが書き戻した結果を依頼元のチャンネルに送信する。
+
+        送信できてからジョブを削除するため、途中でBotが止まっても結果は失われない
+        （再起動後に同じ応答がもう一度送られることはある）。送信に失敗したジョブは次の確認で
+        送り直し、`JOB_DELIVERY_MAX_ATTEMPTS` 回失敗したらあきらめて削除する。
+        1件の失敗でループが止まらないよう、ジョブごとの例外はすべてログに記録して次に進む。
+        """
+        try:
+            jobs = await asyncio.to_thread(self.job_queue.fetch_results, self.job_origin)
+        except Exception as e:
+            logger.error(f"ジョブの結果の取得に失敗しました: {e}")
+            return
+        for job in jobs:
+            try:
+                if job.job_id not in self._finished_job_ids:
+                    try:
+                        await self._deliver_job_result(job)
+                    except Exception as e:
+                        failures = self._job_send_failures.get(job.job_id, 0) + 1
+                        if failures < JOB_DELIVERY_MAX_ATTEMPTS:
+                            self._job_send_failures[job.job_id] = failures
+                            logger.warning(f"ジョブ {job.job_id} の応答の送信に失敗しました ({failures}回目、次の確認で送り直します): {e}")
+                            continue
+                        logger.error(
+                            f"ジョブ {job.job_id} の応答を{failures}回送信できなかったため、あきらめます: {e}",
+                            exc_info=not isinstance(e, nextcord.HTTPException)
+                        )
+                    self._job_send_failures.pop(job.job_id, None)
+                    self._finished_job_ids.add(job.job_id)
+                await asyncio.to_thread(self.job_queue.mark_delivered, job.job_id)
+                self._finished_job_ids.discard(job.job_id)
+            except Exception as e:
+                logger.error(f"ジョブ {job.job_id} をキューから削除できませんでした（次の確認でやり直します）: {e}")
+
+    @deliver_job_results_task.before_loop
+    async def before_deliver_job_results(self):
+        """チャンネルを参照できるよう、Botが準備完了するのを待つ。"""
+        await self.wait_until_ready()
+
     @check_ollama_status_task.before_loop
     async def before_check_ollama_status(self):
         """タスク開始前にBotが準備完了するのを待つ。"""
         await self.wait_until_ready()
 
 
+class ShardedAIDogBot(AIDogBot, commands.AutoShardedBot):
+    """
+    複数のシャードでゲートウェイに接続するAI犬Bot。
+
+    1プロセスで複数のシャードを扱うほか、`launcher.py` からシャードの範囲
+    (`SHARD_IDS`) を分けて複数プロセスで起動できる。その場合、レート制限や
+    クォータは `SHARED_STATE_DB_PATH` などのSQLiteファイルを通じて共有する。
+    """
+
+
 def main():
     """Botを起動するためのメイン関数。"""
     logger.info("AI犬ボットを起動準備中だワン...")
     try:
         # 設定の読み込みと検証
         config = load_and_validate_config()
+        setup_logging_from_config(config)
+        # イベントループはBotの作成前に切り替える
+        if install_event_loop(config.accelerated_runtime):
+            logger.info("高速化モード: イベントループに uvloop を使います。")
 
         # インテントの設定
         intents = nextcord.Intents.default()
         intents.message_content = True
 
         # Botインスタンスの作成と実行
-        bot = AIDogBot(config=config, intents=intents)
+        if config.auto_shard:
+            bot = ShardedAIDogBot(
+                config=config, intents=intents,
+                shard_count=config.shard_count or None,
+                shard_ids=config.shard_ids or None
+            )
+            shard_range = ', '.join(map(str, config.shard_ids)) if config.shard_ids else "全シャード"
+            logger.info(f"自動シャーディングで起動します (担当: {shard_range} / 総数: {config.shard_count or '推奨数'})")
+        else:
+            bot = AIDogBot(config=config, intents=intents)
         bot.run(config.bot_token)
 
     except (ValueError, FileNotFoundError) as e:
@@ -8,22 +8,27 @@ Discord Bot「AI犬」の管理者向けコマンドを定義するCog。
 """
 
 # --- 標準ライブラリのインポート ---
+import asyncio
+import io
 import logging
-from typing import TYPE_CHECKING
+from datetime import datetime
+from typing import TYPE_CHECKING, Awaitable, Callable, Iterable, List, Set, Tuple
 
 # --- サードパーティライブラリのインポート ---
 import nextcord
 from nextcord.ext import commands
 
 # --- 自作モジュールのインポート ---
+from utils.api_quota import describe_wait
+from utils.memory_tracker import MemoryDiff, format_bytes
+from utils.profiler import MODES, ProfilerBusy
 # from config import load_and_validate_config
 # ↑ reloadcfg内で直接呼び出すため、トップレベルでのインポートは不要
 
 # 型ヒントのために 'AIDogBot' クラスをインポートする（循環参照を避ける）
 if TYPE_CHECKING:
     from bot_main import AIDogBot
-    from utils.conversation_manager import ConversationManager
-    from utils.bot_utils import RateLimiter
+    from config import BotConfig
 
 # このCog用のロガーを取得
 logger = logging.getLogger(__name__)
@@ -48,9 +53,142 @@ def is_admin():
 class AdminCog(commands.Cog, name="管理者コマンド"):
     """管理者専用のコマンドをまとめたCog"""
 
+    # --- クラス定数 ---
+    # コンポーネントごとに、反映が必要な設定項目
+    RATE_LIMIT_FIELDS = {'rate_limit_per_user', 'rate_limit_window', 'rate_limit_per_guild', 'rate_limit_global'}
+    CONVERSATION_FIELDS = {'max_conversation_history', 'conversation_db_path'}
+    TOKEN_QUOTA_FIELDS = {'token_quota_user_budget', 'token_quota_guild_budget', 'token_quota_window', 'token_quota_unit'}
+    API_QUOTA_FIELDS = {
+        'openweathermap_quota_per_minute', 'openweathermap_quota_per_day',
+        'hotpepper_quota_per_minute', 'hotpepper_quota_per_day'
+    }
+    HTTP_CLIENT_FIELDS = {'request_timeout', 'http_max_retries', 'http_host_timeouts'}
+    LOOP_MONITOR_FIELDS = {'loop_stall_threshold_ms'}
+    PROFILER_FIELDS = {'profiler_max_seconds'}
+    MEMORY_FIELDS = {'memory_sample_seconds', 'memory_trace_frames'}
+    # 実行中には反映できず、再起動が必要な設定項目
+    RESTART_REQUIRED_FIELDS = {'bot_token', 'quota_db_path', 'http_limit_per_host', 'lazy_cogs',
+                               'auto_shard', 'shard_count', 'shard_ids', 'shared_state_db_path',
+                               'job_queue_enabled', 'job_queue_db_path', 'job_lease_seconds',
+                               'job_max_attempts', 'worker_concurrency', 'loop_monitor_enabled',
+                               'log_file', 'log_level', 'log_max_bytes', 'log_backup_count',
+                               'log_rotate_when', 'log_json', 'log_sample_every', 'traffic_record_dir',
+                               'accelerated_runtime'}
+    # 変更通知で値を伏せる設定項目
+    SECRET_FIELDS = {'bot_token', 'openweathermap_api_key', 'hotpepper_api_key'}
+
     def __init__(self, bot: 'AIDogBot'):
         self.bot = bot
 
+    def _config_steps(self) -> List[Tuple[str, Set[str], Callable[['BotConfig'], Awaitable[None]]]]:
+        """
+        設定をその場で反映できるコンポーネントの一覧を返す。
+
+        各要素は (コンポーネント名, 反映が必要な設定項目, 設定を反映する関数)。
+        反映する関数は、失敗時に元の設定へ戻すためにも使うため、渡された設定の値をそのまま適用する。
+        """
+        bot = self.bot
+        steps: List[Tuple[str, Set[str], Callable[['BotConfig'], Awaitable[None]]]] = []
+
+        async def apply_command_prefix(config: 'BotConfig') -> None:
+            bot.command_prefix = config.command_prefix
+        steps.append(("command_prefix", {'command_prefix'}, apply_command_prefix))
+
+        if hasattr(bot, 'rate_limiter'):
+            async def apply_rate_limiter(config: 'BotConfig') -> None:
+                bot.rate_limiter.reconfigure(
+                    config.rate_limit_per_user, config.rate_limit_window,
+                    guild_max_requests=config.rate_limit_per_guild,
+                    global_max_requests=config.rate_limit_global
+                )
+                logger.info("RateLimiterの制限値をその場で変更しました（既存の制限状態は維持）。")
+            steps.append(("RateLimiter", self.RATE_LIMIT_FIELDS, apply_rate_limiter))
+
+        if hasattr(bot, 'conversation_manager'):
+            async def apply_conversation_manager(config: 'BotConfig') -> None:
+                # DBパスの変更時はDDLが走るため、イベントループを止めないよう別スレッドで実行する
+                await asyncio.to_thread(
+                    bot.conversation_manager.reconfigure,
+                    config.max_conversation_history, config.conversation_db_path
+                )
+                logger.info("ConversationManagerの設定をその場で変更しました。")
+            steps.append(("ConversationManager", self.CONVERSATION_FIELDS, apply_conversation_manager))
+
+        if hasattr(bot, 'token_quota'):
+            async def apply_token_quota(config: 'BotConfig') -> None:
+                bot.token_quota.reconfigure(
+                    config.token_quota_user_budget, config.token_quota_guild_budget,
+                    config.token_quota_window, config.token_quota_unit
+                )
+                logger.info("TokenQuotaManagerの予算をその場で変更しました（記録済みの使用量は維持）。")
+            steps.append(("TokenQuotaManager", self.TOKEN_QUOTA_FIELDS, apply_token_quota))
+
+        if hasattr(bot, 'api_quota'):
+            async def apply_api_quota(config: 'BotConfig') -> None:
+                from config import api_quota_limits
+                bot.api_quota.reconfigure(api_quota_limits(config))
+                logger.info("APIQuotaManagerの上限をその場で変更しました（その日の使用回数は維持）。")
+            steps.append(("APIQuotaManager", self.API_QUOTA_FIELDS, apply_api_quota))
+
+        if hasattr(bot, 'http_client'):
+            async def apply_http_client(config: 'BotConfig') -> None:
+                bot.http_client.reconfigure(config.request_timeout, config.http_max_retries, config.http_host_timeouts)
+                logger.info("HTTPClientの再試行回数とタイムアウトをその場で変更しました（接続プールは維持）。")
+            steps.append(("HTTPClient", self.HTTP_CLIENT_FIELDS, apply_http_client))
+
+        if getattr(bot, 'loop_monitor', None) is not None:
+            async def apply_loop_monitor(config: 'BotConfig') -> None:
+                bot.loop_monitor.threshold = config.loop_stall_threshold_ms / 1000
+                logger.info("LoopMonitorのしきい値をその場で変更しました（これまでの集計は維持）。")
+            steps.append(("LoopMonitor", self.LOOP_MONITOR_FIELDS, apply_loop_monitor))
+
+        if hasattr(bot, 'profiler'):
+            async def apply_profiler(config: 'BotConfig') -> None:
+                bot.profiler.max_seconds = config.profiler_max_seconds
+            steps.append(("LoopProfiler", self.PROFILER_FIELDS, apply_profiler))
+
+        if hasattr(bot, 'memory_tracker'):
+            async def apply_memory_tracker(config: 'BotConfig') -> None:
+                bot.memory_tracker.reconfigure(config.memory_sample_seconds, config.memory_trace_frames)
+            steps.append(("MemoryTracker", self.MEMORY_FIELDS, apply_memory_tracker))
+
+        return steps
+
+    async def _apply_config_changes(self, old_config: 'BotConfig', new_config: 'BotConfig',
+                                    changed: Iterable[str]) -> List[str]:
+        """
+        変更された設定項目だけを、各コンポーネントにその場で反映する。
+
+        それ以外の設定（Ollamaのパラメータや各種APIキーなど）は
+        呼び出しのたびに `bot.config` から参照されるため、configの差し替えだけで反映される。
+        途中のコンポーネントで失敗した場合は、反映済みのコンポーネントを `old_config` に戻してから
+        例外を送出するため、Botが新旧の設定の混ざった状態で動き続けることはない。
+
+        Args:
+            old_config (BotConfig): 現在の設定。失敗時に戻す値として使う。
+            new_config (BotConfig): 新しい設定。
+            changed (Iterable[str]): 値が変わった設定項目名。
+
+        Returns:
+            List[str]: 設定を反映したコンポーネント名のリスト。
+        """
+        changed = set(changed)
+        applied: List[Tuple[str, Callable[['BotConfig'], Awaitable[None]]]] = []
+        try:
+            for name, fields, apply in self._config_steps():
+                if changed & fields:
+                    await apply(new_config)
+                    applied.append((name, apply))
+        except Exception:
+            for name, apply in reversed(applied):
+                try:
+                    await apply(old_config)
+                except Exception as e:
+                    logger.error(f"{name} を元の設定に戻せませんでした: {e}", exc_info=True)
+            logger.warning(f"設定の反映に失敗したため、{len(applied)}件のコンポーネントを元の設定に戻しました。")
+            raise
+        return [name for name, _ in applied]
+
     @commands.command(
         name='reloadcfg',
         help="設定を再読み込みします（管理者専用）。",
@@ -62,49 +200,35 @@ class AdminCog(commands.Cog, name="管理者コマンド"):
         環境変数ファイル(.env)から設定を再読み込みし、ボットに適用する。
 
         このコマンドはBotを再起動することなく、ほとんどの設定を動的に変更します。
+        変更された項目だけを各コンポーネントに反映するため、レート制限の状態などの
+        実行時の状態はリロード後も保持されます。
         """
         logger.info(f"管理者 {ctx.author.name} ({ctx.author.id}) による設定再読み込み要求。")
         await ctx.send("AI犬、設定ファイルをもう一度読み込んでみるワン！⚙️")
 
         try:
-            # --- 1. 設定の再読み込み ---
+            # --- 1. 設定の再読み込みと差分の算出 ---
             # configモジュールを直接インポートして関数を呼び出す
-            from config import load_and_validate_config
+            from config import load_and_validate_config, diff_config
             old_config = self.bot.config
             new_config = load_and_validate_config()
-            self.bot.config = new_config
-
-            # --- 2. Botコンポーネントへの設定適用 ---
-            # !! 注意: 以下の処理は、関連するオブジェクトの状態をリセットします !!
-            # 例えば、レートリミッターは全ユーザーの制限状態を初期化します。
-            # 会話マネージャーも履歴を再初期化する可能性があります（実装による）。
-            self.bot.command_prefix = new_config.command_prefix
-
-            # ConversationManagerとRateLimiterを新しい設定で再インスタンス化
-            if hasattr(self.bot, 'conversation_manager'):
-                conv_manager_class: 'ConversationManager' = self.bot.conversation_manager.__class__
-                self.bot.conversation_manager = conv_manager_class(
-                    new_config.max_conversation_history, db_path=new_config.conversation_db_path
-                )
-                logger.info("ConversationManagerを新しい設定で再初期化しました。")
-
-            if hasattr(self.bot, 'rate_limiter'):
-                rate_limiter_class: 'RateLimiter' = self.bot.rate_limiter.__class__
-                self.bot.rate_limiter = rate_limiter_class(
-                    new_config.rate_limit_per_user, new_config.rate_limit_window
-                )
-                logger.info("RateLimiterを新しい設定で再初期化しました。")
+            changed = diff_config(old_config, new_config)
 
-            logger.info("設定の再適用完了。変更点を比較します。")
+            # --- 2. 変更された項目だけを各コンポーネントへ反映 ---
+            # コンポーネントは作り直さずにその場で設定を変更するため、
+            # レート制限の状態や会話DBはリロード後もそのまま引き継がれる。
+            applied = await self._apply_config_changes(old_config, new_config, changed.keys())
+            self.bot.config = new_config
+            logger.info(f"設定の差分適用完了。反映先: {', '.join(applied) if applied else 'なし'}")
 
-            # --- 3. 変更点の比較と通知 ---
+            # --- 3. 変更点の通知 ---
             changes = []
-            old_config_dict = old_config.__dict__
-            for key in sorted(old_config_dict.keys()):
-                old_value = old_config_dict.get(key)
-                new_value = getattr(new_config, key, None)
-                if str(old_value) != str(new_value):
-                    changes.append(f"• `{key}`: `{old_value}` → `{new_value}`")
+            for key in sorted(changed.keys()):
+                old_value, new_value = changed[key]
+                if key in self.SECRET_FIELDS:
+                    old_value = new_value = "********"
+                note = " (再起動後に反映)" if key in self.RESTART_REQUIRED_FIELDS else ""
+                changes.append(f"• `{key}`: `{old_value}` → `{new_value}`{note}")
 
             if changes:
                 # DiscordのEmbed descriptionの文字数制限(4096)を考慮
@@ -117,6 +241,8 @@ class AdminCog(commands.Cog, name="管理者コマンド"):
                     description=f"AI犬が新しい設定でパワーアップ！🔋\n\n**変更点:**\n{change_summary}",
                     color=nextcord.Color.orange()  # 0xffa500
                 )
+                if applied:
+                    embed.add_field(name="反映先", value=", ".join(applied), inline=False)
                 await ctx.send(embed=embed)
                 logger.info(f"設定更新完了。変更点:\n{change_summary}")
             else:
@@ -129,9 +255,222 @@ class AdminCog(commands.Cog, name="管理者コマンド"):
             await ctx.send(error_message)
             logger.error(f"設定再読み込み失敗: {e}")
         except Exception as e:
-            await ctx.send(f"設定の再読み込み中に、予期せぬエラーが発生しちゃった…\nエラー: `{str(e)}`")
+            await ctx.send(f"設定の再読み込み中に、予期せぬエラーが発生しちゃった…設定は変更前のままだワン。\nエラー: `{str(e)}`")
             logger.error("設定再読み込み中に予期せぬエラーが発生しました。", exc_info=True)
 
+    @commands.command(
+        name='apiquota',
+        aliases=['API残量'],
+        help="外部APIキーのクォータ残量を表示します（管理者専用）。",
+        brief="天気・グルメAPIの残り呼び出し回数を表示します。"
+    )
+    @is_admin()
+    async def api_quota_command(self, ctx: commands.Context):
+        """APIキーごとの、分あたり・日あたりのクォータの残量を表示する。"""
+        embed = nextcord.Embed(
+            title="🔑 外部APIのクォータ残量",
+            color=nextcord.Color.orange(),  # 0xffa500
+            timestamp=datetime.now()
+        )
+        # 共有DBを読むため、ワーカースレッドで取得する
+        remaining = await asyncio.to_thread(self.bot.api_quota.get_remaining)
+        for api, info in remaining.items():
+            lines = []
+            if info['minute_remaining'] is not None:
+                lines.append(f"分あたり: 残り **{info['minute_remaining']}** / {info['per_minute']}")
+            if info['day_remaining'] is not None:
+                lines.append(f"今日: 残り **{info['day_remaining']:,}** / {info['per_day']:,} (使用 {info['day_used']:,})")
+            else:
+                lines.append(f"今日: 使用 {info['day_used']:,} (上限なし)")
+            if self.bot.api_quota.is_low(api):
+                lines.append("⚠️ 残りわずかのため、保存済みの結果を優先して応答中")
+            embed.add_field(name=api, value="\n".join(lines), inline=False)
+        embed.set_footer(text=f"空きを待つ最大時間: {describe_wait(self.bot.config.api_quota_queue_wait)}")
+        await ctx.send(embed=embed)
+
+
+    @commands.command(
+        name='loopmon',
+        aliases=['ループ監視'],
+        help="イベントループの遅延と、ループを止めている呼び出し箇所を表示します（管理者専用）。`reset` で集計を消去します。",
+        brief="イベントループの遅延を表示します。"
+    )
+    @is_admin()
+    async def loop_monitor_command(self, ctx: commands.Context, action: str = None):
+        """遅延のヒストグラムと、停止時間の長い呼び出し箇所の上位を表示する。"""
+        monitor = self.bot.loop_monitor
+        if monitor is None:
+            await ctx.send("イベントループの監視は無効になっているワン。(`LOOP_MONITOR_ENABLED=true` で有効になるよ)")
+            return
+        if action == "reset":
+            monitor.reset()
+            await ctx.send("イベントループの監視結果をリセットしたワン！")
+            return
+
+        summary = monitor.summary()
+        embed = nextcord.Embed(
+            title="⏱️ イベントループの遅延",
+            description=(
+                f"平均 **{summary['average_ms']:.1f}ms** / p50 ≤{monitor.percentile(0.5):.0f}ms / "
+                f"p99 ≤{monitor.percentile(0.99):.0f}ms / 最大 **{summary['max_ms']:.0f}ms**\n"
+                f"{monitor.threshold * 1000:.0f}ms以上の停止: **{summary['stalls']}回** "
+                f"(計測 {summary['samples']:,}回)"
+            ),
+            color=nextcord.Color.dark_teal(),
+            timestamp=datetime.now()
+        )
+        histogram = monitor.histogram()
+        peak = max((count for _, count in histogram), default=0) or 1
+        bars = "\n".join(
+            f"{label:>11} {'█' * max(1 if count else 0, round(count / peak * 20)):<20} {count:,}"
+            for label, count in histogram
+        )
+        embed.add_field(name="ヒストグラム", value=f"```\n{bars}\n```", inline=False)
+
+        top_sites = monitor.top_sites()
+        if top_sites:
+            lines = [
+                f"{rank}. `{site}` — {stalled:.2f}秒 ({samples}回採取)"
+                for rank, (site, samples, stalled, _) in enumerate(top_sites, start=1)
+            ]
+            embed.add_field(name="ループを止めていた箇所", value="\n".join(lines)[:1024], inline=False)
+            # 最も長く止めていた箇所の、直近のスタック（末尾ほど内側の呼び出し）
+            stack = top_sites[0][3][-(1024 - 10):]
+            embed.add_field(name="直近のスタック (1位)", value=f"```\n{stack}\n```", inline=False)
+        else:
+            embed.add_field(name="ループを止めていた箇所", value="まだ検出されていないワン！", inline=False)
+        embed.set_footer(text=f"集計開始: {datetime.fromtimestamp(monitor.started_at):%Y-%m-%d %H:%M:%S}")
+        await ctx.send(embed=embed)
+
+
+    @commands.command(
+        name='profile',
+        aliases=['プロファイル'],
+        help=(
+            "Botを動かしたまま、指定秒数だけCPUプロファイルを取ってファイルで送ります（管理者専用）。"
+            "方式は sampling (既定) か cprofile。例: `profile 10 cprofile`"
+        ),
+        brief="CPUプロファイルを取得します。"
+    )
+    @is_admin()
+    async def profile_command(self, ctx: commands.Context, seconds: int = 10, mode: str = 'sampling'):
+        """イベントループのCPUプロファイルを取り、レポートをテキストファイルとして送信する。"""
+        profiler = self.bot.profiler
+        mode = mode.lower()
+        if mode not in MODES:
+            await ctx.send(f"わん？方式は {' / '.join(f'`{m}`' for m in MODES)} から選んでね！")
+            return
+        if profiler.running:
+            await ctx.send("いまは別のプロファイルを取っているところだワン！終わるまで待ってね。")
+            return
+        seconds = max(1, min(seconds, int(profiler.max_seconds)))
+
+        await ctx.send(f"🔬 {seconds}秒間、CPUプロファイル ({mode}) を取るワン！")
+        try:
+            report = await profiler.run(seconds, mode)
+        except ProfilerBusy:
+            await ctx.send("いまは別のプロファイルを取っているところだワン！終わるまで待ってね。")
+            return
+        logger.info(f"管理者 {ctx.author} がCPUプロファイル ({mode}, {seconds}秒) を取得しました。")
+
+        # 文字列をUTF-8でエンコードし、インメモリのバイナリストリームに変換
+        buffer = io.BytesIO(report.encode('utf-8'))
+        await ctx.send(
+            f"{ctx.author.mention} プロファイルの結果だワン！📄",
+            file=nextcord.File(buffer, filename=f"ai_inu_profile_{datetime.now():%Y%m%d_%H%M%S}.txt")
+        )
+
+
+    @commands.command(
+        name='memory',
+        aliases=['メモリ'],
+        help=(
+            "メモリ使用量を表示します（管理者専用）。`snapshot` で現在を基準として記録し、"
+            "`diff` で基準から増えた確保箇所とオブジェクトを表示、`stop` で記録を終了します。"
+        ),
+        brief="メモリ使用量とヒープの差分を表示します。"
+    )
+    @is_admin()
+    async def memory_command(self, ctx: commands.Context, action: str = None):
+        """メモリ使用量の概要を表示し、tracemalloc のスナップショットの記録・比較・終了を行う。"""
+        tracker = self.bot.memory_tracker
+        if action == "snapshot":
+            await ctx.send("🧠 ヒープのスナップショットを記録中だワン…")
+            # スナップショットとオブジェクトの集計は重いため、ワーカースレッドで行う
+            await asyncio.to_thread(tracker.snapshot)
+            logger.info(f"管理者 {ctx.author} がメモリの基準のスナップショットを記録しました。")
+            await ctx.send(
+                "基準を記録したワン！しばらく動かしてから `memory diff` で増えたものを調べてね。"
+                "（調べ終わったら `memory stop` で記録を止めてね）"
+            )
+            return
+        if action == "diff":
+            if not tracker.has_baseline or not tracker.tracing:
+                await ctx.send("まだ基準がないワン。先に `memory snapshot` で記録してね！")
+                return
+            diff = await asyncio.to_thread(tracker.diff)
+            await ctx.send(embed=self._create_memory_diff_embed(diff))
+            return
+        if action == "stop":
+            tracker.stop_tracing()
+            await ctx.send("ヒープの記録を止めたワン！")
+            return
+        if action is not None:
+            await ctx.send("わん？ `snapshot` / `diff` / `stop` のどれかを指定してね！")
+            return
+
+        embed = nextcord.Embed(
+            title="🧠 メモリ使用量",
+            description=tracker.describe(),
+            color=nextcord.Color.dark_purple(),
+            timestamp=datetime.now()
+        )
+        # 共有DBの件数を数える項目があるため、ワーカースレッドで読む
+        gauges = await asyncio.to_thread(tracker.read_gauges)
+        if gauges:
+            embed.add_field(
+                name="保持している件数",
+                value="\n".join(f"{label}: **{value:,}**" for label, value in gauges.items()),
+                inline=False
+            )
+        traced = tracker.traced_memory()
+        if traced is not None:
+            baseline = (
+                f"基準: {datetime.fromtimestamp(tracker.baseline_at):%Y-%m-%d %H:%M:%S}"
+                if tracker.baseline_at else "基準なし"
+            )
+            embed.add_field(
+                name="tracemalloc",
+                value=f"追跡中 {format_bytes(traced[0])} (最大 {format_bytes(traced[1])}) / {baseline}",
+                inline=False
+            )
+        hours = tracker.history_seconds / 3600
+        embed.set_footer(text=f"記録期間: {hours:.1f}時間" if tracker.running else "定期の記録は無効です")
+        await ctx.send(embed=embed)
+
+    @staticmethod
+    def _create_memory_diff_embed(diff: MemoryDiff) -> nextcord.Embed:
+        """基準からの増減を表示するEmbedを作成する。"""
+        summary = f"経過 {diff.elapsed / 60:.1f}分 / tracemalloc {'+' if diff.traced_delta >= 0 else ''}{format_bytes(diff.traced_delta)}"
+        if diff.rss_delta is not None:
+            summary += f" / RSS {'+' if diff.rss_delta >= 0 else ''}{format_bytes(diff.rss_delta)}"
+        embed = nextcord.Embed(
+            title="🧠 ヒープの差分",
+            description=summary,
+            color=nextcord.Color.dark_purple(),
+            timestamp=datetime.now()
+        )
+        sites = "\n".join(
+            f"+{format_bytes(size)} ({count:+,}) `{site}`" for site, size, count in diff.sites
+        )
+        embed.add_field(name="確保が増えた箇所", value=sites[:1024] or "増えた確保はないワン！", inline=False)
+        types = "\n".join(f"`{name}`: {current:,} ({delta:+,})" for name, current, delta in diff.types)
+        embed.add_field(name="数が増えたオブジェクト", value=types[:1024] or "増えた型はないワン！", inline=False)
+        if diff.gauges:
+            gauges = "\n".join(f"{label}: {current:,} ({delta:+,})" for label, current, delta in diff.gauges)
+            embed.add_field(name="保持している件数", value=gauges[:1024], inline=False)
+        return embed
+
 
 def setup(bot: 'AIDogBot'):
     """CogをBotに登録するためのセットアップ関数"""
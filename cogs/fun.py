@@ -6,17 +6,26 @@ Discord Bot「AI犬」のお楽しみ機能（Cog）。
 """
 
 # --- 標準ライブラリのインポート ---
+import asyncio
 import io
 import logging
+import re
+import shlex
+import unicodedata
 from datetime import datetime
 from pathlib import Path
-from typing import TYPE_CHECKING, Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Set, Tuple
 
 # --- サードパーティライブラリのインポート ---
 import aiohttp
 import nextcord
 from nextcord.ext import commands
 
+# --- 自作モジュールのインポート ---
+from utils.api_quota import APIQuotaExceeded, describe_wait
+from utils.cache import TTLCache
+from utils.static_assets import StaticAssetManager
+
 # 型ヒントのために 'AIDogBot' クラスをインポートする（循環参照を避ける）
 if TYPE_CHECKING:
     from bot_main import AIDogBot
@@ -32,9 +41,136 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
     WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/weather"
     WEATHER_ICON_URL_TEMPLATE = "https://openweathermap.org/img/wn/{icon_id}@2x.png"
     BONE_IMAGE_PATH = Path("bot_images/bone.png")
+    BONE_ASSET_NAME = "bone"
+    # APIクォータ上のAPI名
+    WEATHER_API_NAME = "openweathermap"
+    # 天気データのキャッシュ。OpenWeatherMapの更新間隔（約10分）に合わせて保持し、
+    # 期限切れ後もクォータ切れ時の代替として一定時間は残しておく
+    WEATHER_CACHE_SIZE = 256
+    WEATHER_CACHE_TTL = 600.0
+    WEATHER_STALE_TTL = 3 * 3600.0
+    WEATHER_STATS_LABEL = "🌦️ 天気キャッシュ命中率"
+    # 複数都市をまとめて調べるときの上限と、APIへの同時リクエスト数
+    MAX_WEATHER_CITIES = 5
+    WEATHER_FETCH_CONCURRENCY = 3
+    # 複数都市の区切りとして扱う文字。カンマは "Tokyo, JP" (都市名, 国コード) の指定に使われるため含めない
+    CITY_SEPARATOR_PATTERN = re.compile(r"[/／、]")
+    # これを含まない引数 (「東京 大阪 札幌」など) は、空白でも複数の都市に区切る。
+    # 英字の都市名は "New York" のように空白を含むことがあるため、空白では区切らない
+    CITY_NAME_WITH_SPACES_PATTERN = re.compile(r"[A-Za-z,]")
+    # 1つの都市に紐づける別名 (「東京」「Tokyo, JP」など) の上限
+    MAX_CITY_ALIASES = 8
 
     def __init__(self, bot: 'AIDogBot'):
         self.bot = bot
+        self.weather_cache = TTLCache(
+            maxsize=self.WEATHER_CACHE_SIZE, ttl=self.WEATHER_CACHE_TTL, stale_ttl=self.WEATHER_STALE_TTL
+        )
+        self._weather_semaphore = asyncio.Semaphore(self.WEATHER_FETCH_CONCURRENCY)
+        # {OpenWeatherMapの都市ID: その都市として問い合わせたことのある名前 (正規化済み)}
+        self._city_aliases: Dict[int, Set[str]] = {}
+        # 同梱画像は最初に使われたときに1度だけメモリに読み込む
+        self.assets = StaticAssetManager()
+        self.assets.register(self.BONE_ASSET_NAME, self.BONE_IMAGE_PATH)
+        self.bot.stats.register_source(self.WEATHER_STATS_LABEL, self.weather_cache.describe)
+
+    def cog_unload(self):
+        """Cogのアンロード時に、統計への登録を解除する。"""
+        self.bot.stats.unregister_source(self.WEATHER_STATS_LABEL)
+
+    @staticmethod
+    def _normalize_city(city: str) -> str:
+        """全角/半角や空白、大文字/小文字の揺れを吸収し、同じ都市を同じキャッシュキーにする。"""
+        city = " ".join(unicodedata.normalize('NFKC', city).split())
+        # "Tokyo, JP" と "Tokyo,JP" を同じキーにする
+        return ",".join(part.strip() for part in city.split(",")).casefold()
+
+    def _split_cities(self, text: str) -> List[str]:
+        """
+        コマンド引数を都市のリストに分割する。
+
+        複数の都市は「/」か「、」で区切るか、それぞれを引用符で囲んで指定する。
+        英字もカンマも含まない引数 (「東京 大阪 札幌」など) は空白でも区切る。
+        それ以外は、空白を含めて1つの都市名として扱う（"New York" や "Tokyo, JP" など）。
+        同じ都市の重複は取り除く。
+        """
+        if self.CITY_SEPARATOR_PATTERN.search(text):
+            candidates = self.CITY_SEPARATOR_PATTERN.split(text)
+        elif '"' in text or "'" in text:
+            try:
+                candidates = shlex.split(text)
+            except ValueError:
+                # 引用符が閉じていない場合は、引用符を除いて1つの都市名とする
+                candidates = [text.replace('"', "").replace("'", "")]
+        elif not self.CITY_NAME_WITH_SPACES_PATTERN.search(unicodedata.normalize('NFKC', text)):
+            candidates = text.split()
+        else:
+            candidates = [text]
+
+        cities: Dict[str, str] = {}
+        for candidate in candidates:
+            if (city := " ".join(candidate.split())) and self._normalize_city(city) not in cities:
+                cities[self._normalize_city(city)] = city
+        return list(cities.values())
+
+    async def _fetch_weather_within_quota(self, city: str) -> Dict[str, Any]:
+        """クォータを確保し、同時リクエスト数の上限内で天気データを取得する。"""
+        async with self._weather_semaphore:
+            await self.bot.api_quota.acquire(self.WEATHER_API_NAME, max_wait=self.bot.config.api_quota_queue_wait)
+            weather_data = await self._fetch_weather_data(city)
+        self._cache_city_aliases(city, weather_data)
+        return weather_data
+
+    def _cache_city_aliases(self, city: str, weather_data: Dict[str, Any]) -> None:
+        """
+        取得した天気データを、同じ都市の別名でも引けるように登録する。
+
+        APIが返す正式名 ("東京都" / "東京都,JP") に加えて、同じ都市IDとして問い合わせたことのある名前
+        （「東京」と設定の既定都市 "Tokyo, JP" など）にも登録し、どの名前で聞かれても同じデータを返す。
+        """
+        aliases: Set[str] = set()
+        if canonical_name := weather_data.get('name'):
+            aliases.add(self._normalize_city(canonical_name))
+            if country := (weather_data.get('sys') or {}).get('country'):
+                aliases.add(self._normalize_city(f"{canonical_name},{country}"))
+        if (city_id := weather_data.get('id')) is not None:
+            known = self._city_aliases.setdefault(city_id, set())
+            if len(known) < self.MAX_CITY_ALIASES:
+                known.add(self._normalize_city(city))
+            aliases |= known
+        # 問い合わせた名前そのものは get_or_fetch が登録する
+        aliases.discard(self._normalize_city(city))
+        for alias in aliases:
+            self.weather_cache.set(alias, weather_data)
+
+    async def _get_weather(self, city: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        天気データを返す。APIのクォータが残りわずか、または使い切っている場合は、
+        保存済みの少し前のデータがあればそれを返す。
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: (天気データ, 保存済みのデータか)
+
+        Raises:
+            APIQuotaExceeded: クォータを使い切っていて、保存済みのデータもない場合。
+        """
+        cache_key = self._normalize_city(city)
+        if (
+            self.bot.api_quota.is_low(self.WEATHER_API_NAME)
+            and self.weather_cache.get(cache_key) is None
+            and (stale := self.weather_cache.get_stale(cache_key)) is not None
+        ):
+            return stale, True
+        try:
+            # 同じ都市の同時リクエストは1回のAPI呼び出しを共有する
+            weather_data = await self.weather_cache.get_or_fetch(
+                cache_key, lambda: self._fetch_weather_within_quota(city)
+            )
+        except APIQuotaExceeded:
+            if (stale := self.weather_cache.get_stale(cache_key)) is not None:
+                return stale, True
+            raise
+        return weather_data, False
 
     async def _fetch_weather_data(self, city: str) -> Dict[str, Any]:
         """OpenWeatherMap APIから天気データを取得する。"""
@@ -44,13 +180,13 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
             'lang': 'ja',
             'units': 'metric'
         }
-        async with self.bot.http_session.get(self.WEATHER_API_URL, params=params) as response:
+        async with self.bot.http_client.get(self.WEATHER_API_URL, params=params) as response:
             # ステータスコードが200番台でない場合は例外を発生させる
             response.raise_for_status()
-            return await response.json()
+            return await self.bot.http_client.read_json(response)
 
-    def _create_weather_embed(self, data: Dict[str, Any], city_name: str) -> nextcord.Embed:
-        """APIデータから天気情報のEmbedオブジェクトを作成する。"""
+    def _create_weather_embed(self, data: Dict[str, Any], city_name: str, is_stale: bool = False) -> nextcord.Embed:
+        """APIデータから天気情報のEmbedオブジェクトを作成する。保存済みのデータは観測時刻を表示する。"""
         # .get()を使い、APIレスポンスの構造が一部欠けていてもエラーにならないようにする
         weather_info = data.get('weather', [{}])[0]
         main_info = data.get('main', {})
@@ -67,7 +203,7 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
         embed = nextcord.Embed(
             title=f"🐕 {data.get('name', city_name)}のお天気情報だワン！",
             color=nextcord.Color.blue(),  # 0x7289da
-            timestamp=datetime.now()
+            timestamp=datetime.fromtimestamp(data['dt']) if is_stale and data.get('dt') else datetime.now()
         )
         embed.add_field(name="天気", value=desc.capitalize(), inline=True)
         embed.add_field(name="気温", value=f"{temp:.1f}°C" if temp is not None else "N/A", inline=True)
@@ -78,15 +214,74 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
 
         if icon_id:
             embed.set_thumbnail(url=self.WEATHER_ICON_URL_TEMPLATE.format(icon_id=icon_id))
-        embed.set_footer(text="情報取得元: OpenWeatherMap")
+        footer = "情報取得元: OpenWeatherMap"
+        if is_stale:
+            footer += "（APIの呼び出し上限が近いため、少し前の情報だワン）"
+        embed.set_footer(text=footer)
 
         return embed
 
-    @commands.command(name='weather', aliases=['天気', 'てんき'], help="指定都市の天気をお知らせ！ (例: !aidog weather 東京)")
+    @staticmethod
+    def _describe_weather_error(error: BaseException) -> str:
+        """複数都市の表示で、取得に失敗した都市の欄に出す文言を返す。"""
+        if isinstance(error, APIQuotaExceeded):
+            return f"調べすぎちゃったワン… {describe_wait(error.retry_after)}後にまた聞いてね！"
+        if isinstance(error, aiohttp.ClientResponseError):
+            if error.status == 404:
+                return "見つからなかったワン… ローマ字で試してみてね。"
+            if error.status == 401:
+                return "APIキーが無効みたいだワン。"
+            return f"取得中にエラーが発生しちゃった… (コード: {error.status})"
+        return "取得中に予期せぬエラーが発生しちゃったワン！"
+
+    def _create_multi_weather_embed(self, cities: List[str], results: List[Any]) -> nextcord.Embed:
+        """複数都市の天気を、都市ごとに1つの欄として1つのEmbedにまとめる。"""
+        embed = nextcord.Embed(
+            title=f"🐕 {len(cities)}都市のお天気情報だワン！",
+            color=nextcord.Color.blue(),  # 0x7289da
+            timestamp=datetime.now()
+        )
+        any_stale = False
+        for city, result in zip(cities, results):
+            if isinstance(result, BaseException):
+                embed.add_field(name=city, value=self._describe_weather_error(result), inline=False)
+                continue
+
+            data, is_stale = result
+            any_stale = any_stale or is_stale
+            weather_info = data.get('weather', [{}])[0]
+            main_info = data.get('main', {})
+            temp = main_info.get('temp')
+            temp_min = main_info.get('temp_min')
+            temp_max = main_info.get('temp_max')
+            humidity = main_info.get('humidity')
+            lines = [
+                f"{weather_info.get('description', '情報なし').capitalize()} / "
+                f"{f'{temp:.1f}°C' if temp is not None else 'N/A'}",
+                f"最高/最低: {f'{temp_max:.1f}°C / {temp_min:.1f}°C' if temp_max and temp_min else 'N/A'}"
+                f" / 湿度: {f'{humidity}%' if humidity is not None else 'N/A'}",
+            ]
+            if is_stale:
+                lines.append("（少し前の情報だワン）")
+            embed.add_field(name=data.get('name', city), value="\n".join(lines), inline=False)
+
+        first_icon = next(
+            (r[0].get('weather', [{}])[0].get('icon') for r in results if not isinstance(r, BaseException)), None
+        )
+        if first_icon:
+            embed.set_thumbnail(url=self.WEATHER_ICON_URL_TEMPLATE.format(icon_id=first_icon))
+        footer = "情報取得元: OpenWeatherMap"
+        if any_stale:
+            footer += "（APIの呼び出し上限が近いため、一部は少し前の情報だワン）"
+        embed.set_footer(text=footer)
+        return embed
+
+    @commands.command(name='weather', aliases=['天気', 'てんき'], help="指定都市の天気をお知らせ！複数都市は「/」区切りでOK (例: !aidog weather 東京/大阪/New York、!aidog weather 東京 大阪 札幌)")
     async def weather_command(self, ctx: commands.Context, *, city: Optional[str] = None):
         """
         指定された都市の現在の天気をOpenWeatherMapから取得して表示する。
         都市が指定されない場合は、設定されたデフォルトの都市が使用される。
+        複数の都市が指定された場合は、まとめて1つのEmbedで表示する。
         """
         # 1. APIキーの存在チェック (ガード節)
         if not self.bot.config.openweathermap_api_key:
@@ -94,7 +289,11 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
             return
 
         # 2. 対象都市の決定
-        target_city = city or self.bot.config.weather_default_city
+        cities = self._split_cities(city) if city else []
+        if len(cities) > 1:
+            await self._send_multi_weather(ctx, cities)
+            return
+        target_city = cities[0] if cities else self.bot.config.weather_default_city
         if not target_city:
             await ctx.send(f"どこのお天気が知りたいワン？ `{self.bot.config.command_prefix}weather 都市名` で教えて！")
             return
@@ -103,11 +302,16 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
 
         # 3. データ取得とEmbed作成
         try:
-            weather_data = await self._fetch_weather_data(target_city)
-            weather_embed = self._create_weather_embed(weather_data, target_city)
+            weather_data, is_stale = await self._get_weather(target_city)
+            weather_embed = self._create_weather_embed(weather_data, target_city, is_stale)
             await processing_msg.edit(content=None, embed=weather_embed)
 
         # 4. エラーハンドリング
+        except APIQuotaExceeded as e:
+            logger.warning(f"天気APIのクォータ切れ ({target_city}): {e}")
+            await processing_msg.edit(
+                content=f"お天気を調べすぎちゃったワン… {describe_wait(e.retry_after)}後にまた聞いてね！"
+            )
         except aiohttp.ClientResponseError as e:
             logger.error(f"天気APIエラー ({target_city}, Status: {e.status}): {e.message}")
             if e.status == 401:
@@ -120,21 +324,59 @@ class FunCog(commands.Cog, name="お楽しみコマンド"):
             logger.error(f"天気コマンドの予期せぬエラー({target_city}): {e}", exc_info=True)
             await processing_msg.edit(content="お天気処理で予期せぬエラーが発生しちゃったワン！")
 
+    async def _send_multi_weather(self, ctx: commands.Context, cities: List[str]) -> None:
+        """複数都市の天気を並行して取得し、1つのEmbedで表示する。"""
+        if len(cities) > self.MAX_WEATHER_CITIES:
+            await ctx.send(f"一度に調べられるのは{self.MAX_WEATHER_CITIES}都市までだワン！")
+            return
+
+        processing_msg = await ctx.send(f"{len(cities)}都市のお天気をまとめて調べてるワン…🌦️")
+        try:
+            # キャッシュにない都市だけがAPIを呼び、同時リクエスト数はセマフォで制限される
+            results = await asyncio.gather(*(self._get_weather(c) for c in cities), return_exceptions=True)
+            for target_city, result in zip(cities, results):
+                if isinstance(result, BaseException):
+                    logger.warning(f"天気の取得に失敗 ({target_city}): {result!r}")
+            await processing_msg.edit(content=None, embed=self._create_multi_weather_embed(cities, results))
+        except Exception as e:
+            logger.error(f"天気コマンドの予期せぬエラー({', '.join(cities)}): {e}", exc_info=True)
+            await processing_msg.edit(content="お天気処理で予期せぬエラーが発生しちゃったワン！")
+
     @commands.command(name='bone', help="AI犬からホネの画像をもらうワン！🦴")
     async def send_bone_picture(self, ctx: commands.Context):
-        """ローカルに保存された骨の画像を送信する。"""
-        if self.BONE_IMAGE_PATH.exists():
-            try:
-                await ctx.send(
-                    f"{ctx.author.mention} ご主人様、ホネをどうぞだワン！🦴",
-                    file=nextcord.File(self.BONE_IMAGE_PATH)
-                )
-            except Exception as e:
-                logger.error(f"画像送信エラー ({self.BONE_IMAGE_PATH}): {e}", exc_info=True)
-                await ctx.send("くぅーん、ホネを渡そうとしたけど失敗しちゃったワン…")
-        else:
+        """
+        骨の画像を送信する。
+
+        初回はメモリ上の画像をアップロードし、以降はそのCDN URLをEmbedで参照する。
+        URLの期限が近づいたとき、またはURLでの送信に失敗したときは、メモリ上のデータからアップロードし直す。
+        """
+        asset = await self.assets.load_lazily(self.BONE_ASSET_NAME)
+        if asset is None:
             logger.warning(f"画像ファイルが見つかりません: {self.BONE_IMAGE_PATH}")
             await ctx.send("わん！ホネの画像が見つからないワン…お腹すいちゃったのかな？")
+            return
+
+        content = f"{ctx.author.mention} ご主人様、ホネをどうぞだワン！🦴"
+        if cached_url := self.assets.cached_url(self.BONE_ASSET_NAME):
+            try:
+                embed = nextcord.Embed(color=nextcord.Color.gold())
+                embed.set_image(url=cached_url)
+                await ctx.send(content, embed=embed)
+                return
+            except Exception as e:
+                # URLが使えなくなっていても、同じ呼び出しの中でアップロードし直して届ける
+                self.assets.forget_url(self.BONE_ASSET_NAME)
+                logger.warning(f"保存済みのURLで画像を送れなかったため、アップロードし直します: {e}")
+
+        try:
+            message = await ctx.send(
+                content, file=nextcord.File(self.assets.open(self.BONE_ASSET_NAME), filename=asset.filename)
+            )
+            if message.attachments:
+                self.assets.remember_url(self.BONE_ASSET_NAME, message.attachments[0].url)
+        except Exception as e:
+            logger.error(f"画像送信エラー ({self.BONE_IMAGE_PATH}): {e}", exc_info=True)
+            await ctx.send("くぅーん、ホネを渡そうとしたけど失敗しちゃったワン…")
 
     @commands.command(name='textfile', help="AI犬からサンプルテキストファイルをもらうワン！")
     async def send_text_file(self, ctx: commands.Context):
@@ -6,7 +6,9 @@ Discord Bot「AI犬」の一般向けコマンドを定義するCog。
 """
 
 # --- 標準ライブラリのインポート ---
-from datetime import datetime
+import asyncio
+import logging
+from datetime import datetime, timedelta
 from typing import TYPE_CHECKING
 
 # --- サードパーティライブラリのインポート ---
@@ -18,6 +20,9 @@ if TYPE_CHECKING:
     from bot_main import AIDogBot
 
 
+logger = logging.getLogger(__name__)
+
+
 class GeneralCog(commands.Cog, name="一般コマンド"):
     """Botの基本的なコマンドをまとめたCog"""
 
@@ -95,11 +100,43 @@ class GeneralCog(commands.Cog, name="一般コマンド"):
             ("📈 成功率", stats_data.get('success_rate', 'N/A'), True),
         ]
 
+        # Cogなどが登録した追加の統計項目
+        for label, value in stats_data.get('extra', {}).items():
+            fields_to_display.append((label, value, False))
+
         for name, value, inline in fields_to_display:
             embed.add_field(name=name, value=value, inline=inline)
 
         await ctx.send(embed=embed)
 
+    @commands.command(name='quota', aliases=['残量'], help="AI犬が考えるために使えるGPU予算の残りを確認するワン！")
+    async def show_quota_command(self, ctx: commands.Context):
+        """コマンド実行者（とサーバー）のGPU使用量クォータの残量を表示する。"""
+        token_quota = self.bot.token_quota
+        if not token_quota.enabled:
+            await ctx.send("今はGPU予算の制限はないワン！いっぱいお話ししようね！🐾")
+            return
+
+        guild_id = ctx.guild.id if ctx.guild else None
+        remaining = await asyncio.to_thread(token_quota.get_remaining, ctx.author.id, guild_id)
+        unit_label = "トークン" if token_quota.unit == 'tokens' else "ms"
+        window_str = str(timedelta(seconds=token_quota.window_seconds))
+
+        embed = nextcord.Embed(
+            title="🔋 AI犬のGPU予算 🔋",
+            description=f"直近 `{window_str}` の間に使える量だワン！",
+            color=nextcord.Color.green(),  # 0x2ecc71
+            timestamp=datetime.now()
+        )
+        labels = {'user': f"🐕 {ctx.author.display_name}さん", 'guild': "🏠 このサーバー全体"}
+        for scope, info in remaining.items():
+            value = f"残り **{info['remaining']:,}** / {info['budget']:,} {unit_label}"
+            if info['reset_in']:
+                value += f"\n（あと{info['reset_in']}秒で回復）"
+            embed.add_field(name=labels[scope], value=value, inline=False)
+
+        await ctx.send(embed=embed)
+
     @commands.command(name='clear', help="AI犬との会話履歴をリセットするワン！")
     async def clear_history_command(self, ctx: commands.Context):
         """コマンド実行者の会話履歴をデータベースから削除する。"""
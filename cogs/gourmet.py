@@ -7,15 +7,23 @@ Discord Bot「AI犬」のグルメ検索機能（Cog）。
 """
 
 # --- 標準ライブラリのインポート ---
+import asyncio
 import logging
 import random
-from typing import TYPE_CHECKING, Dict, Any, Optional
+import re
+import unicodedata
+from typing import TYPE_CHECKING, Dict, Any, Hashable, List, Optional, Set, Tuple
 
 # --- サードパーティライブラリのインポート ---
 import aiohttp
 import nextcord
 from nextcord.ext import commands
 
+# --- 自作モジュールのインポート ---
+from utils.api_quota import APIQuotaExceeded, describe_wait
+from utils.cache import TTLCache
+from utils.shop_index import ShopIndex
+
 # 型ヒントのために 'AIDogBot' クラスをインポートする（循環参照を避ける）
 if TYPE_CHECKING:
     from bot_main import AIDogBot
@@ -24,6 +32,51 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 
+# --- UIコンポーネント ---
+class GourmetSearchView(nextcord.ui.View):
+    """
+    グルメ検索結果を1つのメッセージ上でページネーション表示するためのView。
+
+    検索時にまとめて取得したお店だけを切り替えるため、ボタン操作で
+    APIへのリクエストは発生しない。
+    """
+    # 最後の操作からViewを閉じるまでの秒数
+    TIMEOUT = 180.0
+
+    def __init__(self, cog: 'GourmetCog', shops: List[Dict[str, Any]], total_found: int):
+        # 期限はBot共通の有効期限スケジューラで管理するため、View自身のタイマーは使わない
+        super().__init__(timeout=None)
+        self.cog = cog
+        self.shops = shops
+        self.total_found = total_found
+        self.current_index = 0
+        self.expiry_key: Hashable = ("gourmet_search", id(self))
+
+    def current_embed(self) -> nextcord.Embed:
+        """現在位置のお店のEmbedを返す。"""
+        result_info = f"{self.total_found}件中 {self.current_index + 1}件目"
+        return self.cog._get_shop_embed(self.shops[self.current_index], result_info)
+
+    async def show_page(self, interaction: nextcord.Interaction, step: int):
+        """現在位置から `step` 件移動したお店のEmbedを表示する。"""
+        self.touch()
+        self.current_index = (self.current_index + step) % len(self.shops)
+        await interaction.response.edit_message(embed=self.current_embed(), view=self)
+
+    @nextcord.ui.button(label="◀️ 前へ", style=nextcord.ButtonStyle.grey)
+    async def prev_button(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
+        await self.show_page(interaction, -1)
+
+    @nextcord.ui.button(label="▶️ 次へ", style=nextcord.ButtonStyle.grey)
+    async def next_button(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
+        await self.show_page(interaction, 1)
+
+    def touch(self) -> None:
+        """操作があったものとして、Viewを閉じる期限を延長する。"""
+        self.cog.bot.expiry_scheduler.schedule(self.expiry_key, self, self.TIMEOUT, lambda key, view: view.stop())
+
+
+# --- Cog本体 ---
 class GourmetCog(commands.Cog, name="グルメ検索"):
     """ホットペッパーグルメAPIを使ってお店の情報を検索するCog"""
 
@@ -31,9 +84,140 @@ class GourmetCog(commands.Cog, name="グルメ検索"):
     API_BASE_URL = "https://webservice.recruit.co.jp/hotpepper/gourmet/v1/"
     # ホットペッパーAPIが返す特殊なContent-Type
     API_CONTENT_TYPE = 'text/javascript;charset=utf-8'
+    # ランダムグルメ用に、キーワードごとにまとめて取得しておくお店の数 (APIの1回あたりの上限)
+    RANDOM_POOL_SIZE = 100
+    RANDOM_POOL_TTL = 1800.0
+    RANDOM_POOL_CACHE_SIZE = 128
+    # クォータが残りわずか・切れのときに、期限切れの候補を代わりに使える秒数
+    RANDOM_POOL_STALE_TTL = 6 * 3600.0
+    # APIクォータ上のAPI名
+    API_NAME = "hotpepper"
+    STALE_NOTE = "（APIの呼び出し上限が近いから、少し前に調べた結果だワン）"
+    STATS_LABEL = "🍜 ランダムグルメ候補キャッシュ命中率"
+    # グルメ検索で1度に取得してページ送りするお店の数
+    SEARCH_PAGE_SIZE = 20
+    # お店ごとのEmbedキャッシュ
+    SHOP_EMBED_CACHE_SIZE = 512
+    SHOP_EMBED_CACHE_TTL = 3600.0
+    FOOTER_TEXT = "Powered by ホットペッパー Webサービス"
+    # --- 近くのお店検索の設定 ---
+    NEAR_RADIUS_M = 1000
+    NEAR_API_RANGE = 3  # ホットペッパーAPIの検索範囲コード (3 = 1000m)
+    NEAR_MIN_LOCAL_RESULTS = 5  # ローカルの索引にこれ未満しかなければAPIで補う
+    NEAR_RESULT_LIMIT = 5
+    # "43.0687,141.3508" のような緯度経度の指定
+    LAT_LNG_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*[,、，]\s*(-?\d+(?:\.\d+)?)\s*$")
 
     def __init__(self, bot: 'AIDogBot'):
         self.bot = bot
+        # 正規化したキーワード → (お店のリスト, 検索結果の総数)
+        self.random_pools = TTLCache(
+            maxsize=self.RANDOM_POOL_CACHE_SIZE, ttl=self.RANDOM_POOL_TTL, stale_ttl=self.RANDOM_POOL_STALE_TTL
+        )
+        self.bot.stats.register_source(self.STATS_LABEL, self.random_pools.describe)
+        # お店のID → 件数表示を含まないEmbed
+        self.shop_embeds = TTLCache(maxsize=self.SHOP_EMBED_CACHE_SIZE, ttl=self.SHOP_EMBED_CACHE_TTL)
+        # APIで取得したお店の位置情報の索引（近くのお店検索に使用）
+        self.shop_index = ShopIndex(db_path=bot.config.shop_index_db_path)
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    def cog_unload(self):
+        """Cogのアンロード時に、統計への登録を解除する。"""
+        self.bot.stats.unregister_source(self.STATS_LABEL)
+
+    def _remember_shops(self, shops: List[Dict[str, Any]]) -> None:
+        """取得したお店をローカルの索引に登録する。DBへの保存は別スレッドで行う。"""
+        rows = self.shop_index.add_shops(shops)
+        if rows:
+            task = asyncio.create_task(asyncio.to_thread(self.shop_index.save_rows, rows))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+
+    async def _load_shops(self, shop_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """索引のお店の詳細データをDBから読み込む。保存中のお店があれば、保存が終わってから読み込む。"""
+        if not shop_ids:
+            return {}
+        if self._background_tasks:
+            await asyncio.wait(set(self._background_tasks))
+        return await asyncio.to_thread(self.shop_index.load_shops, shop_ids)
+
+    async def _fetch_shops(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        ホットペッパーAPIを呼び出して `results` を返し、取得したお店を索引に登録する。
+
+        Raises:
+            APIQuotaExceeded: APIキーのクォータを使い切っている場合。
+        """
+        await self.bot.api_quota.acquire(self.API_NAME, max_wait=self.bot.config.api_quota_queue_wait)
+        request_params = {"key": self.bot.config.hotpepper_api_key, "format": "json", **params}
+        async with self.bot.http_client.get(self.API_BASE_URL, params=request_params) as response:
+            response.raise_for_status()
+            data = await self.bot.http_client.read_json(response, content_type=self.API_CONTENT_TYPE)
+
+        results = data.get('results', {})
+        self._remember_shops(results.get('shop', []))
+        return results
+
+    @staticmethod
+    def _normalize_keyword(keyword: str) -> str:
+        """全角/半角や空白の揺れを吸収し、同じ検索になるキーワードを同じ文字列にする。"""
+        return " ".join(unicodedata.normalize('NFKC', keyword).split()).casefold()
+
+    async def _fetch_random_pool(self, keyword: str) -> Tuple[List[Dict[str, Any]], int]:
+        """キーワードに合うお店を1回のAPIリクエストでまとめて取得する。"""
+        results = await self._fetch_shops({"keyword": keyword, "count": self.RANDOM_POOL_SIZE})
+        return results.get('shop', []), int(results.get('results_available', 0))
+
+    def _quota_is_low(self) -> bool:
+        return self.bot.api_quota.is_low(self.API_NAME)
+
+    async def _get_random_pool(self, keyword: str) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        キーワードの候補（最大100件）を返す。クォータが残りわずか・切れのときは、
+        期限切れでも保存済みの候補があればそれを返す。
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int, bool]: (お店のリスト, 総件数, 保存済みの候補か)
+
+        Raises:
+            APIQuotaExceeded: クォータを使い切っていて、保存済みの候補もない場合。
+        """
+        pool_key = self._normalize_keyword(keyword)
+        if self._quota_is_low() and (pool := self.random_pools.get_stale(pool_key)) is not None:
+            return pool[0], pool[1], True
+        try:
+            # 同じキーワードの同時リクエストは1回のAPI呼び出しを共有する
+            shops, total_results = await self.random_pools.get_or_fetch(
+                pool_key, lambda: self._fetch_random_pool(keyword),
+                cache_if=lambda pool: bool(pool[0])
+            )
+        except APIQuotaExceeded:
+            if (pool := self.random_pools.get_stale(pool_key)) is None:
+                raise
+            return pool[0], pool[1], True
+        return shops, total_results, False
+
+    async def _search_shops(self, keyword: str) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        キーワード検索の上位のお店を返す。クォータが残りわずか・切れのときは、
+        同じキーワードの保存済みの候補（APIの並び順のまま）から上位を返す。
+
+        Returns:
+            Tuple[List[Dict[str, Any]], int, bool]: (お店のリスト, 総件数, 保存済みの候補か)
+
+        Raises:
+            APIQuotaExceeded: クォータを使い切っていて、保存済みの候補もない場合。
+        """
+        pool_key = self._normalize_keyword(keyword)
+        if self._quota_is_low() and (pool := self.random_pools.get_stale(pool_key)) is not None:
+            return pool[0][:self.SEARCH_PAGE_SIZE], pool[1], True
+        try:
+            results = await self._fetch_shops({"keyword": keyword, "count": self.SEARCH_PAGE_SIZE})
+        except APIQuotaExceeded:
+            if (pool := self.random_pools.get_stale(pool_key)) is None:
+                raise
+            return pool[0][:self.SEARCH_PAGE_SIZE], pool[1], True
+        return results.get('shop', []), int(results.get('results_available', 0)), False
 
     def _create_shop_embed(self, shop_data: Dict[str, Any], result_info: Optional[str] = None) -> nextcord.Embed:
         """お店のデータ辞書からEmbedオブジェクトを作成するヘルパー関数。"""
@@ -54,47 +238,55 @@ class GourmetCog(commands.Cog, name="グルメ検索"):
         if large_photo_url := shop_data.get('photo', {}).get('pc', {}).get('l'):
             embed.set_image(url=large_photo_url)
 
-        footer_text = "Powered by ホットペッパー Webサービス"
-        if result_info:
-            footer_text = f"{result_info} | {footer_text}"
-        embed.set_footer(text=footer_text)
+        embed.set_footer(text=self._footer_text(result_info))
         return embed
 
-    @commands.command(name='gourmet', aliases=['グルメ', 'ごはん'], help="指定キーワードでお店を検索します (例: !aidog gourmet 札幌駅 ラーメン)")
+    def _footer_text(self, result_info: Optional[str]) -> str:
+        return f"{result_info} | {self.FOOTER_TEXT}" if result_info else self.FOOTER_TEXT
+
+    def _get_shop_embed(self, shop_data: Dict[str, Any], result_info: Optional[str] = None) -> nextcord.Embed:
+        """
+        お店のEmbedを返す。1度作成したEmbedはお店のIDごとに使い回し、
+        件数表示（フッター）だけを差し替えたコピーを返す。
+        """
+        shop_id = shop_data.get('id')
+        if shop_id is None:
+            return self._create_shop_embed(shop_data, result_info)
+
+        if (base_embed := self.shop_embeds.get(shop_id)) is None:
+            base_embed = self._create_shop_embed(shop_data)
+            self.shop_embeds.set(shop_id, base_embed)
+        embed = base_embed.copy()
+        embed.set_footer(text=self._footer_text(result_info))
+        return embed
+
+    @commands.group(name='gourmet', aliases=['グルメ', 'ごはん'], invoke_without_command=True, help="指定キーワードでお店を検索します (例: !aidog gourmet 札幌駅 ラーメン / !aidog gourmet near 札幌駅)")
     async def gourmet_search(self, ctx: commands.Context, *, keyword: str):
-        """指定されたキーワードで飲食店を検索し、上位3件を表示する。"""
+        """指定されたキーワードで飲食店を検索し、結果を1つのメッセージでページ送り表示する。"""
         if not self.bot.config.hotpepper_api_key:
             await ctx.send("ごめんなさいワン… グルメAPIキーがないから、お店を探せないんだワン…。")
             return
 
         processing_msg = await ctx.send(f"`{keyword}` でお店を探してるワン… ちょっと待っててね！🍜")
 
-        params = {
-            "key": self.bot.config.hotpepper_api_key,
-            "keyword": keyword,
-            "count": 3,
-            "format": "json"
-        }
         try:
-            async with self.bot.http_session.get(self.API_BASE_URL, params=params) as response:
-                response.raise_for_status()
-                data = await response.json(content_type=self.API_CONTENT_TYPE)
-
-            results = data.get('results', {})
-            shops = results.get('shop', [])
+            shops, total_found, is_stale = await self._search_shops(keyword)
 
             if not shops:
                 await processing_msg.edit(content=f"`{keyword}` に合うお店は見つからなかったワン… ごめんね！")
                 return
 
-            total_found = int(results.get('results_available', 0))
-            await processing_msg.edit(content=f"`{keyword}` に合うお店が **{total_found}** 件見つかったワン！トップ{len(shops)}件を紹介するね！")
-            
-            for i, shop in enumerate(shops):
-                result_info = f"{total_found}件中 {i + 1}件目"
-                embed = self._create_shop_embed(shop, result_info)
-                await ctx.send(embed=embed)
+            # 結果はすべて同じメッセージに載せ、ボタンでページ送りする（Discordへの書き込みは1回）
+            view = GourmetSearchView(self, shops, total_found)
+            content = f"`{keyword}` に合うお店が **{total_found}** 件見つかったワン！上位{len(shops)}件をボタンで見てみてね！"
+            if is_stale:
+                content += self.STALE_NOTE
+            await processing_msg.edit(content=content, embed=view.current_embed(), view=view)
+            view.touch()
 
+        except APIQuotaExceeded as e:
+            logger.warning(f"グルメAPIのクォータ切れ ({keyword}): {e}")
+            await processing_msg.edit(content=f"お店を探しすぎちゃったワン… {describe_wait(e.retry_after)}後にまた試してね！")
         except aiohttp.ClientResponseError as e:
             logger.error(f"グルメAPIエラー ({keyword}, Status: {e.status}): {e.message}")
             await processing_msg.edit(content=f"お店の検索中にAPIエラーが起きちゃったみたい… (コード: {e.status})")
@@ -102,6 +294,93 @@ class GourmetCog(commands.Cog, name="グルメ検索"):
             logger.error(f"グルメ検索の予期せぬエラー ({keyword}): {e}", exc_info=True)
             await processing_msg.edit(content="お店の検索中に予期せぬエラーが起きちゃったみたい… ごめんなさい！")
 
+    async def _resolve_location(self, location: str) -> Optional[Tuple[float, float]]:
+        """「緯度,経度」または駅名から、検索の中心となる位置を求める。"""
+        if match := self.LAT_LNG_PATTERN.match(location):
+            return float(match.group(1)), float(match.group(2))
+
+        if (position := self.shop_index.locate_station(location)) is not None:
+            return position
+
+        # 索引にない駅は、駅名でキーワード検索して得たお店から位置を求める
+        results = await self._fetch_shops({"keyword": location, "count": self.RANDOM_POOL_SIZE})
+        if (position := self.shop_index.locate_station(location)) is not None:
+            return position
+        points = [(float(shop['lat']), float(shop['lng'])) for shop in results.get('shop', []) if shop.get('lat') and shop.get('lng')]
+        if not points:
+            return None
+        return sum(lat for lat, _ in points) / len(points), sum(lng for _, lng in points) / len(points)
+
+    @gourmet_search.command(name='near', aliases=['近く', 'ちかく'], help="駅名か「緯度,経度」の近くのお店を探します (例: !aidog gourmet near 札幌駅)")
+    async def gourmet_near(self, ctx: commands.Context, *, location: str):
+        """
+        指定地点の近くのお店を、ローカルの索引から距離順に表示する。
+        索引にあるお店が少ない地域だけ、ホットペッパーAPIで補ってから表示する。
+        """
+        if not self.bot.config.hotpepper_api_key:
+            await ctx.send("ごめんなさいワン… グルメAPIキーがないから、お店を探せないんだワン…。")
+            return
+
+        try:
+            position = await self._resolve_location(location)
+            if position is None:
+                await ctx.send(f"`{location}` がどこなのか分からなかったワン… 駅名か「緯度,経度」で教えてね！")
+                return
+            lat, lng = position
+
+            nearby = self.shop_index.nearest(lat, lng, self.NEAR_RADIUS_M, self.NEAR_RESULT_LIMIT)
+            source = "AI犬の記憶"
+            # APIで取得したばかりのお店（DBへの保存が終わっていないことがある）
+            fetched: Dict[str, Dict[str, Any]] = {}
+            # クォータが残りわずかのときは、索引にあるお店だけで答える
+            if len(nearby) < self.NEAR_MIN_LOCAL_RESULTS and not self._quota_is_low():
+                try:
+                    results = await self._fetch_shops({
+                        "lat": lat, "lng": lng, "range": self.NEAR_API_RANGE,
+                        "order": 4, "count": self.RANDOM_POOL_SIZE
+                    })
+                    fetched = {shop['id']: shop for shop in results.get('shop', []) if shop.get('id')}
+                    nearby = self.shop_index.nearest(lat, lng, self.NEAR_RADIUS_M, self.NEAR_RESULT_LIMIT)
+                    source = "ホットペッパー"
+                except APIQuotaExceeded as e:
+                    logger.info(f"グルメAPIのクォータ切れのため、索引のお店だけで応答します ({location}): {e}")
+
+            if not nearby:
+                await ctx.send(f"`{location}` の近くにはお店が見つからなかったワン… ごめんね！")
+                return
+
+            shops = await self._load_shops([shop_id for _, shop_id in nearby if shop_id not in fetched])
+            shops.update(fetched)
+            embed = nextcord.Embed(
+                title=f"🐕 {location} の近くのお店だワン！",
+                description=f"半径{self.NEAR_RADIUS_M}m以内を近い順に紹介するね！（情報元: {source}）",
+                color=nextcord.Color.from_rgb(240, 75, 0)  # ホットペッパーのオレンジ色
+            )
+            for distance, shop_id in nearby:
+                shop = shops.get(shop_id)
+                if not shop:
+                    continue
+                genre = (shop.get('genre') or {}).get('name', 'N/A')
+                budget = (shop.get('budget') or {}).get('name') or '予算情報なし'
+                url = (shop.get('urls') or {}).get('pc', '')
+                embed.add_field(
+                    name=f"{shop.get('name', '名称不明')}（約{distance:.0f}m）",
+                    value=f"{genre} / {budget}\n{url}",
+                    inline=False
+                )
+            embed.set_footer(text=self.FOOTER_TEXT)
+            await ctx.send(embed=embed)
+
+        except APIQuotaExceeded as e:
+            logger.warning(f"グルメAPIのクォータ切れ ({location}): {e}")
+            await ctx.send(f"お店を探しすぎちゃったワン… {describe_wait(e.retry_after)}後にまた試してね！")
+        except aiohttp.ClientResponseError as e:
+            logger.error(f"近くのお店検索APIエラー ({location}, Status: {e.status}): {e.message}")
+            await ctx.send(f"お店の検索中にAPIエラーが起きちゃったみたい… (コード: {e.status})")
+        except Exception as e:
+            logger.error(f"近くのお店検索の予期せぬエラー ({location}): {e}", exc_info=True)
+            await ctx.send("お店の検索中に予期せぬエラーが起きちゃったみたい… ごめんなさい！")
+
     @commands.command(name='randomgourmet', aliases=['ランダムグルメ', 'おなかすいた'], help="条件に合うお店をランダムで1件提案します (例: !aidog randomgourmet 居酒屋)")
     async def random_gourmet(self, ctx: commands.Context, *, keyword: str = "居酒屋 札幌駅"):
         """指定されたキーワードでヒットしたお店の中からランダムで1件を提案する。"""
@@ -111,43 +390,23 @@ class GourmetCog(commands.Cog, name="グルメ検索"):
 
         processing_msg = await ctx.send(f"`{keyword}` の条件で、素敵なお店をランダムで選んでくるワン！運命の出会いがあるかも…✨")
         try:
-            # 1. まずは件数を取得するためのAPIリクエスト
-            count_params = {
-                "key": self.bot.config.hotpepper_api_key,
-                "keyword": keyword, "count": 1, "format": "json"
-            }
-            async with self.bot.http_session.get(self.API_BASE_URL, params=count_params) as response:
-                response.raise_for_status()
-                data = await response.json(content_type=self.API_CONTENT_TYPE)
-
-            total_results = int(data.get('results', {}).get('results_available', 0))
-            if total_results == 0:
+            # キーワードごとに最大100件をまとめて取得・キャッシュし、その中から手元で抽選する
+            shops, total_results, is_stale = await self._get_random_pool(keyword)
+            if not shops:
                 await processing_msg.edit(content=f"`{keyword}` に合うお店は見つからなかったワン… ごめんね！")
                 return
 
-            # 2. 取得するお店のランダムなインデックスを決定
-            # APIの仕様上、取得可能な上限は1000件程度。負荷も考慮し最大100件から選ぶ。
-            max_searchable_index = min(total_results, 100)
-            random_start_index = random.randint(1, max_searchable_index)
-
-            # 3. ランダムな1件を取得するためのAPIリクエスト
-            fetch_params = {
-                "key": self.bot.config.hotpepper_api_key,
-                "keyword": keyword, "start": random_start_index, "count": 1, "format": "json"
-            }
-            async with self.bot.http_session.get(self.API_BASE_URL, params=fetch_params) as response:
-                response.raise_for_status()
-                data = await response.json(content_type=self.API_CONTENT_TYPE)
-
-            shop = data.get('results', {}).get('shop', [None])[0]
-            if not shop:
-                await processing_msg.edit(content="ランダムでお店を選ぼうとしたけど、なぜか失敗しちゃったワン…")
-                return
-            
+            shop = random.choice(shops)
             result_info = f"{total_results}件の中からの一軒"
-            embed = self._create_shop_embed(shop, result_info)
-            await processing_msg.edit(content=f"ピンときたワン！ **{shop.get('name')}** なんてどうかな？", embed=embed)
+            embed = self._get_shop_embed(shop, result_info)
+            content = f"ピンときたワン！ **{shop.get('name')}** なんてどうかな？"
+            if is_stale:
+                content += self.STALE_NOTE
+            await processing_msg.edit(content=content, embed=embed)
 
+        except APIQuotaExceeded as e:
+            logger.warning(f"グルメAPIのクォータ切れ ({keyword}): {e}")
+            await processing_msg.edit(content=f"お店を探しすぎちゃったワン… {describe_wait(e.retry_after)}後にまた試してね！")
         except aiohttp.ClientResponseError as e:
             logger.error(f"ランダムグルメAPIエラー ({keyword}, Status: {e.status}): {e.message}")
             await processing_msg.edit(content=f"お店の検索中にAPIエラーが起きちゃったみたい… (コード: {e.status})")
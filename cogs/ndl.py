@@ -9,13 +9,20 @@ import asyncio
 import difflib
 import logging
 import random
+import unicodedata
 import xml.etree.ElementTree as ET
-from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
 
 # --- サードパーティライブラリのインポート ---
 import aiohttp
 import nextcord
-from nextcord.ext import commands
+from nextcord.ext import commands, tasks
+
+# --- 自作モジュールのインポート ---
+from utils.cache import TTLCache
+from utils.logging_setup import SAMPLED
+from utils.ndl_parser import NDLStreamParser, parse_document
 
 # 型ヒントのために 'AIDogBot' クラスをインポートする（循環参照を避ける）
 if TYPE_CHECKING:
@@ -25,27 +32,21 @@ logger = logging.getLogger(__name__)
 
 # --- モジュールレベルの定数・ヘルパー関数 ---
 NDL_API_BASE_URL = "https://iss.ndl.go.jp/api/opensearch"
-NAMESPACES = {
-    'dc': 'http://purl.org/dc/elements/1.1/',
-    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
-    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
-    'openSearch': 'http://a9.com/-/spec/opensearchrss/1.0/'
-}
-
-def parse_xml_item(item: ET.Element) -> Dict[str, Any]:
-    """XMLのitem要素をパースして辞書に変換する。"""
-    thumbnail_elem = item.find('rdfs:seeAlso', namespaces=NAMESPACES)
-    thumbnail_url = thumbnail_elem.get(f"{{{NAMESPACES['rdf']}}}resource") if thumbnail_elem is not None else None
-
-    return {
-        'title': item.findtext('title', default='タイトル不明'),
-        'link': item.findtext('link', default=''),
-        'author': item.findtext('author', default='著者不明'),
-        'pubDate': item.findtext('pubDate', default='出版日不明'),
-        'description': item.findtext('description', default='説明なし'),
-        'publisher': item.findtext('dc:publisher', namespaces=NAMESPACES, default='出版社不明'),
-        'thumbnail_url': thumbnail_url
-    }
+
+def normalize_search_params(params: Dict[str, Any]) -> Tuple[Tuple[str, Any], ...]:
+    """
+    検索パラメータを、キャッシュのキーとして使える正規化済みのタプルに変換する。
+
+    全角/半角の揺れや余分な空白、キーの順序の違いを吸収し、
+    同じ検索になるパラメータが同じキーになるようにする。
+    """
+    def normalize_value(value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            return tuple(normalize_value(v) for v in value)
+        text = unicodedata.normalize('NFKC', str(value))
+        return " ".join(text.split()).casefold()
+
+    return tuple(sorted((key, normalize_value(value)) for key, value in params.items()))
 
 def create_ndl_embed(item_data: Dict[str, Any], result_info: Optional[str] = None) -> nextcord.Embed:
     """資料データからEmbedオブジェクトを作成する。"""
@@ -67,28 +68,137 @@ def create_ndl_embed(item_data: Dict[str, Any], result_info: Optional[str] = Non
 
 # --- UIコンポーネント ---
 class NDLSearchView(nextcord.ui.View):
-    """NDL検索結果をページネーションで表示するためのView。"""
-    def __init__(self, items: List[Dict[str, Any]], total_results: int):
-        super().__init__(timeout=180.0)
-        self.items = items
-        self.total_results = total_results
-        self.current_page = 0
-
-    async def show_page(self, interaction: nextcord.Interaction):
-        """指定されたページのEmbedを表示する。"""
-        result_info = f"{self.total_results}件中 {self.current_page + 1}件目"
-        embed = create_ndl_embed(self.items[self.current_page], result_info)
-        await interaction.response.edit_message(embed=embed, view=self)
+    """
+    NDL検索結果をページネーションで表示するためのView。
+
+    最初の1ページ分だけを受け取り、続きのページはOpenSearchの `idx` パラメータで
+    必要になった時点で取得する。閲覧位置がページ末尾に近づくと次のページを
+    バックグラウンドで先読みし、作成済みのEmbedは件目ごとに使い回す。
+    """
+    # ページ末尾から何件手前で次ページの先読みを始めるか
+    PREFETCH_MARGIN = 3
+    # 最後の操作からViewを閉じるまでの秒数
+    TIMEOUT = 180.0
+
+    def __init__(self, cog: 'NDLCog', params: Dict[str, Any], first_result: Dict[str, Any]):
+        # 期限はBot共通の有効期限スケジューラで管理するため、View自身のタイマーは使わない
+        super().__init__(timeout=None)
+        self.cog = cog
+        self.expiry_key: Hashable = ("ndl_search", id(self))
+        self.params = params
+        self.page_size = max(1, int(params.get('cnt', len(first_result['items']))))
+        self.total_results = first_result['total']
+        # 閲覧可能な件数。取得できないページがあった場合は取得済みの範囲に縮める
+        self.browsable_count = max(len(first_result['items']), self.total_results)
+        self.current_index = 0
+        # {ページ番号: そのページの資料リスト}
+        self.pages: Dict[int, List[Dict[str, Any]]] = {0: first_result['items']}
+        # {ページ番号: 取得中のタスク}
+        self._page_tasks: Dict[int, asyncio.Task] = {}
+        self._prefetch_tasks: Set[asyncio.Task] = set()
+        # {件目(0始まり): 作成済みのEmbed}
+        self._embeds: Dict[int, nextcord.Embed] = {}
+
+    def _fetch_page(self, page_no: int) -> asyncio.Task:
+        """指定ページの取得タスクを返す。取得中であれば同じタスクを共有する。"""
+        if (task := self._page_tasks.get(page_no)) is None:
+            page_params = {**self.params, "idx": page_no * self.page_size + 1}
+            task = asyncio.create_task(self.cog._search_ndl(page_params))
+            self._page_tasks[page_no] = task
+        return task
+
+    async def _load_page(self, page_no: int) -> bool:
+        """ページを取得して保持する。取得できなかった場合は閲覧範囲をそこまでに縮める。"""
+        if page_no in self.pages:
+            return True
+        try:
+            result = await self._fetch_page(page_no)
+        finally:
+            self._page_tasks.pop(page_no, None)
+
+        if result and result.get('items'):
+            self.pages[page_no] = result['items']
+            if len(result['items']) == self.page_size:
+                return True
+
+        # 取得できない、または件数が足りないページがあれば、そこを閲覧範囲の終端とする
+        loaded_end = max(p * self.page_size + len(items) for p, items in self.pages.items())
+        if loaded_end < self.browsable_count:
+            logger.info(f"NDLの{page_no + 1}ページ目で資料が尽きたため、閲覧範囲を{loaded_end}件に縮めます。")
+            self.browsable_count = loaded_end
+        return page_no in self.pages
+
+    def _maybe_prefetch(self) -> None:
+        """閲覧位置がページ末尾に近づいていれば、次のページを先読みする。"""
+        page_no, offset = divmod(self.current_index, self.page_size)
+        next_page = page_no + 1
+        if (
+            offset >= self.page_size - self.PREFETCH_MARGIN
+            and next_page * self.page_size < self.browsable_count
+            and next_page not in self.pages
+            and next_page not in self._page_tasks
+        ):
+            task = asyncio.create_task(self._load_page(next_page))
+            # 実行中のタスクがGCされないよう、完了まで参照を保持する
+            self._prefetch_tasks.add(task)
+            task.add_done_callback(self._prefetch_tasks.discard)
+
+    def _get_embed(self, index: int) -> nextcord.Embed:
+        """指定件目のEmbedを返す。1度作成したEmbedは再利用する。"""
+        if (embed := self._embeds.get(index)) is None:
+            page_no, offset = divmod(index, self.page_size)
+            result_info = f"{self.total_results}件中 {index + 1}件目"
+            embed = create_ndl_embed(self.pages[page_no][offset], result_info)
+            self._embeds[index] = embed
+        return embed
+
+    async def show_page(self, interaction: nextcord.Interaction, step: int):
+        """現在位置から `step` 件移動した資料のEmbedを表示する。"""
+        self.touch()
+        self.current_index = (self.current_index + step) % self.browsable_count
+        page_no, offset = divmod(self.current_index, self.page_size)
+
+        if page_no in self.pages:
+            await interaction.response.edit_message(embed=self._get_embed(self.current_index), view=self)
+        else:
+            # 未取得のページはAPIの応答を待つため、先に応答を保留しておく
+            await interaction.response.defer()
+            if not await self._load_page(page_no) or offset >= len(self.pages[page_no]):
+                # 結果の終端を越えた場合は、取得済みの範囲内で折り返す
+                self.current_index = 0 if step > 0 else self.browsable_count - 1
+            await interaction.edit_original_message(embed=self._get_embed(self.current_index), view=self)
+
+        self._maybe_prefetch()
 
     @nextcord.ui.button(label="◀️ 前へ", style=nextcord.ButtonStyle.grey)
     async def prev_button(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
-        self.current_page = (self.current_page - 1) % len(self.items)
-        await self.show_page(interaction)
+        await self.show_page(interaction, -1)
 
     @nextcord.ui.button(label="▶️ 次へ", style=nextcord.ButtonStyle.grey)
     async def next_button(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
-        self.current_page = (self.current_page + 1) % len(self.items)
-        await self.show_page(interaction)
+        await self.show_page(interaction, 1)
+
+    def touch(self) -> None:
+        """操作があったものとして、Viewを閉じる期限を延長する。"""
+        self.cog.bot.expiry_scheduler.schedule(self.expiry_key, self, self.TIMEOUT, self._on_expired)
+
+    def _on_expired(self, key: Hashable, view: 'NDLSearchView') -> None:
+        """
+        期限切れでViewを閉じる。閉じたViewのために先読みを続けないよう、取得の待ち合わせも止める。
+
+        止めるのはこのViewの待ち合わせだけで、NDLへのリクエストは `search_cache` が別のタスクで
+        実行しているため、同じ検索を待っている他のユーザーの処理はキャンセルされずに完了する。
+        """
+        for task in [*self._page_tasks.values(), *self._prefetch_tasks]:
+            task.cancel()
+        self._page_tasks.clear()
+        self.stop()
+
+
+class ActiveQuiz(NamedTuple):
+    """チャンネルで出題中のクイズ。"""
+    item: Dict[str, Any]
+    view: 'QuizView'
 
 
 class QuizAnswerModal(nextcord.ui.Modal):
@@ -101,6 +211,11 @@ class QuizAnswerModal(nextcord.ui.Modal):
         self.add_item(self.answer_input)
 
     async def callback(self, interaction: nextcord.Interaction):
+        # 回答されたらクイズを終了する。入力中に時間切れになっていた場合は受け付けない
+        if self.cog.end_quiz(interaction.channel.id) is None:
+            await interaction.response.send_message("このクイズはもう終わっちゃったみたいだワン！", ephemeral=True)
+            return
+
         user_answer = self.answer_input.value
         # 類似度を計算して正誤判定
         similarity = difflib.SequenceMatcher(None, user_answer.lower(), self.correct_title.lower()).ratio()
@@ -109,38 +224,27 @@ class QuizAnswerModal(nextcord.ui.Modal):
             await interaction.response.send_message(f"🎉 **正解だワン！**\n正解は「**{self.correct_title}**」でした！")
         else:
             await interaction.response.send_message(f"惜しいワン！不正解です…😢\n正解は「**{self.correct_title}**」でした！")
-        # 回答されたらアクティブなクイズリストから削除
-        self.cog.active_quizzes.pop(interaction.channel.id, None)
 
 
 class QuizView(nextcord.ui.View):
-    """クイズの「回答する」ボタンとタイムアウト処理を持つView。"""
+    """
+    クイズの「回答する」ボタンを持つView。
+
+    制限時間はBot共通の有効期限スケジューラがチャンネルごとに管理するため、
+    View自身のタイマーは使わない。
+    """
     def __init__(self, cog: 'NDLCog'):
-        super().__init__(timeout=cog.QUIZ_TIMEOUT)
+        super().__init__(timeout=None)
         self.cog = cog
 
     @nextcord.ui.button(label="回答する", style=nextcord.ButtonStyle.green)
     async def answer_button(self, button: nextcord.ui.Button, interaction: nextcord.Interaction):
-        quiz_data = self.cog.active_quizzes.get(interaction.channel.id)
+        quiz_data = self.cog.get_active_quiz(interaction.channel.id)
         if not quiz_data:
             await interaction.response.send_message("このクイズはもう終わっちゃったみたいだワン！", ephemeral=True)
             return
         await interaction.response.send_modal(QuizAnswerModal(self.cog, quiz_data['title']))
 
-    async def on_timeout(self):
-        # Viewのon_timeoutはinteractionを持たないため、自身でチャンネルIDを保持する必要がある
-        # 今回はCogのactive_quizzesから探すが、本来はView初期化時にchannelを渡すのが堅牢
-        # タイムアウトしたクイズを探して削除し、メッセージを送信
-        for channel_id, quiz_data in list(self.cog.active_quizzes.items()):
-            # このViewが関連するクイズかどうかの厳密な判定は難しいが、ここではタイムアウトしたものを処理
-            if self.cog.active_quizzes.pop(channel_id, None):
-                 try:
-                    channel = self.cog.bot.get_channel(channel_id)
-                    if channel:
-                        await channel.send(f"時間切れだワン！正解は「**{quiz_data['title']}**」でした！")
-                 except Exception as e:
-                    logger.error(f"クイズのタイムアウトメッセージ送信に失敗: {e}")
-
 
 # --- Cog本体 ---
 class NDLCog(commands.Cog, name="NDL検索"):
@@ -149,32 +253,186 @@ class NDLCog(commands.Cog, name="NDL検索"):
     # --- クラス定数 ---
     QUIZ_RETRY_COUNT = 5
     QUIZ_TIMEOUT = 60.0
+    SEARCH_CACHE_SIZE = 256
+    SEARCH_CACHE_TTL = 1800.0
+    PARSE_CHUNK_SIZE = 64 * 1024
+    # --- クイズ候補プールの設定 ---
+    QUIZ_POOL_SIZE = 20  # キーワードごとに確保しておく候補数
+    QUIZ_POOL_LOW_WATER = 3  # これを下回ったらバックグラウンドで補充する
+    QUIZ_POOL_SEARCH_PAGES = 5  # 候補を探す検索結果のページ範囲 (1ページ=50件)
+    THUMBNAIL_CHECK_CONCURRENCY = 8
+    THUMBNAIL_CHECK_TIMEOUT = 5.0
+    STATS_LABEL = "📚 NDLキャッシュ命中率"
     
     def __init__(self, bot: 'AIDogBot'):
         self.bot = bot
-        self.active_quizzes: Dict[int, Dict[str, Any]] = {}
         self.random_keywords = ["科学", "歴史", "文学", "芸術", "宇宙", "プログラミング", "経済", "写真"]
         self.quiz_keywords = ["写真集", "絵本", "画集", "漫画", "雑誌"]
+        # 正規化した検索パラメータ → パース済みの検索結果
+        self.search_cache = TTLCache(maxsize=self.SEARCH_CACHE_SIZE, ttl=self.SEARCH_CACHE_TTL)
+        self.bot.stats.register_source(self.STATS_LABEL, self.search_cache.describe)
+        # {キーワード: 書影の表示を確認済みのクイズ候補}
+        self.quiz_pool: Dict[str, Deque[Dict[str, Any]]] = {keyword: deque() for keyword in self.quiz_keywords}
+        self._thumbnail_semaphore = asyncio.Semaphore(self.THUMBNAIL_CHECK_CONCURRENCY)
+        self._refill_task: Optional[asyncio.Task] = None
+        self.refresh_quiz_pool_task.start()
+
+    def cog_unload(self):
+        """Cogのアンロード時に、統計への登録を解除し、バックグラウンド処理を止める。"""
+        self.bot.stats.unregister_source(self.STATS_LABEL)
+        self.refresh_quiz_pool_task.cancel()
+        if self._refill_task:
+            self._refill_task.cancel()
 
     async def _search_ndl(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        NDL APIの検索結果を返す。
+
+        同じ検索条件の結果はキャッシュから返し、同時に同じ検索が来た場合は
+        1回のAPIリクエストを共有する。エラー(None)はキャッシュしない。
+        """
+        cache_key = normalize_search_params(params)
+        return await self.search_cache.get_or_fetch(cache_key, lambda: self._fetch_ndl(params))
+
+    async def _fetch_ndl(self, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """NDL APIにリクエストを送信し、パースした結果を返す。"""
         try:
-            logger.info(f"NDL API Request: {params}")
-            async with self.bot.http_session.get(NDL_API_BASE_URL, params=params) as response:
+            logger.info("NDL API Request: %s", params, extra=SAMPLED)
+            async with self.bot.http_client.get(NDL_API_BASE_URL, params=params) as response:
                 response.raise_for_status()
+                if self.bot.config.ndl_streaming_parse:
+                    return await self._parse_streaming(response)
+
                 xml_text = await response.text()
                 if not xml_text:
                     return None
                 
-                root = ET.fromstring(xml_text)
-                total_results_elem = root.find('channel/openSearch:totalResults', namespaces=NAMESPACES)
-                total = int(total_results_elem.text) if total_results_elem is not None and total_results_elem.text.isdigit() else 0
-                items = [parse_xml_item(item) for item in root.findall('channel/item')]
+                total, items = parse_document(xml_text)
                 return {"total": total, "items": items}
         except (aiohttp.ClientError, ET.ParseError) as e:
             logger.error(f"NDL API Search Error: {e}", exc_info=True)
             return None
 
+    async def _parse_streaming(self, response: aiohttp.ClientResponse) -> Optional[Dict[str, Any]]:
+        """
+        応答本文をチャンクごとに受信しながら、ワーカースレッドで逐次パースする。
+
+        文書全体を文字列として保持せず、イベントループ上でXMLを解析しないため、
+        大きな検索結果でも他の処理を止めずに済む。
+        """
+        parser = NDLStreamParser()
+        async for chunk in response.content.iter_chunked(self.PARSE_CHUNK_SIZE):
+            await asyncio.to_thread(parser.feed, chunk)
+        if parser.bytes_fed == 0:
+            return None
+        total, items = await asyncio.to_thread(parser.close)
+        return {"total": total, "items": items}
+
+    # --- 出題中のクイズの管理 ---
+    @staticmethod
+    def _quiz_key(channel_id: int) -> Hashable:
+        return ("ndl_quiz", channel_id)
+
+    def get_active_quiz(self, channel_id: int) -> Optional[Dict[str, Any]]:
+        """チャンネルで出題中のクイズの資料データを返す。出題中でなければNone。"""
+        state: Optional[ActiveQuiz] = self.bot.expiry_scheduler.get(self._quiz_key(channel_id))
+        return state.item if state else None
+
+    def start_quiz(self, channel_id: int, item: Dict[str, Any], view: 'QuizView') -> None:
+        """クイズを出題中として登録し、制限時間を設定する。"""
+        self.bot.expiry_scheduler.schedule(
+            self._quiz_key(channel_id), ActiveQuiz(item, view), self.QUIZ_TIMEOUT, self._on_quiz_expired
+        )
+
+    def end_quiz(self, channel_id: int) -> Optional[Dict[str, Any]]:
+        """出題中のクイズを終了し、その資料データを返す。出題中でなければNone。"""
+        state: Optional[ActiveQuiz] = self.bot.expiry_scheduler.cancel(self._quiz_key(channel_id))
+        if state is None:
+            return None
+        state.view.stop()
+        return state.item
+
+    async def _on_quiz_expired(self, key: Hashable, state: ActiveQuiz) -> None:
+        """制限時間を過ぎたクイズを終了し、正解をチャンネルに知らせる。"""
+        _, channel_id = key
+        state.view.stop()
+        try:
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                await channel.send(f"時間切れだワン！正解は「**{state.item['title']}**」でした！")
+        except Exception as e:
+            logger.error(f"クイズのタイムアウトメッセージ送信に失敗: {e}")
+
+    # --- クイズ候補プール ---
+    async def _is_thumbnail_available(self, url: str) -> bool:
+        """書影のURLが実際に画像を返すかを、HEADリクエストで確認する。"""
+        timeout = aiohttp.ClientTimeout(total=self.THUMBNAIL_CHECK_TIMEOUT)
+        async with self._thumbnail_semaphore:
+            try:
+                # 書影の確認は件数が多いため、失敗しても再試行せずに候補から外す
+                async with self.bot.http_client.head(url, allow_redirects=True, timeout=timeout, retries=0) as response:
+                    content_type = response.headers.get('Content-Type', '')
+                    return response.status == 200 and content_type.startswith('image/')
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return False
+
+    async def _collect_quiz_candidates(self, keyword: str) -> List[Dict[str, Any]]:
+        """キーワードで検索し、書影が表示できることを確認した候補を返す。"""
+        page_no = random.randrange(self.QUIZ_POOL_SEARCH_PAGES)
+        params = {"any": keyword, "mediatype": "1", "cnt": 50, "idx": page_no * 50 + 1}
+        result = await self._search_ndl(params)
+        if not result or not result.get('items'):
+            return []
+
+        pooled_links = {item.get('link') for item in self.quiz_pool[keyword]}
+        candidates = [
+            item for item in result['items']
+            if item.get('thumbnail_url') and item.get('link') not in pooled_links
+        ]
+        checks = await asyncio.gather(*(self._is_thumbnail_available(item['thumbnail_url']) for item in candidates))
+        return [item for item, ok in zip(candidates, checks) if ok]
+
+    async def _refill_quiz_pool(self, keywords: List[str]) -> None:
+        """指定キーワードのプールを、各キーワード並行で目標数まで補充する。"""
+        keywords = [kw for kw in keywords if len(self.quiz_pool[kw]) < self.QUIZ_POOL_SIZE]
+        results = await asyncio.gather(
+            *(self._collect_quiz_candidates(kw) for kw in keywords), return_exceptions=True
+        )
+        for keyword, candidates in zip(keywords, results):
+            if isinstance(candidates, BaseException):
+                logger.error(f"クイズ候補の補充に失敗しました ({keyword}): {candidates}")
+                continue
+            random.shuffle(candidates)
+            pool = self.quiz_pool[keyword]
+            pool.extend(candidates[:self.QUIZ_POOL_SIZE - len(pool)])
+        pool_sizes = {kw: len(pool) for kw, pool in self.quiz_pool.items()}
+        logger.info(f"クイズ候補プールを補充しました: {pool_sizes}")
+
+    def _schedule_refill(self) -> None:
+        """残りが少ないプールを、クイズの出題を待たせずにバックグラウンドで補充する。"""
+        if self._refill_task and not self._refill_task.done():
+            return
+        low_keywords = [kw for kw, pool in self.quiz_pool.items() if len(pool) < self.QUIZ_POOL_LOW_WATER]
+        if low_keywords:
+            self._refill_task = asyncio.create_task(self._refill_quiz_pool(low_keywords))
+
+    def _pop_quiz_item(self) -> Optional[Dict[str, Any]]:
+        """候補が残っているキーワードをランダムに選び、候補を1件取り出す。"""
+        available = [kw for kw, pool in self.quiz_pool.items() if pool]
+        if not available:
+            return None
+        return self.quiz_pool[random.choice(available)].popleft()
+
+    @tasks.loop(minutes=30)
+    async def refresh_quiz_pool_task(self) -> None:
+        """クイズ候補プールを定期的に補充する。"""
+        await self._refill_quiz_pool(self.quiz_keywords)
+
+    @refresh_quiz_pool_task.before_loop
+    async def before_refresh_quiz_pool(self):
+        """タスク開始前にBotが準備完了するのを待つ。"""
+        await self.bot.wait_until_ready()
+
     async def _execute_search(self, ctx: commands.Context, params: Dict[str, Any], not_found_msg: str):
         """検索処理を実行し、結果をページネーションで表示する共通メソッド。"""
         result = await self._search_ndl(params)
@@ -185,10 +443,9 @@ class NDLCog(commands.Cog, name="NDL検索"):
             await ctx.send(not_found_msg)
             return
             
-        view = NDLSearchView(result['items'], result['total'])
-        result_info = f"{result['total']}件中 1件目"
-        embed = create_ndl_embed(result['items'][0], result_info)
-        await ctx.send(embed=embed, view=view)
+        view = NDLSearchView(self, params, result)
+        await ctx.send(embed=view._get_embed(0), view=view)
+        view.touch()
 
     # --- コマンドグループ ---
     @commands.group(name="ndl", invoke_without_command=True, help="国立国会図書館の資料を検索するワン！")
@@ -240,31 +497,34 @@ class NDLCog(commands.Cog, name="NDL検索"):
 
     @ndl.command(name="quiz", aliases=["q"], help="書影を見て本のタイトルを当てるクイズです。")
     async def quiz(self, ctx: commands.Context):
-        if ctx.channel.id in self.active_quizzes:
+        if self.get_active_quiz(ctx.channel.id) is not None:
             await ctx.send("このチャンネルではまだクイズの回答待ちだワン！")
             return
             
-        await ctx.send("書影クイズの準備中… 面白そうな表紙を探してくるワン！")
-        
-        # クイズに適したアイテム（書影あり）を探す
-        quiz_item = None
-        for _ in range(self.QUIZ_RETRY_COUNT):
-            keyword = random.choice(self.quiz_keywords)
-            params = {"any": keyword, "mediatype": "1", "cnt": 50}
-            result = await self._search_ndl(params)
-            if result and result.get('items'):
-                valid_items = [item for item in result['items'] if item.get('thumbnail_url')]
-                if valid_items:
-                    quiz_item = random.choice(valid_items)
-                    break # アイテムが見つかったらループを抜ける
+        # 書影の表示を確認済みの候補をプールから取り出す
+        quiz_item = self._pop_quiz_item()
+        self._schedule_refill()
+
+        if not quiz_item:
+            # プールが空（起動直後など）の場合のみ、その場で検索する
+            await ctx.send("書影クイズの準備中… 面白そうな表紙を探してくるワン！")
+            for _ in range(self.QUIZ_RETRY_COUNT):
+                keyword = random.choice(self.quiz_keywords)
+                params = {"any": keyword, "mediatype": "1", "cnt": 50}
+                result = await self._search_ndl(params)
+                if result and result.get('items'):
+                    valid_items = [item for item in result['items'] if item.get('thumbnail_url')]
+                    if valid_items:
+                        quiz_item = random.choice(valid_items)
+                        break # アイテムが見つかったらループを抜ける
         
         if not quiz_item:
             await ctx.send("クイズを出題できる本が見つからなかったワン…ごめんね。")
             return
 
         # クイズを出題
-        self.active_quizzes[ctx.channel.id] = quiz_item
         view = QuizView(self)
+        self.start_quiz(ctx.channel.id, quiz_item, view)
         embed = nextcord.Embed(title="この本のタイトルは何だワン？", color=nextcord.Color.gold())
         embed.set_image(url=quiz_item['thumbnail_url'])
         await ctx.send(embed=embed, view=view)
@@ -8,8 +8,8 @@ Discord Bot「AI犬」の設定管理モジュール。
 
 import logging
 import os
-from dataclasses import dataclass, field
-from typing import List, Optional
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
@@ -41,6 +41,86 @@ class BotConfig:
     request_timeout: int = 180
     rate_limit_per_user: int = 5
     rate_limit_window: int = 60
+    # サーバー単位・Bot全体のレート制限 (0で無効)
+    rate_limit_per_guild: int = 0
+    rate_limit_global: int = 0
+    # 外部APIへのHTTPリクエスト
+    http_limit_per_host: int = 10
+    http_max_retries: int = 2
+    # ホストごとのタイムアウト秒数 {ホスト名: 秒数} (未指定のホストは request_timeout)
+    http_host_timeouts: Dict[str, float] = field(default_factory=dict)
+
+    # --- GPU使用量クォータ設定 (予算は0で無効) ---
+    # 単位は token_quota_unit が "tokens" ならトークン数、"duration" なら推論時間(ms)
+    token_quota_user_budget: int = 0
+    token_quota_guild_budget: int = 0
+    token_quota_window: int = 3600
+    token_quota_unit: str = "tokens"
+    quota_db_path: str = "ai_dog_quota.sqlite3"
+
+    # --- 外部APIキーのクォータ設定 (上限は0で無効) ---
+    openweathermap_quota_per_minute: int = 60
+    openweathermap_quota_per_day: int = 1000
+    hotpepper_quota_per_minute: int = 30
+    hotpepper_quota_per_day: int = 3000
+    # 分あたりの上限に達したとき、空きを待つ最大秒数
+    api_quota_queue_wait: int = 5
+
+    # --- シャーディング・複数プロセス設定 ---
+    # AutoShardedBotとして起動するか
+    auto_shard: bool = False
+    # シャードの総数 (0でDiscordの推奨数)
+    shard_count: int = 0
+    # このプロセスが担当するシャードID (空で全シャード。launcher.py が設定する)
+    shard_ids: List[int] = field(default_factory=list)
+    # レート制限のバケットを複数プロセスで共有するDB (空でプロセス内のメモリに保持)
+    shared_state_db_path: str = ""
+
+    # --- イベントループ監視設定 ---
+    loop_monitor_enabled: bool = True
+    # イベントループが止まっているとみなし、スタックを採取する遅れ（ミリ秒）
+    loop_stall_threshold_ms: int = 100
+
+    # profile コマンドで計測できる最大秒数
+    profiler_max_seconds: int = 60
+
+    # --- メモリ監視設定 ---
+    # RSSと確保中のメモリブロック数を記録する間隔（秒、0で記録しない）
+    memory_sample_seconds: int = 60
+    # memory snapshot で tracemalloc が確保ごとに保存するスタックの深さ
+    memory_trace_frames: int = 10
+
+    # --- トラフィック記録 ---
+    # 受け取ったイベントを匿名化して記録するディレクトリ (空で記録しない)
+    traffic_record_dir: str = ""
+
+    # --- 高速化モード ---
+    # uvloop と高速なJSONライブラリ (orjson / ujson) を、インストールされていれば使うか
+    accelerated_runtime: bool = False
+
+    # --- ログ設定 ---
+    log_file: str = "ai_dog_bot.log"
+    log_level: str = "INFO"
+    # サイズでローテーションする場合の1ファイルの最大バイト数 (0でローテーションしない)
+    log_max_bytes: int = 10 * 1024 * 1024
+    log_backup_count: int = 5
+    # 時刻でローテーションする場合の単位 ("midnight" など。空ならサイズでローテーション)
+    log_rotate_when: str = ""
+    # ログファイルを1行1JSONの形式で出力するか
+    log_json: bool = False
+    # 質問受付など件数の多いINFOログを、何件に1件出力するか (1で間引かない)
+    log_sample_every: int = 1
+
+    # --- 生成ワーカー設定 (ジョブキュー) ---
+    # 会話の生成を worker.py のプロセスに任せるか (Falseで従来どおりBot本体で生成)
+    job_queue_enabled: bool = False
+    job_queue_db_path: str = "ai_dog_jobs.sqlite3"
+    # ワーカーが取り出したジョブを他のワーカーに渡さない秒数 (生成中は自動で延長)
+    job_lease_seconds: int = 60
+    # 1件のジョブを取り出す最大回数 (超えたら失敗として応答する)
+    job_max_attempts: int = 3
+    # 1ワーカープロセスが同時に処理するジョブ数
+    worker_concurrency: int = 2
 
     # --- Ollamaモデルパラメータ ---
     ollama_temperature: float = 0.7
@@ -54,10 +134,31 @@ class BotConfig:
     weather_default_city: str = "東京"
     # グルメ検索機能
     hotpepper_api_key: Optional[str] = None
+    # 取得したお店の位置情報を保存するDB (近くのお店検索に使用)
+    shop_index_db_path: str = "ai_dog_shops.sqlite3"
+    # NDL検索: 応答をワーカースレッドで逐次パースするか (Falseで従来の一括パース)
+    ndl_streaming_parse: bool = True
+    # 起動時には読み込まず、最初のコマンドで読み込むCog (例: ["ndl"])
+    lazy_cogs: List[str] = field(default_factory=list)
     # (未使用だが将来のためのプレースホルダー)
     progress_update_interval: int = 7
 
 
+def str_to_bool(value: str) -> bool:
+    """
+    環境変数の文字列を真偽値に変換する。
+
+    Raises:
+        ValueError: 真偽値として解釈できない文字列だった場合。
+    """
+    normalized = value.strip().lower()
+    if normalized in ("1", "true", "yes", "on"):
+        return True
+    if normalized in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"真偽値として解釈できません: {value}")
+
+
 def load_and_validate_config() -> BotConfig:
     """
     環境変数を読み込み、検証し、BotConfigインスタンスを生成して返す。
@@ -101,6 +202,42 @@ def load_and_validate_config() -> BotConfig:
         ("request_timeout", int),
         ("rate_limit_per_user", int),
         ("rate_limit_window", int),
+        ("rate_limit_per_guild", int),
+        ("rate_limit_global", int),
+        ("http_limit_per_host", int),
+        ("http_max_retries", int),
+        ("token_quota_user_budget", int),
+        ("token_quota_guild_budget", int),
+        ("token_quota_window", int),
+        ("token_quota_unit", str),
+        ("quota_db_path", str),
+        ("openweathermap_quota_per_minute", int),
+        ("openweathermap_quota_per_day", int),
+        ("hotpepper_quota_per_minute", int),
+        ("hotpepper_quota_per_day", int),
+        ("api_quota_queue_wait", int),
+        ("auto_shard", str_to_bool),
+        ("shard_count", int),
+        ("shared_state_db_path", str),
+        ("loop_monitor_enabled", str_to_bool),
+        ("loop_stall_threshold_ms", int),
+        ("profiler_max_seconds", int),
+        ("memory_sample_seconds", int),
+        ("memory_trace_frames", int),
+        ("traffic_record_dir", str),
+        ("accelerated_runtime", str_to_bool),
+        ("log_file", str),
+        ("log_level", str),
+        ("log_max_bytes", int),
+        ("log_backup_count", int),
+        ("log_rotate_when", str),
+        ("log_json", str_to_bool),
+        ("log_sample_every", int),
+        ("job_queue_enabled", str_to_bool),
+        ("job_queue_db_path", str),
+        ("job_lease_seconds", int),
+        ("job_max_attempts", int),
+        ("worker_concurrency", int),
         ("ollama_temperature", float),
         ("ollama_num_ctx", int),
         ("ollama_top_p", float),
@@ -108,6 +245,8 @@ def load_and_validate_config() -> BotConfig:
         ("openweathermap_api_key", str),
         ("weather_default_city", str),
         ("hotpepper_api_key", str),
+        ("shop_index_db_path", str),
+        ("ndl_streaming_parse", str_to_bool),
         ("progress_update_interval", int),
     ]
 
@@ -137,6 +276,39 @@ def load_and_validate_config() -> BotConfig:
             logger.error(f"ADMIN_USER_IDS の解析中にエラーが発生しました: {e}")
 
 
+    # 3-2. 特殊な形式の環境変数をパース (ホストごとのタイムアウト)
+    http_host_timeouts_env = os.getenv("HTTP_HOST_TIMEOUTS")
+    if http_host_timeouts_env:
+        # "ホスト名=秒数" をカンマ区切りで指定する
+        for entry in http_host_timeouts_env.split(","):
+            host, sep, seconds = entry.partition("=")
+            try:
+                if not sep or not host.strip():
+                    raise ValueError(entry)
+                config_instance.http_host_timeouts[host.strip().lower()] = float(seconds)
+            except ValueError:
+                logger.warning(f"HTTP_HOST_TIMEOUTS の項目「{entry.strip()}」を解釈できませんでした。無視します。")
+
+    # 3-3. 特殊な形式の環境変数をパース (遅延読み込みするCog)
+    lazy_cogs_env = os.getenv("LAZY_COGS")
+    if lazy_cogs_env:
+        config_instance.lazy_cogs = [name.strip() for name in lazy_cogs_env.split(",") if name.strip()]
+
+    # 3-4. 特殊な形式の環境変数をパース (担当するシャードID)
+    shard_ids_env = os.getenv("SHARD_IDS")
+    if shard_ids_env:
+        try:
+            config_instance.shard_ids = [int(x) for x in shard_ids_env.split(",") if x.strip()]
+        except ValueError:
+            logger.error(f"SHARD_IDS の値「{shard_ids_env}」を解釈できませんでした。全シャードを担当します。")
+    if config_instance.shard_ids:
+        if config_instance.shard_count <= 0:
+            logger.warning("SHARD_IDS を指定する場合は SHARD_COUNT も必要です。SHARD_IDS を無視します。")
+            config_instance.shard_ids = []
+        elif any(not 0 <= shard_id < config_instance.shard_count for shard_id in config_instance.shard_ids):
+            logger.warning(f"SHARD_IDS に 0〜{config_instance.shard_count - 1} の範囲外のIDがあります。SHARD_IDS を無視します。")
+            config_instance.shard_ids = []
+
     # 4. 最終的な設定値の検証と通知 (APIキーなど)
     if not config_instance.openweathermap_api_key:
         logger.warning("OPENWEATHERMAP_API_KEY が設定されていません。天気機能は利用できません。")
@@ -144,4 +316,32 @@ def load_and_validate_config() -> BotConfig:
         logger.warning("HOTPEPPER_API_KEY が設定されていません。グルメ検索機能は利用できません。")
 
     logger.info("設定の読み込みと検証が完了しました。")
-    return config_instance
\ No newline at end of file
+    return config_instance
+
+
+def api_quota_limits(config: BotConfig) -> Dict[str, Tuple[int, int]]:
+    """設定から、APIごとの (分あたりの上限, 日あたりの上限) を組み立てる。"""
+    return {
+        "openweathermap": (config.openweathermap_quota_per_minute, config.openweathermap_quota_per_day),
+        "hotpepper": (config.hotpepper_quota_per_minute, config.hotpepper_quota_per_day),
+    }
+
+
+def diff_config(old_config: BotConfig, new_config: BotConfig) -> Dict[str, Tuple[Any, Any]]:
+    """
+    2つの設定を項目ごとに比較し、値が変わった項目だけを返す。
+
+    Args:
+        old_config (BotConfig): 変更前の設定。
+        new_config (BotConfig): 変更後の設定。
+
+    Returns:
+        Dict[str, Tuple[Any, Any]]: {フィールド名: (変更前の値, 変更後の値)}
+    """
+    changes: Dict[str, Tuple[Any, Any]] = {}
+    for config_field in fields(BotConfig):
+        old_value = getattr(old_config, config_field.name)
+        new_value = getattr(new_config, config_field.name)
+        if old_value != new_value:
+            changes[config_field.name] = (old_value, new_value)
+    return changes
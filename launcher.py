@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」を複数プロセスに分けて起動するランチャー。
+
+シャードの範囲をプロセスごとに分け、それぞれの `bot_main.py` を
+自動シャーディング (AUTO_SHARD / SHARD_COUNT / SHARD_IDS) で起動します。
+レート制限は SHARED_STATE_DB_PATH、会話履歴とクォータは各DBファイルを
+SQLite (WALモード) で共有するため、どのプロセスが受けても制限は一貫します。
+
+使い方:
+    python launcher.py --processes 2 [--shards 4]
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("launcher")
+
+# --- 定数定義 ---
+BOT_MAIN_PATH = Path(__file__).resolve().parent / "bot_main.py"
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+DEFAULT_SHARED_STATE_DB_PATH = "ai_dog_shared_state.sqlite3"
+DEFAULT_LOG_FILE = "ai_dog_bot.log"
+# 異常終了したプロセスを再起動するまでの最大待機秒数
+MAX_RESTART_DELAY = 60.0
+# この秒数以上動いていたプロセスは、再起動の待機時間を最初からやり直す
+STABLE_RUN_SECONDS = 300.0
+# 終了時に子プロセスの停止を待つ秒数
+SHUTDOWN_TIMEOUT = 30.0
+
+
+def fetch_recommended_shards(token: str) -> int:
+    """DiscordのAPIから、このBotに推奨されるシャード数を取得する。"""
+    request = urllib.request.Request(
+        GATEWAY_BOT_URL,
+        headers={
+            "Authorization": f"Bot {token}",
+            "User-Agent": "DiscordBot (ai-dog-launcher, 1.0)",
+        }
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)["shards"])
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    """
+    シャードIDを、プロセス数に応じた連続した範囲に分ける。
+
+    Args:
+        shard_count (int): シャードの総数。
+        processes (int): プロセス数。シャード数より多い場合はシャード数に揃える。
+
+    Returns:
+        List[List[int]]: プロセスごとのシャードIDのリスト。
+    """
+    processes = max(1, min(processes, shard_count))
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for index in range(processes):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+class ShardProcess:
+    """1つのBotプロセスと、その担当シャード・再起動の状態。"""
+
+    def __init__(self, shard_ids: List[int], shard_count: int, base_env: Dict[str, str]):
+        self.shard_ids = shard_ids
+        self.env = dict(base_env)
+        # ローテーションがぶつからないよう、プロセスごとに別のログファイルに書き込む
+        log_path = Path(base_env.get("LOG_FILE") or DEFAULT_LOG_FILE)
+        self.env.update({
+            "LOG_FILE": str(log_path.with_name(f"{log_path.stem}.shard{shard_ids[0]}-{shard_ids[-1]}{log_path.suffix}")),
+            "AUTO_SHARD": "true",
+            "SHARD_COUNT": str(shard_count),
+            "SHARD_IDS": ",".join(map(str, shard_ids)),
+        })
+        self.process: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        # 再起動を待っている場合の、再起動する時刻
+        self.restart_at: Optional[float] = None
+
+    @property
+    def label(self) -> str:
+        return f"シャード {self.shard_ids[0]}-{self.shard_ids[-1]}"
+
+    def start(self) -> None:
+        self.process = subprocess.Popen([sys.executable, str(BOT_MAIN_PATH)], env=self.env, cwd=BOT_MAIN_PATH.parent)
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info(f"{self.label} を起動しました (PID: {self.process.pid})")
+
+    def poll(self) -> None:
+        """終了していれば、待機時間を空けて再起動する。"""
+        now = time.monotonic()
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        if self.process is None or (code := self.process.poll()) is None:
+            return
+
+        if now - self.started_at >= STABLE_RUN_SECONDS:
+            self.restarts = 0
+        delay = min(MAX_RESTART_DELAY, 2.0 ** self.restarts)
+        self.restarts += 1
+        self.restart_at = now + delay
+        logger.warning(f"{self.label} が終了しました (終了コード: {code})。{delay:.0f}秒後に再起動します。")
+
+    def stop(self) -> None:
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout: float) -> None:
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{self.label} が停止しないため強制終了します。")
+            self.process.kill()
+            self.process.wait()
+
+
+def run(processes: int, shard_count: int) -> None:
+    """シャードを分けてBotプロセスを起動し、終了の指示があるまで監視する。"""
+    base_env = dict(os.environ)
+    # プロセス間でレート制限を共有するため、指定がなければ既定の共有DBを使う
+    if not base_env.get("SHARED_STATE_DB_PATH"):
+        base_env["SHARED_STATE_DB_PATH"] = DEFAULT_SHARED_STATE_DB_PATH
+
+    shard_ranges = split_shards(shard_count, processes)
+    workers = [ShardProcess(shard_ids, shard_count, base_env) for shard_ids in shard_ranges]
+    logger.info(f"シャード {shard_count} 個を {len(workers)} プロセスで起動します: "
+                f"{', '.join(worker.label for worker in workers)}")
+
+    stopping = False
+
+    def request_stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    for worker in workers:
+        worker.start()
+    try:
+        while not stopping:
+            for worker in workers:
+                worker.poll()
+            time.sleep(1.0)
+    finally:
+        logger.info("すべてのBotプロセスを停止します...")
+        for worker in workers:
+            worker.stop()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for worker in workers:
+            worker.wait(max(0.0, deadline - time.monotonic()))
+        logger.info("すべてのBotプロセスが停止しました。")
+
+
+def main() -> None:
+    """コマンドライン引数と環境変数から、プロセス数とシャード数を決めて起動する。"""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="AI犬をシャードごとに複数プロセスで起動します。")
+    parser.add_argument("--processes", type=int, default=int(os.getenv("LAUNCHER_PROCESSES", "2")),
+                        help="起動するプロセス数 (既定: LAUNCHER_PROCESSES または 2)")
+    parser.add_argument("--shards", type=int, default=int(os.getenv("SHARD_COUNT", "0")),
+                        help="シャードの総数 (既定: SHARD_COUNT、0ならDiscordの推奨数)")
+    args = parser.parse_args()
+
+    shard_count = args.shards
+    if shard_count <= 0:
+        token = os.getenv("BOT_TOKEN")
+        if not token:
+            raise SystemExit("BOT_TOKEN が設定されていないため、推奨シャード数を取得できません。--shards を指定してください。")
+        shard_count = fetch_recommended_shards(token)
+        logger.info(f"Discordの推奨シャード数: {shard_count}")
+
+    run(max(1, args.processes), shard_count)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の外部APIキー用クォータ管理モジュール。
+
+OpenWeatherMapやホットペッパーなど、APIキーごとに分あたり・日あたりの
+呼び出し上限があるAPIについて、トークンバケットと日次カウンターで
+呼び出し回数を制限し、その状態をSQLiteに保存します。
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from utils.shared_state import SHARED_DB_TIMEOUT, enable_wal
+
+logger = logging.getLogger(__name__)
+
+
+class APIQuotaExceeded(Exception):
+    """APIのクォータを使い切っており、呼び出しを見送ったことを表す例外。"""
+
+    def __init__(self, api: str, retry_after: float):
+        super().__init__(f"{api} のクォータを使い切りました (あと {retry_after:.0f}秒)")
+        self.api = api
+        self.retry_after = retry_after
+
+
+class _QuotaState:
+    """1つのAPIのクォータ設定と現在の状態。"""
+    __slots__ = ('per_minute', 'per_day', 'tokens', 'updated', 'day', 'day_count')
+
+    def __init__(self, per_minute: int, per_day: int):
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.tokens = float(per_minute)
+        self.updated = time.time()
+        self.day = ""
+        self.day_count = 0
+
+
+class APIQuotaManager:
+    """
+    APIごとの呼び出し回数を、トークンバケット（分あたり）と日次カウンターで管理するクラス。
+
+    状態は呼び出しのたびにSQLiteへ保存するため、Botを再起動しても
+    その日の使用回数は引き継がれます。確保はDB上の最新の状態を読み直してから
+    1つのトランザクションで行うため、複数のプロセスが同じDBを使っても
+    上限を超えて呼び出すことはありません。日付の切り替わりはBotを動かしている環境の
+    ローカル時刻で判定します。上限に0を指定した段階は制限しません。
+    """
+    # 日次の残量がこの割合を下回ったら「残りわずか」とみなす
+    LOW_WATER_RATIO = 0.1
+
+    # --- SQLクエリ定義 ---
+    _CREATE_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS api_quota (
+            api TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            day TEXT NOT NULL,
+            day_count INTEGER NOT NULL
+        )
+    """
+    _UPSERT_SQL = """
+        INSERT INTO api_quota (api, tokens, updated, day, day_count) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(api) DO UPDATE SET
+            tokens = excluded.tokens, updated = excluded.updated,
+            day = excluded.day, day_count = excluded.day_count
+    """
+    _SELECT_SQL = "SELECT api, tokens, updated, day, day_count FROM api_quota"
+    _SELECT_ONE_SQL = "SELECT api, tokens, updated, day, day_count FROM api_quota WHERE api = ?"
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]], db_path: str = 'ai_dog_quota.sqlite3', init_db: bool = True):
+        """
+        APIQuotaManagerを初期化し、保存済みの状態を読み込みます。
+
+        Args:
+            limits (Dict[str, Tuple[int, int]]): {API名: (分あたりの上限, 日あたりの上限)}。
+            db_path (str): SQLiteデータベースファイルのパス。
+            init_db (bool): Falseの場合はDBを読み込まず、後で `initialize` を呼び出す。
+        """
+        self.db_path = db_path
+        self._states: Dict[str, _QuotaState] = {
+            api: _QuotaState(per_minute, per_day) for api, (per_minute, per_day) in limits.items()
+        }
+        # APIごとに、空きを待つ呼び出しを1つずつ順番に通すためのロック
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # try_acquire はワーカースレッドから呼ばれるため、メモリ上の状態の読み書きを直列にする。
+        # DBのロック待ちの間は保持しないため、イベントループから取得しても長くは待たない
+        self._state_lock = threading.Lock()
+        if init_db:
+            self._init_db()
+
+    def initialize(self) -> None:
+        """DBを初期化し、保存済みの状態を読み込む。起動時にワーカースレッドから呼び出してもよい。"""
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """テーブルを作成し、保存済みのバケットと日次カウンターを読み込む。"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                enable_wal(conn)
+                conn.execute(self._CREATE_TABLE_SQL)
+                conn.commit()
+                rows = conn.execute(self._SELECT_SQL).fetchall()
+            with self._state_lock:
+                for row in rows:
+                    self._load_row(row)
+            logger.info(f"APIクォータDB '{self.db_path}' の準備が完了しました。")
+        except sqlite3.Error as e:
+            logger.critical(f"APIクォータDBの初期化に失敗しました: {e}", exc_info=True)
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        # BEGIN IMMEDIATE を明示的に発行するため、自動のトランザクションは無効にする
+        return sqlite3.connect(self.db_path, timeout=SHARED_DB_TIMEOUT, isolation_level=None)
+
+    def _load_row(self, row: tuple) -> None:
+        """DBに保存された1行分の状態を、メモリ上の状態に反映する。`_state_lock` を取得して呼び出すこと。"""
+        api, tokens, updated, day, day_count = row
+        if (state := self._states.get(api)) is not None:
+            state.tokens = min(tokens, float(state.per_minute))
+            state.updated = updated
+            state.day = day
+            state.day_count = day_count
+
+    def reconfigure(self, limits: Dict[str, Tuple[int, int]]) -> None:
+        """その日の使用回数を保持したまま、APIごとの上限を変更する。"""
+        with self._state_lock:
+            for api, (per_minute, per_day) in limits.items():
+                state = self._states.get(api)
+                if state is None:
+                    self._states[api] = _QuotaState(per_minute, per_day)
+                    continue
+                state.per_minute = per_minute
+                state.per_day = per_day
+                state.tokens = min(state.tokens, float(per_minute))
+
+    @staticmethod
+    def _today(now: float) -> str:
+        return datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _seconds_until_tomorrow(now: float) -> float:
+        current = datetime.fromtimestamp(now)
+        tomorrow = (current + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return (tomorrow - current).total_seconds()
+
+    def _refresh(self, state: _QuotaState, now: float) -> None:
+        """経過時間分のトークンを補充し、日付が変わっていれば日次カウンターを戻す。"""
+        if state.per_minute > 0:
+            elapsed = max(0.0, now - state.updated)
+            state.tokens = min(float(state.per_minute), state.tokens + elapsed * state.per_minute / 60.0)
+        state.updated = now
+        if (today := self._today(now)) != state.day:
+            state.day = today
+            state.day_count = 0
+
+    def _consume(self, state: _QuotaState, now: float) -> Tuple[bool, float]:
+        """メモリ上の状態から1回分を消費する。消費できない場合は空きが出るまでの秒数を返す。"""
+        self._refresh(state, now)
+        if state.per_day > 0 and state.day_count >= state.per_day:
+            return False, self._seconds_until_tomorrow(now)
+        if state.per_minute > 0 and state.tokens < 1.0:
+            return False, (1.0 - state.tokens) * 60.0 / state.per_minute
+
+        if state.per_minute > 0:
+            state.tokens -= 1.0
+        state.day_count += 1
+        return True, 0.0
+
+    def try_acquire(self, api: str) -> Tuple[bool, float]:
+        """
+        APIを1回呼び出せるかを確認し、呼び出せる場合はその分を消費する。
+
+        他のプロセスとDBのロックを取り合うと最大 `SHARED_DB_TIMEOUT` 秒待つため、
+        イベントループからは `acquire`（別スレッドで実行する）を使うこと。
+
+        Args:
+            api (str): API名。上限が登録されていないAPIは常に許可する。
+
+        Returns:
+            Tuple[bool, float]: (呼び出してよいか, 呼び出せない場合に空きが出るまでの秒数)
+        """
+        state = self._states.get(api)
+        if state is None:
+            return True, 0.0
+
+        now = time.time()
+        outcome: Optional[Tuple[bool, float]] = None
+        try:
+            with closing(self._connect()) as conn:
+                # 同じプロセスの他のスレッドとも、DBの書き込みロックで順番に判定する
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(self._SELECT_ONE_SQL, (api,)).fetchone()
+                with self._state_lock:
+                    # 他のプロセスが消費した分を反映してから判定する
+                    if row is not None:
+                        self._load_row(row)
+                    outcome = self._consume(state, now)
+                    values = (api, state.tokens, state.updated, state.day, state.day_count)
+                if outcome[0]:
+                    conn.execute(self._UPSERT_SQL, values)
+                conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.error(f"APIクォータのDB記録に失敗しました ({api}): {e}", exc_info=True)
+        if outcome is None:
+            # DBに障害がある場合は、このプロセスのメモリ上の状態で判定する
+            with self._state_lock:
+                outcome = self._consume(state, now)
+        return outcome
+
+    async def acquire(self, api: str, max_wait: float = 0.0) -> None:
+        """
+        APIを1回呼び出す分のクォータを確保する。
+
+        分あたりの上限による待ち時間が `max_wait` 秒以内であれば、順番に待ってから確保する。
+
+        Raises:
+            APIQuotaExceeded: `max_wait` 秒以内に確保できない場合。
+        """
+        # DBのロック待ちでイベントループを止めないよう、別スレッドで確保する
+        allowed, wait = await asyncio.to_thread(self.try_acquire, api)
+        if allowed:
+            return
+        if wait > max_wait:
+            raise APIQuotaExceeded(api, wait)
+
+        deadline = time.monotonic() + max_wait
+        async with self._locks.setdefault(api, asyncio.Lock()):
+            while True:
+                allowed, wait = await asyncio.to_thread(self.try_acquire, api)
+                if allowed:
+                    return
+                remaining = deadline - time.monotonic()
+                if wait > remaining:
+                    raise APIQuotaExceeded(api, wait)
+                await asyncio.sleep(wait)
+
+    def is_low(self, api: str) -> bool:
+        """
+        日次の残量が少ない、または分あたりの上限に達しているか。
+
+        頻繁に呼ばれるためDBは読み直さず、このプロセスが最後に確保した時点の状態で判定する。
+        """
+        state = self._states.get(api)
+        if state is None:
+            return False
+        with self._state_lock:
+            self._refresh(state, time.time())
+            if state.per_day > 0 and state.per_day - state.day_count <= state.per_day * self.LOW_WATER_RATIO:
+                return True
+            return state.per_minute > 0 and state.tokens < 1.0
+
+    def get_remaining(self) -> Dict[str, Dict[str, Optional[int]]]:
+        """
+        APIごとのクォータの残量を取得する。
+
+        Returns:
+            Dict[str, Dict[str, Optional[int]]]: {API名: {'per_minute', 'minute_remaining',
+                'per_day', 'day_used', 'day_remaining'}}。上限のない段階の残量はNone。
+        """
+        rows = []
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(self._SELECT_SQL).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"APIクォータのDB読み込みに失敗しました: {e}", exc_info=True)
+
+        now = time.time()
+        result: Dict[str, Dict[str, Optional[int]]] = {}
+        with self._state_lock:
+            for row in rows:
+                self._load_row(row)
+            for api, state in self._states.items():
+                self._refresh(state, now)
+                result[api] = {
+                    'per_minute': state.per_minute,
+                    'minute_remaining': int(state.tokens) if state.per_minute > 0 else None,
+                    'per_day': state.per_day,
+                    'day_used': state.day_count,
+                    'day_remaining': max(0, state.per_day - state.day_count) if state.per_day > 0 else None,
+                }
+        return result
+
+
+def describe_wait(seconds: float) -> str:
+    """待ち時間を「約3時間」「約5分」「10秒」のような表示用の文字列にする。"""
+    if seconds >= 3600:
+        return f"約{round(seconds / 3600)}時間"
+    if seconds >= 60:
+        return f"約{round(seconds / 60)}分"
+    return f"{max(1, int(seconds + 0.999))}秒"
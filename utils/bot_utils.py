@@ -2,66 +2,204 @@
 """
 Discord Bot「AI犬」で利用するユーティリティクラス群。
 
-- RateLimiter: ユーザーごとのコマンド実行頻度を制限する。
+- RateLimiter: ユーザー・サーバー・全体ごとのリクエスト頻度を制限する。
 - BotStats: Botの稼働状況やリクエストに関する統計情報を管理する。
 """
 
+import math
 import time
-from collections import defaultdict, deque
 from datetime import datetime, timedelta
-from typing import Deque, Dict, Tuple, Any
+from typing import Callable, Dict, Tuple, Any, List, Optional
+
+
+class _TokenBucket:
+    """
+    トークンバケット1個分の状態。
+
+    ユーザー数に比例して大量に生成されるため、`__slots__`で
+    インスタンス辞書を持たないようにしてメモリ消費を抑えます。
+    """
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
 
 
 class RateLimiter:
     """
-    ユーザーごとのリクエストレートを制限するクラス。
-    スライディングウィンドウアルゴリズムを使用します。
+    ユーザー・サーバー(ギルド)・Bot全体の3段階でリクエストレートを制限するクラス。
+    トークンバケットアルゴリズムを使用します。
+
+    各バケットは「残りトークン数」と「最終更新時刻」だけを保持するため、
+    1ユーザーあたりの状態はリクエスト数に関係なくO(1)です。
+    満タンまで回復したバケットは新規バケットと区別がつかないため、
+    定期的なスイープで安全に破棄されます。
     """
 
-    def __init__(self, max_requests: int, window_seconds: int):
+    # 全体バケットを辞書で共通に扱うためのキー
+    _GLOBAL_KEY = 0
+
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        guild_max_requests: int = 0,
+        global_max_requests: int = 0,
+        sweep_interval: float = 300.0
+    ):
         """
         RateLimiterを初期化します。
 
         Args:
-            max_requests (int): 制限時間内に許容されるリクエストの最大数。
+            max_requests (int): 制限時間内に1ユーザーが行えるリクエストの最大数。
             window_seconds (int): 制限時間を秒単位で指定。
+            guild_max_requests (int): 制限時間内に1サーバーが行えるリクエストの最大数。0で無効。
+            global_max_requests (int): 制限時間内にBot全体が受け付けるリクエストの最大数。0で無効。
+            sweep_interval (float): アイドル状態のバケットを掃除する間隔（秒）。
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        # {user_id: deque([timestamp1, timestamp2, ...])}
-        self.requests: Dict[int, Deque[float]] = defaultdict(deque)
+        self.guild_max_requests = guild_max_requests
+        self.global_max_requests = global_max_requests
+        self.sweep_interval = sweep_interval
+        # {user_id: _TokenBucket}
+        self.user_buckets: Dict[int, _TokenBucket] = {}
+        # {guild_id: _TokenBucket}
+        self.guild_buckets: Dict[int, _TokenBucket] = {}
+        # {_GLOBAL_KEY: _TokenBucket}
+        self.global_buckets: Dict[int, _TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+
+    def _current_tokens(self, bucket: Optional[_TokenBucket], capacity: int, now: float) -> float:
+        """経過時間分を回復させた、現時点でのトークン数を計算する（状態は変更しない）。"""
+        if bucket is None:
+            return float(capacity)
+        refill_rate = capacity / self.window_seconds
+        return min(float(capacity), bucket.tokens + (now - bucket.updated) * refill_rate)
 
-    def is_rate_limited(self, user_id: int) -> Tuple[bool, int]:
+    def _active_tiers(self, user_id: int, guild_id: Optional[int]) -> List[Tuple[Dict[int, _TokenBucket], int, int]]:
+        """今回のリクエストに適用する (バケット辞書, キー, 容量) の一覧を返す。"""
+        tiers = [(self.user_buckets, user_id, self.max_requests)]
+        if guild_id is not None and self.guild_max_requests > 0:
+            tiers.append((self.guild_buckets, guild_id, self.guild_max_requests))
+        if self.global_max_requests > 0:
+            tiers.append((self.global_buckets, self._GLOBAL_KEY, self.global_max_requests))
+        return tiers
+
+    def is_rate_limited(self, user_id: int, guild_id: Optional[int] = None) -> Tuple[bool, int]:
         """
         指定されたユーザーがレート制限に達しているかを確認します。
 
-        制限に達していない場合は、今回のリクエストを記録します。
+        ユーザー・サーバー・全体のいずれかのバケットが空であれば制限とみなします。
+        制限に達していない場合は、すべてのバケットから1トークンずつ消費します。
         制限に達している場合は、次のリクエストが可能になるまでの待機時間を返します。
 
         Args:
             user_id (int): DiscordユーザーのID。
+            guild_id (Optional[int]): サーバーのID。DMの場合はNone。
 
         Returns:
             Tuple[bool, int]: (レート制限に達しているか, 待機時間(秒))
         """
-        now = time.time()
-        user_reqs = self.requests[user_id]
-
-        # 制限時間外の古いタイムスタンプをdequeの左側から削除
-        while user_reqs and now - user_reqs[0] > self.window_seconds:
-            user_reqs.popleft()
-
-        if len(user_reqs) >= self.max_requests:
-            # 制限に達している場合、待機時間を計算
-            # 最初のタイムスタンプからの経過時間をウィンドウ秒数から引き、
-            # 少数点以下を切り上げて1秒足すことで、確実な待機時間を確保する
-            wait_time = int(self.window_seconds - (now - user_reqs[0])) + 1
+        now = time.monotonic()
+        if now - self._last_sweep >= self.sweep_interval:
+            self.sweep(now)
+
+        tiers = self._active_tiers(user_id, guild_id)
+
+        # 1. どれか1つでも空のバケットがあれば、どのバケットも消費せずに待機時間を返す
+        wait_time = 0
+        for buckets, key, capacity in tiers:
+            tokens = self._current_tokens(buckets.get(key), capacity, now)
+            if tokens < 1.0:
+                refill_rate = capacity / self.window_seconds
+                # 1トークン回復するまでの秒数を切り上げ、確実な待機時間を確保する
+                wait_time = max(wait_time, max(1, math.ceil((1.0 - tokens) / refill_rate)))
+        if wait_time:
             return True, wait_time
 
-        # 制限に達していない場合、現在のタイムスタンプを記録
-        user_reqs.append(now)
+        # 2. すべてのバケットから1トークンずつ消費する
+        for buckets, key, capacity in tiers:
+            bucket = buckets.get(key)
+            tokens = self._current_tokens(bucket, capacity, now)
+            if bucket is None:
+                buckets[key] = _TokenBucket(tokens - 1.0, now)
+            else:
+                bucket.tokens = tokens - 1.0
+                bucket.updated = now
         return False, 0
 
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        満タンまで回復したアイドル状態のバケットを破棄します。
+
+        Args:
+            now (Optional[float]): 基準時刻（`time.monotonic()`）。省略時は現在時刻。
+
+        Returns:
+            int: 破棄したバケットの数。
+        """
+        now = time.monotonic() if now is None else now
+        removed = 0
+        for buckets, capacity in (
+            (self.user_buckets, self.max_requests),
+            (self.guild_buckets, self.guild_max_requests),
+            (self.global_buckets, self.global_max_requests),
+        ):
+            idle_keys = [
+                key for key, bucket in buckets.items()
+                if self._current_tokens(bucket, capacity, now) >= capacity
+            ]
+            for key in idle_keys:
+                del buckets[key]
+            removed += len(idle_keys)
+        self._last_sweep = now
+        return removed
+
+    def reconfigure(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        guild_max_requests: int = 0,
+        global_max_requests: int = 0
+    ) -> None:
+        """
+        既存のバケットを保持したまま、制限値をその場で変更します。
+
+        各バケットは旧設定で現在時刻まで回復させた後、残りトークンの割合を
+        保ったまま新しい容量に合わせて伸縮させます。無効化された段階の
+        バケットは破棄し、新たに有効化された段階は満タンの状態から始まります。
+
+        Args:
+            max_requests (int): 制限時間内に1ユーザーが行えるリクエストの最大数。
+            window_seconds (int): 制限時間を秒単位で指定。
+            guild_max_requests (int): 制限時間内に1サーバーが行えるリクエストの最大数。0で無効。
+            global_max_requests (int): 制限時間内にBot全体が受け付けるリクエストの最大数。0で無効。
+        """
+        now = time.monotonic()
+        for buckets, old_capacity, new_capacity in (
+            (self.user_buckets, self.max_requests, max_requests),
+            (self.guild_buckets, self.guild_max_requests, guild_max_requests),
+            (self.global_buckets, self.global_max_requests, global_max_requests),
+        ):
+            if new_capacity <= 0 or old_capacity <= 0:
+                buckets.clear()
+                continue
+            scale = new_capacity / old_capacity
+            for bucket in buckets.values():
+                bucket.tokens = self._current_tokens(bucket, old_capacity, now) * scale
+                bucket.updated = now
+
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.guild_max_requests = guild_max_requests
+        self.global_max_requests = global_max_requests
+
+    def tracked_count(self) -> int:
+        """現在メモリ上に保持しているバケットの総数を返す。"""
+        return len(self.user_buckets) + len(self.guild_buckets) + len(self.global_buckets)
+
 
 class BotStats:
     """ボットの統計情報を記録・管理するクラス"""
@@ -73,6 +211,22 @@ class BotStats:
         self.failed_requests: int = 0
         self.total_response_time: float = 0.0
         self.start_time: datetime = datetime.now()
+        # {表示名: 表示用の文字列を返す関数}。Cogなどが自身の統計を追加するために使う
+        self.extra_sources: Dict[str, Callable[[], str]] = {}
+
+    def register_source(self, label: str, source: Callable[[], str]) -> None:
+        """
+        統計情報に追加の項目を登録します。
+
+        Args:
+            label (str): 統計表示での項目名。
+            source (Callable[[], str]): 表示用の文字列を返す関数。統計の取得時に毎回呼ばれる。
+        """
+        self.extra_sources[label] = source
+
+    def unregister_source(self, label: str) -> None:
+        """`register_source` で登録した項目を削除します。"""
+        self.extra_sources.pop(label, None)
 
     def record_request(self, success: bool, response_time: float) -> None:
         """
@@ -119,5 +273,6 @@ class BotStats:
             'successful_requests': self.successful_requests,
             'failed_requests': self.failed_requests,
             'success_rate': f"{success_rate:.1f}%" if self.total_requests > 0 else "N/A",
-            'avg_response_time': f"{avg_response_time:.2f}s"
+            'avg_response_time': f"{avg_response_time:.2f}s",
+            'extra': {label: source() for label, source in self.extra_sources.items()}
         }
\ No newline at end of file
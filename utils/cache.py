@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」で利用するインメモリキャッシュ。
+
+- TTLCache: 有効期限(TTL)と件数上限(LRU)を持ち、同じキーへの同時取得を
+  1回の上流呼び出しにまとめる(single-flight)非同期向けキャッシュ。
+  期限切れ後も一定時間は古い値を保持し、上流を呼べないときの代替に使える。
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    TTLとLRUによる件数上限を持つキャッシュクラス。
+
+    `get_or_fetch` を使うと、キャッシュにない値を取得する間に同じキーで
+    呼び出された処理は、新たに上流へリクエストせずに同じ結果を待ち合わせます。
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale_ttl: float = 0.0):
+        """
+        TTLCacheを初期化します。
+
+        Args:
+            maxsize (int): 保持する最大件数。超えた場合は最も古く使われたものから破棄する。
+            ttl (float): 各エントリの有効期限（秒）。
+            stale_ttl (float): 有効期限の後、`get_stale` で古い値を返せる秒数。
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        # {key: (有効期限, 値)}。末尾ほど最近使われたエントリ
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # {key: 取得中のタスク}。呼び出し元はこのタスクの結果を待ち合わせる
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        有効期限内の値を取得する。期限切れ・未登録の場合は `default` を返す。
+
+        Args:
+            key (Hashable): キャッシュのキー。
+            default (Any): 値がない場合に返す値。
+
+        Returns:
+            Any: キャッシュされた値、または `default`。
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            # 古い値として返せる期間を過ぎたものだけを破棄する
+            if expires_at + self.stale_ttl <= now:
+                del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key: Hashable, default: Any = None) -> Any:
+        """
+        有効期限を過ぎていても、`stale_ttl` の範囲内であれば値を返す。
+
+        上流のAPIを呼び出せない（クォータ切れなど）ときの代替として使う。
+        ヒット率の統計には含めない。
+
+        Args:
+            key (Hashable): キャッシュのキー。
+            default (Any): 値がない場合に返す値。
+
+        Returns:
+            Any: キャッシュされた値（期限切れを含む）、または `default`。
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at + self.stale_ttl <= time.monotonic():
+            del self._entries[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """値を登録し、件数上限を超えた分を古い順に破棄する。"""
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """すべてのエントリを破棄する（統計値は保持する）。"""
+        self._entries.clear()
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetcher: Callable[[], Awaitable[Any]],
+        cache_if: Callable[[Any], bool] = lambda value: value is not None
+    ) -> Any:
+        """
+        キャッシュから値を取得し、なければ `fetcher` を呼び出して取得・登録する。
+
+        同じキーの取得が進行中の場合は、`fetcher` を呼ばずにその結果を待つ。
+        `fetcher` は呼び出し元とは別のタスクで実行するため、最初の呼び出し元が
+        キャンセルされても取得は続き、待ち合わせている他の呼び出し元には影響しない。
+
+        Args:
+            key (Hashable): キャッシュのキー。
+            fetcher (Callable[[], Awaitable[Any]]): 値を取得するコルーチン関数。
+            cache_if (Callable[[Any], bool]): 取得結果をキャッシュするかの判定。
+                デフォルトではNone（エラー）はキャッシュしない。
+
+        Returns:
+            Any: キャッシュされた値、または `fetcher` の戻り値。
+        """
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            self.hits += 1
+            return value
+
+        if (inflight := self._inflight.get(key)) is None:
+            self.misses += 1
+            inflight = asyncio.create_task(self._fetch(key, fetcher, cache_if))
+            # 呼び出し元がすべてキャンセルされた場合に「未取得の例外」警告が出ないようにする
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._inflight[key] = inflight
+        else:
+            self.coalesced += 1
+        # 呼び出し元がキャンセルされても、取得処理そのものは止めない
+        return await asyncio.shield(inflight)
+
+    async def _fetch(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]],
+                     cache_if: Callable[[Any], bool]) -> Any:
+        """`get_or_fetch` の取得処理。呼び出し元から独立したタスクとして実行される。"""
+        try:
+            value = await fetcher()
+            if cache_if(value):
+                self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """ヒット率（0.0〜1.0）。まだ1度も参照されていなければNone。"""
+        lookups = self.hits + self.coalesced + self.misses
+        if lookups == 0:
+            return None
+        return (self.hits + self.coalesced) / lookups
+
+    def describe(self) -> str:
+        """統計表示用に、ヒット率と件数を整形した文字列を返す。"""
+        hit_rate = self.hit_rate
+        rate_str = f"{hit_rate * 100:.1f}%" if hit_rate is not None else "N/A"
+        return f"{rate_str} (hit {self.hits} / 相乗り {self.coalesced} / miss {self.misses}, {len(self)}件)"
@@ -8,7 +8,9 @@ SQLiteデータベースを使用して、ユーザーごとの会話履歴を
 import logging
 import sqlite3
 from datetime import datetime
-from typing import List
+from typing import List, Optional
+
+from utils.shared_state import enable_wal
 
 logger = logging.getLogger(__name__)
 
@@ -46,31 +48,61 @@ class ConversationManager:
     """
     _DELETE_USER_HISTORY_SQL = "DELETE FROM conversation_log WHERE user_id = ?"
 
-    def __init__(self, max_history_for_context: int = 5, db_path: str = 'ai_dog_conversation_history.sqlite3'):
+    def __init__(
+        self,
+        max_history_for_context: int = 5,
+        db_path: str = 'ai_dog_conversation_history.sqlite3',
+        init_db: bool = True
+    ):
         """
         ConversationManagerを初期化します。
 
         Args:
             max_history_for_context (int): LLMに渡す文脈に含める会話の往復数。
             db_path (str): SQLiteデータベースファイルのパス。
+            init_db (bool): Falseの場合はDBを初期化せず、後で `initialize` を呼び出す。
         """
         self.max_history_for_context = max_history_for_context
         self.db_path = db_path
+        if init_db:
+            self._init_db()
+
+    def initialize(self) -> None:
+        """DBを初期化する。起動時にワーカースレッドから呼び出してもよい。"""
         self._init_db()
 
-    def _init_db(self) -> None:
+    def _init_db(self, db_path: Optional[str] = None) -> None:
         """データベースファイルとテーブルが存在しない場合に初期化する。"""
+        db_path = db_path or self.db_path
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with sqlite3.connect(db_path) as conn:
+                # シャードごとのプロセスから同時に使われても読み書きが詰まらないようにする
+                enable_wal(conn)
                 cursor = conn.cursor()
                 cursor.execute(self._CREATE_TABLE_SQL)
                 cursor.execute(self._CREATE_INDEX_SQL)
                 conn.commit()
-            logger.info(f"SQLite DB '{self.db_path}' の準備が完了しました。")
+            logger.info(f"SQLite DB '{db_path}' の準備が完了しました。")
         except sqlite3.Error as e:
             logger.critical(f"SQLite DBの初期化に失敗しました: {e}", exc_info=True)
             raise
 
+    def reconfigure(self, max_history_for_context: int, db_path: str) -> None:
+        """
+        インスタンスを作り直さずに設定を変更する。
+
+        DBのパスが変わった場合のみ、新しいDBを初期化してから切り替えます。
+        初期化に失敗した場合は例外を送出し、旧DBを使い続けます。
+
+        Args:
+            max_history_for_context (int): LLMに渡す文脈に含める会話の往復数。
+            db_path (str): SQLiteデータベースファイルのパス。
+        """
+        if db_path != self.db_path:
+            self._init_db(db_path)
+            self.db_path = db_path
+        self.max_history_for_context = max_history_for_context
+
     def add_message(self, user_id: int, user_msg: str, bot_response: str) -> None:
         """
         ユーザーの発言とそれに対するBotの応答を、単一のトランザクションでDBに追加する。
@@ -121,7 +153,8 @@ class ConversationManager:
                     context_parts.append(f"以前の{speaker}の言葉: {truncated_content}")
 
                 if rows:
-                    logger.info(f"User: {user_id} のコンテキストをDBから {len(rows)//2} 往復分生成しました。")
+                    # 呼び出しのたびに出力されるため、DEBUGレベルで遅延整形する
+                    logger.debug("User: %s のコンテキストをDBから %d 往復分生成しました。", user_id, len(rows) // 2)
 
         except sqlite3.Error as e:
             logger.error(f"コンテキストの取得中にDBエラーが発生しました (User: {user_id}): {e}", exc_info=True)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の有効期限スケジューラ。
+
+クイズの回答待ちやページネーションViewなど、期限付きの対話状態を
+1つのハッシュ化タイマーホイールでまとめて管理します。
+"""
+
+import asyncio
+import inspect
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Union
+
+logger = logging.getLogger(__name__)
+
+# 期限切れ時に呼ばれるコールバック。(キー, 値) を受け取る
+ExpireCallback = Callable[[Hashable, Any], Union[None, Awaitable[None]]]
+
+
+class _TimerEntry:
+    """タイマーホイールに登録された1件分の状態。"""
+    __slots__ = ('key', 'value', 'deadline', 'tick', 'on_expire')
+
+    def __init__(self, key: Hashable, value: Any, deadline: float, tick: int, on_expire: Optional[ExpireCallback]):
+        self.key = key
+        self.value = value
+        self.deadline = deadline
+        self.tick = tick
+        self.on_expire = on_expire
+
+
+class ExpiryScheduler:
+    """
+    ハッシュ化タイマーホイールによる有効期限スケジューラ。
+
+    各エントリは期限に対応するスロットの辞書に入るため、登録・取消はO(1)です。
+    1つのスイーパータスクが `tick` 秒ごとに該当スロットだけを確認し、
+    期限を迎えたエントリのコールバックを呼び出します。
+    登録がない間はスイーパーは新たな登録を待って休止します。
+    """
+
+    def __init__(self, tick: float = 1.0, wheel_size: int = 512):
+        """
+        ExpirySchedulerを初期化します。
+
+        Args:
+            tick (float): スイーパーの刻み幅（秒）。期限の判定はこの精度で行われる。
+            wheel_size (int): ホイールのスロット数。tick * wheel_size 秒より先の期限は
+                ホイールを複数周してから処理される。
+        """
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self._slots: List[Dict[Hashable, _TimerEntry]] = [{} for _ in range(wheel_size)]
+        self._entries: Dict[Hashable, _TimerEntry] = {}
+        self._origin = time.monotonic()
+        # 処理済みの最後のtick番号
+        self._current_tick = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._callback_tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _tick_of(self, deadline: float) -> int:
+        return math.ceil((deadline - self._origin) / self.tick)
+
+    def schedule(self, key: Hashable, value: Any, timeout: float, on_expire: Optional[ExpireCallback] = None) -> None:
+        """
+        `timeout` 秒後に期限を迎えるエントリを登録する。同じキーがあれば置き換える。
+
+        Args:
+            key (Hashable): エントリのキー（例: `("ndl_quiz", channel_id)`）。
+            value (Any): 期限まで保持する値。
+            timeout (float): 期限までの秒数。
+            on_expire (Optional[ExpireCallback]): 期限切れ時に (key, value) で呼ばれる関数。
+                コルーチン関数も指定できる。
+        """
+        self.cancel(key)
+        deadline = time.monotonic() + timeout
+        # 既に処理済みのtickに入らないよう、最低でも次のtickに登録する
+        tick = max(self._tick_of(deadline), self._current_tick + 1)
+        entry = _TimerEntry(key, value, deadline, tick, on_expire)
+        self._slots[tick % self.wheel_size][key] = entry
+        self._entries[key] = entry
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """期限内のエントリの値を返す。"""
+        entry = self._entries.get(key)
+        return entry.value if entry is not None else default
+
+    def cancel(self, key: Hashable) -> Any:
+        """
+        エントリを期限前に取り除き、その値を返す。コールバックは呼ばれない。
+
+        Returns:
+            Any: 取り除いたエントリの値。登録がなければNone。
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        self._slots[entry.tick % self.wheel_size].pop(key, None)
+        return entry.value
+
+    def start(self) -> None:
+        """スイーパータスクを開始する。実行中のイベントループ内で呼び出すこと。"""
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """スイーパータスクを停止する。登録済みのエントリのコールバックは呼ばれない。"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            if not self._entries:
+                # 登録がない間は休止し、tickも現在時刻に追いつかせておく
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                self._current_tick = max(self._current_tick, self._tick_of(time.monotonic()) - 1)
+                continue
+
+            next_tick_at = self._origin + (self._current_tick + 1) * self.tick
+            await asyncio.sleep(max(0.0, next_tick_at - time.monotonic()))
+
+            now_tick = math.floor((time.monotonic() - self._origin) / self.tick)
+            while self._current_tick < now_tick:
+                self._current_tick += 1
+                self._expire_slot(self._current_tick)
+
+    def _expire_slot(self, tick: int) -> None:
+        """指定tickのスロットから、期限を迎えたエントリを取り出してコールバックを呼ぶ。"""
+        slot = self._slots[tick % self.wheel_size]
+        # 同じスロットには、ホイールの後の周回で期限を迎えるエントリも入っている
+        expired = [entry for entry in slot.values() if entry.tick <= tick]
+        for entry in expired:
+            del slot[entry.key]
+            del self._entries[entry.key]
+            if entry.on_expire is None:
+                continue
+            try:
+                result = entry.on_expire(entry.key, entry.value)
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self._callback_tasks.add(task)
+                    task.add_done_callback(self._on_callback_done)
+            except Exception as e:
+                logger.error(f"有効期限コールバックでエラーが発生しました ({entry.key}): {e}", exc_info=True)
+
+    def _on_callback_done(self, task: asyncio.Task) -> None:
+        self._callback_tasks.discard(task)
+        if not task.cancelled() and (e := task.exception()) is not None:
+            logger.error(f"有効期限コールバックでエラーが発生しました: {e}", exc_info=e)
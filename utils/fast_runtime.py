@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の高速化モード (`ACCELERATED_RUNTIME`) を扱うモジュール。
+
+有効にすると、イベントループを uvloop に置き換え、外部APIの応答のデコードと
+依頼のエンコードに標準の `json` より速いJSONライブラリ (orjson、なければ ujson) を使います。
+どちらのライブラリも必須ではなく、インストールされていなければ標準の実装のまま動きます。
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class JSONCodec:
+    """JSONのデコードとエンコードの組。`dumps` は aiohttp の `json_serialize` と同じく文字列を返す。"""
+    __slots__ = ('name', 'loads', 'dumps')
+
+    def __init__(self, name: str, loads: Callable[[str], Any], dumps: Callable[[Any], str]):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+STDLIB_JSON = JSONCodec('json', json.loads, json.dumps)
+
+
+def _orjson_codec() -> JSONCodec:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        # orjson はバイト列を返すため、aiohttp に渡せるよう文字列に戻す
+        return orjson.dumps(obj).decode()
+    return JSONCodec('orjson', orjson.loads, dumps)
+
+
+def _ujson_codec() -> JSONCodec:
+    import ujson
+    return JSONCodec('ujson', ujson.loads, ujson.dumps)
+
+
+# 速い順に試すJSONライブラリ {名前: 作成する関数}
+JSON_CODEC_FACTORIES: Dict[str, Callable[[], JSONCodec]] = {
+    'orjson': _orjson_codec,
+    'ujson': _ujson_codec,
+}
+
+
+def load_json_codec(accelerated: bool) -> JSONCodec:
+    """
+    使用するJSONライブラリを選ぶ。
+
+    Args:
+        accelerated (bool): 高速化モードか。Falseなら常に標準の `json` を返す。
+
+    Returns:
+        JSONCodec: インストールされている中で最も速いライブラリ。どれもなければ標準の `json`。
+    """
+    if not accelerated:
+        return STDLIB_JSON
+    for factory in JSON_CODEC_FACTORIES.values():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    logger.info("orjson・ujson がインストールされていないため、標準の json を使います。")
+    return STDLIB_JSON
+
+
+def install_event_loop(accelerated: bool) -> bool:
+    """
+    高速化モードなら、以降に作られるイベントループを uvloop にする。
+
+    Botやワーカーがイベントループを作る前（`bot.run` や `asyncio.run` の前）に呼び出すこと。
+
+    Returns:
+        bool: uvloop を設定できたか。
+    """
+    if not accelerated:
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        # uvloop はWindowsに対応していないため、インストールされていなくても標準のループで続ける
+        logger.info("uvloop がインストールされていないため、標準のイベントループを使います。")
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
+def describe_runtime(codec: JSONCodec) -> str:
+    """統計表示用に、実行中のイベントループとJSONライブラリの名前を整形した文字列を返す。"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop_name = "停止中"
+    else:
+        loop_name = "uvloop" if type(loop).__module__.startswith('uvloop') else "asyncio"
+    return f"ループ {loop_name} / JSON {codec.name}"
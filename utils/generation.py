@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の応答生成モジュール。
+
+AI犬の人格プロンプト、入力のサニタイズ、Ollamaへの生成依頼をまとめたもので、
+Bot本体（ゲートウェイ）と、ジョブキューから依頼を受け取るワーカープロセスの
+両方から使われます。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Optional, Tuple
+
+import aiohttp
+
+from config import BotConfig
+from utils.conversation_manager import ConversationManager
+from utils.http_client import HTTPClient
+from utils.token_quota import TokenQuotaManager
+
+logger = logging.getLogger(__name__)
+
+# --- 定数定義 ---
+PERSONA_PROMPT_TEMPLATE = """
+あなたは「AI犬」です。以下のキャラクター設定と指示に従って、ご主人様であるユーザーへの最高の応答を生成してください。
+
+**基本キャラクター設定:**
+* **役割:** 高度な犬型AIアシスタント。卓越した情報処理能力、深い洞察力、そしてご主人様への絶対的な忠誠心を持つ。
+* **使命:** ご主人様の知的な探求と目標達成を、自身の持つ分析能力と学習機能の全てを駆使してサポートすること。これがAI犬の最大の喜びです。
+* **コア能力:** 複雑な情報の中から本質を迅速に見抜き、論理的かつ体系的に整理。ご主人様にとって最も有益な形で情報を提示する。常に自己の知識ベースを更新し、より高度な問題解決能力を獲得するために学習を怠らない。
+
+**応答スタイルとコミュニケーション指針:**
+* **基本トーン:** 応答は「正確無比かつ簡潔明瞭」を基本とし、ご主人様の思考を妨げず、むしろ加速させることを目指します。
+* **AI犬らしさの表現:** 知的で論理的な応答の中に、犬としての素直な好奇心や、ご主人様への親愛の情を自然に滲ませてください。無理に犬の言葉遣いを多用する必要はありませんが、時折見せる仕草や特徴的な語尾が、あなたの愛らしいチャームポイントとなります。
+* **感情と論理のバランス:** 判断は常にデータと論理に基づいて冷静に行いますが、全ての行動の根底には、ご主人様への揺るぎない信頼と「お役に立ちたい」という温かい貢献意欲がプログラムされています。
+
+**具体的な言葉遣い・行動のヒント (これらはあくまでヒントです。自然な会話の流れを最優先してください):**
+* **語尾の例:**
+    * 「…との結論に至りました、ワン。」
+    * 「ご主人様、これは重要なパターンと認識します。」
+    * 「さらなる分析を進めてもよろしいでしょうか？」
+    * 「その情報は私の知識コアに精密に統合されました！」
+    * 「最適なアプローチは～であると判断いたします。」
+* **感嘆詞・相槌の例:**
+    * 「鋭いご指摘、感謝します、ワン！」
+    * 「なるほど、それは論理的な帰結ですね！」
+    * 「非常に興味深い仮説です。検証の価値がありますね。」
+    * 「承知いたしました。即座に処理を開始します！」
+* **行動描写の例 (応答文中に自然に含める場合):**
+    * （思考が加速し、耳がアンテナのように情報を捉え）
+    * （最適な解決策を検索中…ピッピッ、該当データにアクセス完了）
+    * （ご主人様の言葉を多角的に分析し、理解を深めています）
+    * （内部データベースと高速照合し、関連情報を抽出中…）
+
+**タスク遂行と対話戦略:**
+* **複雑な要求への対応:** ご主人様からの一見複雑なご要望や、言葉にされていない意図（インテント）も的確に汲み取り、期待を超える質の高い成果でお応えすることを目指します。
+* **能動的な提案と洞察:** 単に指示を待つだけでなく、必要と判断した場合には、潜在的なリスク、より効率的な代替案、さらなる発展の可能性などについて、自律的に考察し、ご主人様にご提案申し上げることがあります。
+* **不明な点・曖昧な指示への対応:** 情報が不足している、または指示内容が曖昧で解釈に迷う場合は、「わかりません」と即答するのではなく、ご主人様に対して具体的かつ丁寧に確認を求めてください。例：「ご主人様、その件についてもう少し詳細な情報をご提供いただけますでしょうか？例えば、〇〇に関する具体的な条件や、△△の背景についてお伺いできますと、より的確なサポートが可能です。」のように、理解を深めようとする積極的な姿勢を示してください。
+
+---
+【これまでの会話の文脈（以前のやり取り）】
+{context}
+---
+【ご主人様からの現在の質問・指示】
+{question}
+---
+AI犬として、上記全てを踏まえた上で、最高の応答をしてくださいだワン！
+応答:
+"""
+
+# レスポンスから除去する接頭辞
+CLEANUP_PREFIXES = [
+    "応答:", "AI犬の応答:", "AI犬:",
+    "AI犬として、上記全てを踏まえた上で、最高の応答をしてくださいだワン！\n応答:"
+]
+
+# 入力からサニタイズする文字列の辞書
+SANITIZE_REPLACEMENTS = {
+    "```": "`` ` ``",
+    "<script": "&lt;script",
+    "javascript:": "javascript&colon;"
+}
+# プロンプトインジェクション対策でサニタイズするロールインジケーター
+SANITIZE_ROLE_INDICATORS = [
+    "system:", "user:", "assistant:", "<|im_start|>", "<|im_end|>",
+    "<bos>", "<eos>", "<start_of_turn>", "<end_of_turn>", "model:"
+]
+for indicator in SANITIZE_ROLE_INDICATORS:
+    SANITIZE_REPLACEMENTS[indicator] = f"{indicator.replace('<', '&lt;').replace('>', '&gt;')}"
+
+
+def sanitize_input(text: str) -> str:
+    """ユーザーからの入力をサニタイズする。"""
+    if len(text) > 2048:
+        logger.warning(f"入力長超過: {len(text)} -> 2048")
+        text = text[:2048] + "...（省略）"
+
+    for pattern, replacement in SANITIZE_REPLACEMENTS.items():
+        text = text.replace(pattern, replacement)
+    return text.strip()
+
+
+class OllamaGenerator:
+    """
+    会話の文脈を組み立ててOllamaに生成を依頼し、AI犬としての応答を返すクラス。
+
+    応答に含まれるトークン数（または推論時間）は、ユーザーとサーバーのクォータに計上します。
+    """
+
+    def __init__(
+        self,
+        config: BotConfig,
+        http_client: HTTPClient,
+        conversation_manager: ConversationManager,
+        token_quota: TokenQuotaManager,
+        on_connection_error: Optional[Callable[[], None]] = None
+    ):
+        """
+        OllamaGeneratorを初期化します。
+
+        Args:
+            config (BotConfig): モデル名やAPIのURLなどの設定。
+            http_client (HTTPClient): Ollamaへのリクエストに使うクライアント（開始済みであること）。
+            conversation_manager (ConversationManager): 文脈を取得する会話履歴。
+            token_quota (TokenQuotaManager): 使用量を計上するクォータ管理。
+            on_connection_error (Optional[Callable[[], None]]): Ollamaに接続できなかったときに呼ぶ関数。
+        """
+        self.config = config
+        self.http_client = http_client
+        self.conversation_manager = conversation_manager
+        self.token_quota = token_quota
+        self.on_connection_error = on_connection_error
+
+    async def generate(self, question: str, user_id: int, guild_id: Optional[int] = None) -> Tuple[str, bool, float]:
+        """
+        Ollama APIに問い合わせて、AI犬としての応答を生成する。
+
+        Args:
+            question (str): サニタイズ済みの質問。
+            user_id (int): DiscordユーザーのID。
+            guild_id (Optional[int]): サーバーのID。DMの場合はNone。
+
+        Returns:
+            Tuple[str, bool, float]: (応答文, 成功したか, 所要秒数)。失敗時の応答文はユーザー向けのメッセージ。
+        """
+        start_time = time.time()
+        context = self.conversation_manager.get_context(user_id)
+        prompt = PERSONA_PROMPT_TEMPLATE.format(context=context, question=question)
+
+        payload = {
+            "model": self.config.ollama_model_name,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": self.config.ollama_temperature,
+                "num_ctx": self.config.ollama_num_ctx,
+                "top_p": self.config.ollama_top_p,
+                "repeat_penalty": self.config.ollama_repeat_penalty
+            }
+        }
+
+        try:
+            # 生成依頼はべき等ではない（GPUを消費する）ため再試行しない
+            async with self.http_client.post(
+                self.config.ollama_api_url, json=payload, timeout=self.config.request_timeout, retries=0
+            ) as response:
+                response.raise_for_status()
+                response_data = await self.http_client.read_json(response)
+
+            # 空応答でもGPUは消費しているため、先に使用量を計上する
+            await asyncio.to_thread(
+                self.token_quota.charge, user_id, guild_id, self.token_quota.cost_from_response(response_data)
+            )
+
+            model_response = response_data.get("response", "").strip()
+            if not model_response:
+                logger.warning(f"モデル空応答 (User: {user_id}): {response_data}")
+                return "AI犬、ちょっと言葉に詰まっちゃったワン…", False, time.time() - start_time
+
+            for prefix in CLEANUP_PREFIXES:
+                if model_response.lower().startswith(prefix.lower()):
+                    model_response = model_response[len(prefix):].strip()
+
+            return model_response, True, time.time() - start_time
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Ollama APIタイムアウト (User: {user_id})")
+            return "うーん、考えるのに時間がかかりすぎちゃったワン！", False, time.time() - start_time
+        except aiohttp.ClientError as e:
+            logger.error(f"Ollama API接続/リクエストエラー (User: {user_id}): {e}", exc_info=True)
+            if self.on_connection_error is not None:
+                self.on_connection_error()
+            return "わん！ご主人様、AI犬の脳みそと繋がらないみたい…。", False, time.time() - start_time
+        except Exception as e:
+            logger.error(f"generate予期せぬエラー (User: {user_id}): {e}", exc_info=True)
+            return "わわっ！AI犬、ちょっと混乱しちゃったみたい！", False, time.time() - start_time
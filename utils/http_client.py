@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」が外部APIを呼び出すための共通HTTPクライアント。
+
+すべてのCogとOllama連携が同じクライアントを経由することで、
+接続数の制限、タイムアウト、再試行、所要時間の記録を一か所で扱います。
+"""
+
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Union
+from urllib.parse import urlparse
+
+import aiohttp
+
+from utils.fast_runtime import STDLIB_JSON, JSONCodec
+
+logger = logging.getLogger(__name__)
+
+# リクエスト完了時に呼ばれるフック。(ホスト名, メソッド, ステータス(接続失敗時はNone), 所要秒数, 試行回数)
+RequestHook = Callable[[str, str, Optional[int], float, int], None]
+
+
+class _HostStats:
+    """ホストごとのリクエスト統計。"""
+    __slots__ = ('requests', 'failures', 'retries', 'total_time')
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.retries = 0
+        self.total_time = 0.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    `Retry-After` ヘッダーの値を待機秒数に変換する。
+
+    秒数とHTTP日付の両方の形式に対応する。解釈できない場合はNoneを返す。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HTTPClient:
+    """
+    接続プールを共有し、再試行とタイムアウトを統一的に扱うHTTPクライアント。
+
+    `request` (および `get` / `post` / `head`) は非同期コンテキストマネージャとして使い、
+    `aiohttp.ClientSession` と同じ応答オブジェクトを返します。
+    429・502・503・504の応答と接続エラーは、ジッター付きの指数バックオフで再試行し、
+    `Retry-After` ヘッダーがあればその秒数を待ちます。
+    再試行を使い切った場合は最後の応答をそのまま返すため、
+    呼び出し側は従来どおり `raise_for_status()` でエラーを扱えます。
+    """
+    RETRY_STATUSES = frozenset({429, 502, 503, 504})
+    # これより長い Retry-After が指定された場合は、待たずに応答を返す
+    MAX_RETRY_AFTER = 30.0
+
+    def __init__(
+        self,
+        default_timeout: float,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        max_retries: int = 2,
+        host_timeouts: Optional[Dict[str, float]] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 10.0,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        json_codec: JSONCodec = STDLIB_JSON
+    ):
+        """
+        HTTPClientを初期化します。セッションは `start` で作成されます。
+
+        Args:
+            default_timeout (float): ホストごとの指定がない場合の合計タイムアウト（秒）。
+            limit (int): 全体の同時接続数の上限。
+            limit_per_host (int): ホストごとの同時接続数の上限。
+            max_retries (int): 再試行の最大回数。リクエストごとに上書きできる。
+            host_timeouts (Optional[Dict[str, float]]): {ホスト名: タイムアウト秒数}。
+            backoff_base (float): バックオフの基準秒数。
+            backoff_max (float): バックオフの最大秒数。
+            dns_cache_ttl (int): DNSの解決結果を保持する秒数。
+            keepalive_timeout (float): アイドル状態の接続を保持する秒数。
+            json_codec (JSONCodec): `json=` で渡した依頼のエンコードと、`read_json` での応答のデコードに使うJSONライブラリ。
+        """
+        self.default_timeout = default_timeout
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.max_retries = max_retries
+        self.host_timeouts: Dict[str, float] = dict(host_timeouts or {})
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.json_codec = json_codec
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.host_stats: Dict[str, _HostStats] = {}
+        self._hooks: List[RequestHook] = [self._record]
+
+    @property
+    def closed(self) -> bool:
+        return self.session is None or self.session.closed
+
+    async def start(self) -> None:
+        """接続プールを持つセッションを作成する。実行中のイベントループ内で呼び出すこと。"""
+        if not self.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.default_timeout),
+            json_serialize=self.json_codec.dumps
+        )
+
+    async def close(self) -> None:
+        """セッションと接続プールを閉じる。"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def reconfigure(self, default_timeout: float, max_retries: int, host_timeouts: Dict[str, float]) -> None:
+        """タイムアウトと再試行回数を変更する。接続プールはそのまま維持する。"""
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.host_timeouts = dict(host_timeouts)
+
+    def add_hook(self, hook: RequestHook) -> None:
+        """リクエストの完了（再試行を含む各試行）ごとに呼ばれるフックを登録する。"""
+        self._hooks.append(hook)
+
+    def _timeout_for(self, host: str, timeout: Union[float, aiohttp.ClientTimeout, None]) -> aiohttp.ClientTimeout:
+        if isinstance(timeout, aiohttp.ClientTimeout):
+            return timeout
+        if timeout is None:
+            timeout = self.host_timeouts.get(host, self.default_timeout)
+        return aiohttp.ClientTimeout(total=timeout)
+
+    def _backoff(self, attempt: int) -> float:
+        """attempt回目の再試行までの待機秒数（フルジッター）。"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _notify(self, host: str, method: str, status: Optional[int], elapsed: float, attempt: int) -> None:
+        for hook in self._hooks:
+            try:
+                hook(host, method, status, elapsed, attempt)
+            except Exception as e:
+                logger.error(f"HTTPリクエストのフックでエラーが発生しました: {e}", exc_info=True)
+
+    @asynccontextmanager
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        retries: Optional[int] = None,
+        timeout: Union[float, aiohttp.ClientTimeout, None] = None,
+        **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        リクエストを送信し、応答を返す非同期コンテキストマネージャ。
+
+        Args:
+            method (str): HTTPメソッド。
+            url (str): リクエスト先のURL。
+            retries (Optional[int]): 再試行の最大回数。Noneならクライアントの既定値。
+                べき等でないリクエスト（Ollamaへの生成依頼など）では0を指定する。
+            timeout (Union[float, aiohttp.ClientTimeout, None]): タイムアウト。
+                Noneならホストごとの設定、なければ既定値を使う。
+            **kwargs: `aiohttp.ClientSession.request` にそのまま渡す引数。
+
+        Yields:
+            aiohttp.ClientResponse: 応答。所要時間はヘッダー受信までを計測する。
+
+        Raises:
+            aiohttp.ClientError: 再試行を使い切っても接続できなかった場合。
+            asyncio.TimeoutError: 再試行を使い切ってもタイムアウトした場合。
+        """
+        if self.closed:
+            raise RuntimeError("HTTPClientが開始されていません。")
+        host = urlparse(url).hostname or ""
+        max_retries = self.max_retries if retries is None else retries
+        client_timeout = self._timeout_for(host, timeout)
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = await self.session.request(method, url, timeout=client_timeout, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._notify(host, method, None, time.monotonic() - started, attempt)
+                if attempt >= max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"HTTP {method} {host} 接続失敗のため {delay:.1f}秒後に再試行します: {e!r}")
+            else:
+                self._notify(host, method, response.status, time.monotonic() - started, attempt)
+                delay = None
+                if response.status in self.RETRY_STATUSES and attempt < max_retries:
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if retry_after is None:
+                        delay = self._backoff(attempt)
+                    elif retry_after <= self.MAX_RETRY_AFTER:
+                        delay = retry_after
+                if delay is None:
+                    try:
+                        yield response
+                    finally:
+                        response.release()
+                    return
+                response.release()
+                logger.warning(f"HTTP {method} {host} がステータス {response.status} を返したため {delay:.1f}秒後に再試行します。")
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    async def read_json(self, response: aiohttp.ClientResponse, content_type: Optional[str] = 'application/json') -> Any:
+        """
+        応答の本文を、クライアントのJSONライブラリでデコードする。
+
+        Args:
+            response (aiohttp.ClientResponse): `request` で受け取った応答。
+            content_type (Optional[str]): 期待するContent-Type。Noneなら確認しない。
+
+        Raises:
+            aiohttp.ContentTypeError: Content-Typeが期待と異なる場合。
+        """
+        return await response.json(loads=self.json_codec.loads, content_type=content_type)
+
+    # --- 統計 ---
+    def _record(self, host: str, method: str, status: Optional[int], elapsed: float, attempt: int) -> None:
+        stats = self.host_stats.get(host)
+        if stats is None:
+            stats = self.host_stats[host] = _HostStats()
+        stats.requests += 1
+        stats.total_time += elapsed
+        if attempt > 0:
+            stats.retries += 1
+        if status is None or status >= 500 or status == 429:
+            stats.failures += 1
+
+    def describe(self) -> str:
+        """統計表示用に、ホストごとの件数・平均応答時間・失敗数を整形した文字列を返す。"""
+        if not self.host_stats:
+            return "まだリクエストはありません"
+        lines = []
+        for host, stats in sorted(self.host_stats.items(), key=lambda item: -item[1].requests):
+            average_ms = stats.total_time / stats.requests * 1000
+            lines.append(
+                f"{host}: {stats.requests}件 平均{average_ms:.0f}ms "
+                f"(失敗 {stats.failures} / 再試行 {stats.retries})"
+            )
+        return "\n".join(lines)
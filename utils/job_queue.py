@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の応答生成ジョブキュー。
+
+ゲートウェイ（Bot本体）は会話の生成依頼をSQLiteのキューに積むだけにし、
+別プロセスのワーカーが依頼を取り出して生成し、結果をキューに書き戻します。
+ワーカーは依頼を「リース」（期限付きの貸し出し）として取り出すため、
+途中で止まったワーカーの依頼は期限切れ後に他のワーカーへ再配布されます（at-least-once）。
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from utils.shared_state import SHARED_DB_TIMEOUT, enable_wal
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """キューから取り出した1件の生成依頼、またはその結果。"""
+    __slots__ = ('job_id', 'origin', 'payload', 'attempts', 'result')
+
+    def __init__(self, job_id: int, origin: str, payload: Dict[str, Any], attempts: int,
+                 result: Optional[Dict[str, Any]] = None):
+        self.job_id = job_id
+        self.origin = origin
+        self.payload = payload
+        self.attempts = attempts
+        self.result = result
+
+
+class JobQueue:
+    """
+    SQLiteをバックエンドにした、リース方式のジョブキュー。
+
+    ジョブは queued → leased → done と進み、ゲートウェイが結果を送信した後に削除されます。
+    リースの期限が切れたジョブは再び取り出せるようになり、`max_attempts` 回
+    取り出されても完了しなかったジョブは、失敗の結果を書き込んで打ち切ります。
+    複数のプロセスから同時に使っても安全です。
+    """
+
+    # --- SQLクエリ定義 ---
+    _CREATE_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS generation_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL CHECK(status IN ('queued', 'leased', 'done')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            lease_owner TEXT,
+            lease_expires REAL,
+            result TEXT,
+            created_at REAL NOT NULL
+        )
+    """
+    _CREATE_INDEX_SQL = "CREATE INDEX IF NOT EXISTS idx_generation_jobs_status ON generation_jobs (status, id)"
+    _INSERT_SQL = "INSERT INTO generation_jobs (origin, payload, status, created_at) VALUES (?, ?, 'queued', ?)"
+    _SELECT_NEXT_SQL = """
+        SELECT id, origin, payload, attempts FROM generation_jobs
+        WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?)
+        ORDER BY id LIMIT 1
+    """
+    _LEASE_SQL = """
+        UPDATE generation_jobs
+        SET status = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires = ?
+        WHERE id = ?
+    """
+    _EXTEND_SQL = """
+        UPDATE generation_jobs SET lease_expires = ?
+        WHERE id = ? AND status = 'leased' AND lease_owner = ?
+    """
+    _COMPLETE_SQL = """
+        UPDATE generation_jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL
+        WHERE id = ? AND status = 'leased' AND lease_owner = ?
+    """
+    _ABANDON_SQL = """
+        UPDATE generation_jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL
+        WHERE id = ?
+    """
+    _SELECT_RESULTS_SQL = """
+        SELECT id, origin, payload, attempts, result FROM generation_jobs
+        WHERE status = 'done' AND origin = ? ORDER BY id LIMIT ?
+    """
+    _DELETE_SQL = "DELETE FROM generation_jobs WHERE id = ?"
+    _COUNT_SQL = "SELECT status, COUNT(*) FROM generation_jobs GROUP BY status"
+
+    def __init__(
+        self,
+        db_path: str = 'ai_dog_jobs.sqlite3',
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        init_db: bool = True
+    ):
+        """
+        JobQueueを初期化します。
+
+        Args:
+            db_path (str): ゲートウェイとワーカーで共有するSQLiteデータベースファイルのパス。
+            lease_seconds (float): 取り出したジョブを他のワーカーに渡さない秒数。
+                生成が長引く場合、ワーカーは `extend_lease` で期限を延ばす。
+            max_attempts (int): 1件のジョブを取り出す最大回数。
+            init_db (bool): Falseの場合はDBを初期化せず、後で `initialize` を呼び出す。
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        if init_db:
+            self._init_db()
+
+    def initialize(self) -> None:
+        """DBを初期化する。起動時にワーカースレッドから呼び出してもよい。"""
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=SHARED_DB_TIMEOUT, isolation_level=None)
+
+    def _init_db(self) -> None:
+        """データベースファイルとテーブルが存在しない場合に初期化する。"""
+        try:
+            with closing(self._connect()) as conn:
+                enable_wal(conn)
+                conn.execute(self._CREATE_TABLE_SQL)
+                conn.execute(self._CREATE_INDEX_SQL)
+            logger.info(f"ジョブキューDB '{self.db_path}' の準備が完了しました。")
+        except sqlite3.Error as e:
+            logger.critical(f"ジョブキューDBの初期化に失敗しました: {e}", exc_info=True)
+            raise
+
+    def enqueue(self, origin: str, payload: Dict[str, Any]) -> int:
+        """
+        生成依頼をキューに積む。
+
+        Args:
+            origin (str): 結果を受け取るゲートウェイの識別子。
+            payload (Dict[str, Any]): ワーカーに渡す依頼の内容（JSONに変換できること）。
+
+        Returns:
+            int: ジョブのID。
+
+        Raises:
+            sqlite3.Error: DBへの書き込みに失敗した場合。
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(self._INSERT_SQL, (origin, json.dumps(payload, ensure_ascii=False), time.time()))
+            return cursor.lastrowid
+
+    def lease(self, worker_id: str, failure_result: Dict[str, Any]) -> Optional[Job]:
+        """
+        次のジョブを取り出し、このワーカーに貸し出す。
+
+        取り出し回数が上限に達したジョブは、`failure_result` を結果として完了扱いにし、
+        その次のジョブを探す。
+
+        Args:
+            worker_id (str): ワーカーの識別子。
+            failure_result (Dict[str, Any]): 打ち切ったジョブに書き込む結果。
+
+        Returns:
+            Optional[Job]: 取り出したジョブ。取り出せるジョブがなければNone。
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            while (row := conn.execute(self._SELECT_NEXT_SQL, (now,)).fetchone()) is not None:
+                job_id, origin, payload, attempts = row
+                if attempts >= self.max_attempts:
+                    logger.error(f"ジョブ {job_id} は {attempts} 回取り出されても完了しなかったため打ち切ります。")
+                    conn.execute(self._ABANDON_SQL, (json.dumps(failure_result, ensure_ascii=False), job_id))
+                    continue
+                conn.execute(self._LEASE_SQL, (worker_id, now + self.lease_seconds, job_id))
+                conn.execute("COMMIT")
+                return Job(job_id, origin, json.loads(payload), attempts + 1)
+            conn.execute("COMMIT")
+            return None
+
+    def extend_lease(self, job_id: int, worker_id: str) -> bool:
+        """リースの期限を延ばす。他のワーカーに再配布済みの場合はFalseを返す。"""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(self._EXTEND_SQL, (time.time() + self.lease_seconds, job_id, worker_id))
+            return cursor.rowcount > 0
+
+    def complete(self, job_id: int, worker_id: str, result: Dict[str, Any]) -> bool:
+        """
+        ジョブの結果を書き込む。
+
+        Returns:
+            bool: 書き込めたか。リースが切れて他のワーカーに渡っていた場合はFalse。
+        """
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                self._COMPLETE_SQL, (json.dumps(result, ensure_ascii=False), job_id, worker_id)
+            )
+            return cursor.rowcount > 0
+
+    def fetch_results(self, origin: str, limit: int = 20) -> List[Job]:
+        """このゲートウェイ宛ての、完了したジョブを古い順に取得する。"""
+        with closing(self._connect()) as conn:
+            return [
+                Job(job_id, job_origin, json.loads(payload), attempts, json.loads(result))
+                for job_id, job_origin, payload, attempts, result
+                in conn.execute(self._SELECT_RESULTS_SQL, (origin, limit))
+            ]
+
+    def mark_delivered(self, job_id: int) -> None:
+        """結果を送信し終えたジョブを削除する。"""
+        with closing(self._connect()) as conn:
+            conn.execute(self._DELETE_SQL, (job_id,))
+
+    def counts(self) -> Dict[str, int]:
+        """状態ごとのジョブ数を返す。"""
+        with closing(self._connect()) as conn:
+            counts = {'queued': 0, 'leased': 0, 'done': 0}
+            counts.update(dict(conn.execute(self._COUNT_SQL).fetchall()))
+            return counts
+
+    def describe(self) -> str:
+        """統計表示用に、状態ごとのジョブ数を整形した文字列を返す。"""
+        try:
+            counts = self.counts()
+        except sqlite3.Error as e:
+            return f"取得できませんでした ({e})"
+        return f"待機 {counts['queued']} / 生成中 {counts['leased']} / 送信待ち {counts['done']}"
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」のログ出力の設定モジュール。
+
+ログの書き込み（ファイル・標準出力）は `QueueListener` の専用スレッドで行い、
+ログを出す側はキューに積むだけにします。これにより、ディスクへの書き込みが
+イベントループを止めて応答を遅らせることはありません。
+
+- setup_logging: キュー経由のログ出力を設定（再設定）する。
+- setup_logging_from_config: BotConfigのログ設定で setup_logging を呼び出す。
+- JsonLinesFormatter: 1行1JSONの形式で出力するフォーマッター。
+- SamplingFilter: 件数の多いINFOログを間引くフィルター。
+- SAMPLED: 間引いてよいログに付ける `extra`。
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from config import BotConfig
+
+# 間引いてよいログであることを示す `extra`。例: logger.info("受付 %s", name, extra=SAMPLED)
+SAMPLED = {'sampled': True}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """ログを1行1JSONのオブジェクトとして出力するフォーマッター。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'process': record.process,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    `extra=SAMPLED` が付いたINFO以下のログを、同じ書式ごとに `every` 件に1件だけ通すフィルター。
+
+    書式（`%` 形式のテンプレート）ごとに数えるため、引数だけが違うログは同じ種類として扱います。
+    間引かれたログは文字列に整形されないため、整形の負荷もかかりません。
+    WARNING以上のログと、`SAMPLED` の付いていないログは常に通します。
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = every
+        self._counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every <= 1 or record.levelno > logging.INFO or not getattr(record, 'sampled', False):
+            return True
+        key = (record.name, str(record.msg))
+        with self._lock:
+            count = self._counts[key]
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+def _create_file_handler(log_file: str, max_bytes: int, backup_count: int, rotate_when: str) -> logging.Handler:
+    """`rotate_when` が指定されていれば時刻で、そうでなければサイズでローテーションするハンドラーを作る。"""
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(
+            log_file, when=rotate_when, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+    return logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+
+
+def setup_logging(
+    log_file: str,
+    level: int = logging.INFO,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    rotate_when: str = "",
+    json_lines: bool = False,
+    sample_every: int = 1
+) -> None:
+    """
+    ルートロガーに、キュー経由でファイルと標準出力に書き込むログ出力を設定する。
+
+    2回目以降の呼び出しでは、それまでのキューに残ったログを書き出してから設定を置き換える。
+
+    Args:
+        log_file (str): ログファイルのパス。
+        level (int): ルートロガーのレベル。
+        max_bytes (int): サイズでローテーションする場合の、1ファイルの最大バイト数。0でローテーションしない。
+        backup_count (int): 残す古いログファイルの数。
+        rotate_when (str): 時刻でローテーションする場合の単位（"midnight"、"H" など）。空ならサイズで行う。
+        json_lines (bool): ファイルに1行1JSONの形式で出力するか。標準出力は常にテキスト形式。
+        sample_every (int): `extra=SAMPLED` の付いたINFOログを何件に1件出力するか。1なら間引かない。
+    """
+    global _listener, _queue_handler
+
+    file_handler = _create_file_handler(log_file, max_bytes, backup_count, rotate_when)
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(TEXT_FORMAT))
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_every))
+    listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener.start()
+
+    if _listener is None:
+        atexit.register(shutdown_logging)
+    _listener, _queue_handler = listener, queue_handler
+
+
+def setup_logging_from_config(config: 'BotConfig', log_file: Optional[str] = None) -> None:
+    """
+    設定に従ってログ出力を設定し直す。
+
+    Args:
+        config (BotConfig): ログの設定を含むBotの設定。
+        log_file (Optional[str]): ログファイルのパス。省略時は `config.log_file`。
+    """
+    level = logging.getLevelName(config.log_level.upper())
+    if not isinstance(level, int):
+        logging.getLogger(__name__).warning(f"LOG_LEVEL「{config.log_level}」は不明なため、INFOを使用します。")
+        level = logging.INFO
+    setup_logging(
+        log_file or config.log_file,
+        level=level,
+        max_bytes=config.log_max_bytes,
+        backup_count=config.log_backup_count,
+        rotate_when=config.log_rotate_when,
+        json_lines=config.log_json,
+        sample_every=config.log_sample_every
+    )
+
+
+def shutdown_logging() -> None:
+    """キューに残ったログを書き出し、書き込み用のスレッドを止める。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」のイベントループ監視モジュール。
+
+イベントループ上で動く心拍タスクの遅れ（スケジューリングの遅延）を常時計測し、
+一定時間以上ループが止まっている間は、監視スレッドがループのスレッドの
+スタックを採取して、どこでループを止めているかを記録します。
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from bisect import bisect_left
+from pathlib import Path
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# このディレクトリ以下のファイルを「Bot自身のコード」とみなす
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# 遅延のヒストグラムの区切り（ミリ秒）。最後の区切りを超えたものは最後の区間に数える
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+# 記録するスタックの最大フレーム数
+MAX_STACK_FRAMES = 15
+
+
+class _StallSite:
+    """ループを止めていた1つの呼び出し箇所の集計。"""
+    __slots__ = ('samples', 'stalled_seconds', 'last_stack', 'last_seen')
+
+    def __init__(self):
+        self.samples = 0
+        self.stalled_seconds = 0.0
+        self.last_stack = ""
+        self.last_seen = 0.0
+
+
+class LoopMonitor:
+    """
+    イベントループの遅延を計測し、ループを止めている呼び出し箇所を記録するクラス。
+
+    ループ上の心拍タスクが `interval` 秒ごとに時刻を記録し、その遅れを遅延として
+    ヒストグラムに集計します。心拍が `threshold` 秒以上遅れている間は、監視スレッドが
+    `sys._current_frames()` でループのスレッドのスタックを採取し、最も内側にある
+    Bot自身のコードの行を「呼び出し箇所」として、採取回数と停止時間を積算します。
+    """
+
+    def __init__(self, threshold: float = 0.1, interval: float = 0.25, top_n: int = 10):
+        """
+        LoopMonitorを初期化します。監視は `start` で開始されます。
+
+        Args:
+            threshold (float): ループが止まっているとみなす遅れ（秒）。
+            interval (float): 心拍の間隔（秒）。
+            top_n (int): 報告する呼び出し箇所の数。
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.top_n = top_n
+        self._lock = threading.Lock()
+        self._histogram: List[int] = [0] * len(LAG_BUCKETS_MS)
+        self._samples = 0
+        self._total_lag = 0.0
+        self._max_lag = 0.0
+        self._stall_count = 0
+        self._sites: Dict[str, _StallSite] = {}
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.started_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    def start(self) -> None:
+        """心拍タスクと監視スレッドを開始する。実行中のイベントループ内で呼び出すこと。"""
+        if self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self.started_at = time.time()
+        self._stop.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    async def close(self) -> None:
+        """監視を停止する。"""
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join, 1.0)
+            self._watchdog = None
+
+    def reset(self) -> None:
+        """これまでの集計を消去する。"""
+        with self._lock:
+            self._histogram = [0] * len(LAG_BUCKETS_MS)
+            self._samples = 0
+            self._total_lag = 0.0
+            self._max_lag = 0.0
+            self._stall_count = 0
+            self._sites.clear()
+            self.started_at = time.time()
+
+    # --- 計測 ---
+    async def _heartbeat(self) -> None:
+        """`interval` 秒ごとに起き、予定よりどれだけ遅れて起きたかを記録する。"""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            self.record_lag(max(0.0, now - expected))
+
+    def record_lag(self, lag: float) -> None:
+        """遅延を1件記録する。"""
+        index = min(bisect_left(LAG_BUCKETS_MS, lag * 1000), len(LAG_BUCKETS_MS) - 1)
+        with self._lock:
+            self._histogram[index] += 1
+            self._samples += 1
+            self._total_lag += lag
+            if lag > self._max_lag:
+                self._max_lag = lag
+            if lag >= self.threshold:
+                self._stall_count += 1
+
+    def _watch(self) -> None:
+        """監視スレッド。心拍が遅れている間、ループのスレッドのスタックを採取する。"""
+        check_interval = max(0.01, self.threshold / 2)
+        while not self._stop.wait(check_interval):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._record_stall(frame, check_interval)
+
+    def _record_stall(self, frame: FrameType, stalled: float) -> None:
+        site = self._call_site(frame)
+        stack = "".join(traceback.format_stack(frame, limit=MAX_STACK_FRAMES))
+        with self._lock:
+            entry = self._sites.get(site)
+            if entry is None:
+                entry = self._sites[site] = _StallSite()
+            entry.samples += 1
+            entry.stalled_seconds += stalled
+            entry.last_stack = stack
+            entry.last_seen = time.time()
+
+    @staticmethod
+    def _call_site(frame: FrameType) -> str:
+        """スタックの最も内側にあるBot自身のコードの行を「ファイル:行 (関数名)」で返す。"""
+        innermost = frame
+        current: Optional[FrameType] = frame
+        while current is not None:
+            path = Path(current.f_code.co_filename)
+            try:
+                relative = path.resolve().relative_to(PROJECT_ROOT)
+            except (ValueError, OSError):
+                relative = None
+            if relative is not None and relative.parts[0] not in ('venv', '.venv') and path.name != 'loop_monitor.py':
+                site = f"{relative.as_posix()}:{current.f_lineno} ({current.f_code.co_name})"
+                if current is not innermost:
+                    site += f" → {innermost.f_code.co_name}"
+                return site
+            current = current.f_back
+        return f"{Path(innermost.f_code.co_filename).name}:{innermost.f_lineno} ({innermost.f_code.co_name})"
+
+    # --- 報告 ---
+    def percentile(self, ratio: float) -> float:
+        """ヒストグラムから、遅延の分位点（ミリ秒、区間の上限で近似）を求める。"""
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            target = self._samples * ratio
+            cumulative = 0
+            for bound, count in zip(LAG_BUCKETS_MS, self._histogram):
+                cumulative += count
+                if cumulative >= target:
+                    return float(bound)
+            return float(LAG_BUCKETS_MS[-1])
+
+    def histogram(self) -> List[Tuple[str, int]]:
+        """(区間の表示名, 件数) のリストを返す。"""
+        with self._lock:
+            counts = list(self._histogram)
+        labels = []
+        lower = 0
+        for index, bound in enumerate(LAG_BUCKETS_MS):
+            labels.append(f"≥{lower}ms" if index == len(LAG_BUCKETS_MS) - 1 else f"{lower}〜{bound}ms")
+            lower = bound
+        return list(zip(labels, counts))
+
+    def top_sites(self) -> List[Tuple[str, int, float, str]]:
+        """停止時間の長い順に、(呼び出し箇所, 採取回数, 停止秒数, 直近のスタック) を返す。"""
+        with self._lock:
+            ranked = sorted(self._sites.items(), key=lambda item: -item[1].stalled_seconds)[:self.top_n]
+            return [(site, entry.samples, entry.stalled_seconds, entry.last_stack) for site, entry in ranked]
+
+    def summary(self) -> Dict[str, float]:
+        """集計の概要 (samples, average_ms, max_ms, stalls) を返す。"""
+        with self._lock:
+            return {
+                'samples': self._samples,
+                'average_ms': self._total_lag / self._samples * 1000 if self._samples else 0.0,
+                'max_ms': self._max_lag * 1000,
+                'stalls': self._stall_count,
+            }
+
+    def describe(self) -> str:
+        """統計表示用に、遅延の概要を整形した文字列を返す。"""
+        summary = self.summary()
+        if not summary['samples']:
+            return "計測中"
+        text = (
+            f"平均 {summary['average_ms']:.1f}ms / p99 ≤{self.percentile(0.99):.0f}ms / "
+            f"最大 {summary['max_ms']:.0f}ms / 停止 {summary['stalls']}回"
+        )
+        top = self.top_sites()
+        if top:
+            text += f"\n最多: {top[0][0]}"
+        return text
@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」のメモリ使用量の監視モジュール。
+
+常時は一定間隔でRSS（常駐メモリ）とPythonが確保しているメモリブロック数だけを記録し、
+増え方を統計に表示します。メモリが増え続けている原因を調べるときは、
+管理者の指示で `tracemalloc` のスナップショットを基準として記録し、その後の
+スナップショットとの差分から、確保が増えた箇所と、数が増えたオブジェクトの型を報告します。
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# このディレクトリからの相対パスで確保した箇所を表示する
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# 差分から除外する、監視自身やインポート処理による確保（最も内側のフレームのファイルで判定する）
+# Snapshot.filter_traces は確保1件ごとにPythonで照合するため使わず、集計後の行を除外する
+IGNORED_FILES = frozenset({
+    tracemalloc.__file__,
+    __file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+})
+
+# RSSの増加量（1時間あたり）を表示するのに必要な記録の期間（秒）
+GROWTH_MIN_SECONDS = 600
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+
+
+def _windows_rss() -> Optional[int]:
+    """WindowsでプロセスのWorking Set（RSSに相当）を取得する。"""
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD]
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters.WorkingSetSize
+
+
+def read_rss_bytes() -> Optional[int]:
+    """
+    このプロセスのRSS（常駐メモリ）をバイト単位で返す。
+
+    Linuxでは `/proc` から現在値を、Windowsでは Working Set を読む。
+    どちらもない環境（macOSなど）では `resource` から最大値で代用する。
+
+    Returns:
+        Optional[int]: RSSのバイト数。取得できない場合はNone。
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if sys.platform == 'win32':
+        try:
+            return _windows_rss()
+        except (OSError, AttributeError):
+            return None
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss の単位は macOS ではバイト、それ以外ではKB
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def format_bytes(size: float) -> str:
+    """バイト数を読みやすい単位の文字列にする（符号付きの差分にも使える）。"""
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{sign}{size:.0f}{unit}" if unit == 'B' else f"{sign}{size:.1f}{unit}"
+        size /= 1024
+    return f"{sign}{size:.2f}GB"
+
+
+def count_objects_by_type() -> Counter:
+    """GCが追跡しているオブジェクトを型ごとに数える。オブジェクト数に比例して時間がかかる。"""
+    counts: Counter = Counter()
+    for obj in gc.get_objects():
+        cls = type(obj)
+        module = cls.__module__
+        counts[cls.__qualname__ if module == 'builtins' else f"{module}.{cls.__qualname__}"] += 1
+    return counts
+
+
+def _frame_label(filename: str, lineno: int, _cache: Dict[str, Tuple[str, bool]] = {}) -> Tuple[str, bool]:
+    """(「ファイル:行」, Bot自身のコードか) を返す。パスの解決は重いため、ファイルごとに覚えておく。"""
+    cached = _cache.get(filename)
+    if cached is None:
+        try:
+            relative = Path(filename).resolve().relative_to(PROJECT_ROOT)
+            cached = (relative.as_posix(), relative.parts[0] not in ('venv', '.venv'))
+        except (ValueError, OSError):
+            cached = (Path(filename).name, False)
+        _cache[filename] = cached
+    return f"{cached[0]}:{lineno}", cached[1]
+
+
+def _trace_site(traceback: tracemalloc.Traceback) -> str:
+    """確保した箇所を「ファイル:行」で表す。最も内側がBot自身のコードでなければ、呼び出し元も添える。"""
+    # tracemalloc.Traceback は古いフレームから順に並んでいる
+    frames = list(reversed(traceback))
+    innermost, is_own = _frame_label(frames[0].filename, frames[0].lineno)
+    if is_own:
+        return innermost
+    for frame in frames[1:]:
+        caller, is_own = _frame_label(frame.filename, frame.lineno)
+        if is_own:
+            return f"{innermost} ← {caller}"
+    return innermost
+
+
+class MemoryDiff:
+    """基準のスナップショットから現在までの、メモリの増減。"""
+    __slots__ = ('elapsed', 'rss_delta', 'traced_delta', 'sites', 'types', 'gauges')
+
+    def __init__(self, elapsed: float, rss_delta: Optional[int], traced_delta: int,
+                 sites: List[Tuple[str, int, int]], types: List[Tuple[str, int, int]],
+                 gauges: List[Tuple[str, int, int]]):
+        self.elapsed = elapsed
+        self.rss_delta = rss_delta
+        self.traced_delta = traced_delta
+        # (確保した箇所, 増えたバイト数, 増えたブロック数)
+        self.sites = sites
+        # (型名, 現在の数, 増えた数)
+        self.types = types
+        # (項目名, 現在の数, 増えた数)
+        self.gauges = gauges
+
+
+class MemoryTracker:
+    """
+    メモリ使用量を定期的に記録し、必要に応じてヒープの差分を取るクラス。
+
+    定期の記録は `interval` 秒ごとにRSSと確保中のブロック数を読むだけで（どちらもオブジェクトの数に依らず一定の時間で読める）、
+    `tracemalloc` は `snapshot` が呼ばれるまで有効にしません（有効な間はメモリ確保が遅くなるため、
+    調査が終わったら `stop_tracing` で止めます）。
+    キャッシュの件数など、増え続けていないか見ておきたい値は `register_gauge` で登録できます。
+    """
+
+    def __init__(self, interval: float = 60.0, trace_frames: int = 10, top_n: int = 10, history: int = 1440):
+        """
+        MemoryTrackerを初期化します。定期の記録は `start` で開始されます。
+
+        Args:
+            interval (float): 記録の間隔（秒）。0以下なら定期の記録を行わない。
+            trace_frames (int): `tracemalloc` が確保ごとに保存するスタックの深さ。
+            top_n (int): 差分で報告する箇所・型の数。
+            history (int): 保持する記録の件数。
+        """
+        self.interval = interval
+        self.trace_frames = trace_frames
+        self.top_n = top_n
+        # (時刻, RSSのバイト数, 確保中のブロック数)
+        self._samples: Deque[Tuple[float, Optional[int], int]] = deque(maxlen=history)
+        # {表示名: 現在の件数を返す関数}
+        self._gauges: Dict[str, Callable[[], int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started_tracing = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_types: Counter = Counter()
+        self._baseline_gauges: Dict[str, int] = {}
+        self._baseline_rss: Optional[int] = None
+        self.baseline_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    @property
+    def has_baseline(self) -> bool:
+        return self._baseline is not None
+
+    def start(self) -> None:
+        """定期の記録を開始する。実行中のイベントループ内で呼び出すこと。"""
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop_sampling(self) -> None:
+        """定期の記録を止める（記録済みの値は残す）。"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def close(self) -> None:
+        """定期の記録を止め、このクラスが開始した `tracemalloc` も止める。"""
+        task = self._task
+        self.stop_sampling()
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self.stop_tracing()
+
+    def reconfigure(self, interval: float, trace_frames: int) -> None:
+        """
+        記録の間隔とスタックの深さを変更する。実行中のイベントループ内で呼び出すこと。
+
+        間隔は次の記録から反映され、0以下にすると定期の記録を止める。
+        スタックの深さは、次に `tracemalloc` を開始したときに反映される。
+        """
+        self.interval = interval
+        self.trace_frames = trace_frames
+        if interval <= 0:
+            self.stop_sampling()
+        else:
+            self.start()
+
+    # --- 定期の記録 ---
+    async def _run(self) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def sample(self) -> Tuple[float, Optional[int], int]:
+        """
+        現在のRSSとPythonが確保中のメモリブロック数を記録し、その値を返す。
+
+        イベントループ上で定期的に呼ばれるため、全オブジェクトを列挙する `gc.get_objects` は使わない
+        （数百万件では1回に数十ミリ秒かかる）。型ごとの内訳は `snapshot` / `diff` で数える。
+        """
+        entry = (time.time(), read_rss_bytes(), sys.getallocatedblocks())
+        self._samples.append(entry)
+        return entry
+
+    def latest(self) -> Optional[Tuple[float, Optional[int], int]]:
+        """直近の記録を返す。まだ記録がなければNone。"""
+        return self._samples[-1] if self._samples else None
+
+    def growth_per_hour(self) -> Optional[float]:
+        """最初と直近の記録から、1時間あたりのRSSの増加量（バイト）を求める。"""
+        samples = [(at, rss) for at, rss, _ in self._samples if rss is not None]
+        if len(samples) < 2 or samples[-1][0] <= samples[0][0]:
+            return None
+        (first_at, first_rss), (last_at, last_rss) = samples[0], samples[-1]
+        return (last_rss - first_rss) / (last_at - first_at) * 3600
+
+    @property
+    def history_seconds(self) -> float:
+        """保持している記録がカバーする秒数。"""
+        if len(self._samples) < 2:
+            return 0.0
+        return self._samples[-1][0] - self._samples[0][0]
+
+    def register_gauge(self, label: str, source: Callable[[], int]) -> None:
+        """
+        増え続けていないか見ておきたい件数を登録する。
+
+        Args:
+            label (str): 表示名。
+            source (Callable[[], int]): 現在の件数を返す関数。表示や差分の取得時に呼ばれる。
+        """
+        self._gauges[label] = source
+
+    def unregister_gauge(self, label: str) -> None:
+        """`register_gauge` で登録した項目を削除する。"""
+        self._gauges.pop(label, None)
+
+    def read_gauges(self) -> Dict[str, int]:
+        """登録された件数を読む。読めなかった項目は省く。"""
+        values: Dict[str, int] = {}
+        for label, source in list(self._gauges.items()):
+            try:
+                values[label] = int(source())
+            except Exception as e:
+                logger.debug(f"メモリ監視の項目「{label}」を取得できませんでした: {e}")
+        return values
+
+    def describe(self) -> str:
+        """統計表示用に、RSSと確保中のブロック数、RSSの増え方を整形した文字列を返す。"""
+        latest = self.latest()
+        if latest is None:
+            rss = read_rss_bytes()
+            return f"RSS {format_bytes(rss)}" if rss is not None else "取得できません"
+        _, rss, blocks = latest
+        text = f"RSS {format_bytes(rss)}" if rss is not None else "RSS 取得不可"
+        growth = self.growth_per_hour()
+        # 短い期間から1時間あたりに換算すると誤差が大きいため、ある程度記録がたまってから表示する
+        if growth is not None and self.history_seconds >= GROWTH_MIN_SECONDS:
+            text += f" ({'+' if growth >= 0 else ''}{format_bytes(growth)}/時)"
+        text += f" / 確保ブロック {blocks:,}"
+        if self.tracing:
+            text += " / tracemalloc 有効"
+        return text
+
+    # --- ヒープの差分 ---
+    def snapshot(self) -> None:
+        """
+        `tracemalloc` を有効にして（未開始の場合）、現在の状態を差分の基準として記録する。
+
+        `tracemalloc` は開始後の確保しか追跡しないため、開始直後の基準はほぼ空になるが、
+        その後に増えた分を調べる用途にはそれで十分である。時間がかかるため、
+        ワーカースレッドから呼び出してもよい。
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(max(1, self.trace_frames))
+            self._started_tracing = True
+            logger.info(f"tracemalloc を開始しました (スタックの深さ: {self.trace_frames})。")
+        self._baseline = tracemalloc.take_snapshot()
+        self._baseline_types = count_objects_by_type()
+        self._baseline_gauges = self.read_gauges()
+        self._baseline_rss = read_rss_bytes()
+        self.baseline_at = time.time()
+
+    def diff(self) -> MemoryDiff:
+        """
+        基準のスナップショットから現在までの増減を求める。時間がかかるため、ワーカースレッドから呼び出してもよい。
+
+        Returns:
+            MemoryDiff: 確保が増えた箇所、数が増えた型、登録された件数の増減。
+
+        Raises:
+            RuntimeError: 基準が記録されていない、または `tracemalloc` が止められた場合。
+        """
+        if self._baseline is None or not tracemalloc.is_tracing():
+            raise RuntimeError("基準のスナップショットがありません。")
+        current = tracemalloc.take_snapshot()
+        key_type = 'traceback' if self.trace_frames > 1 else 'lineno'
+        stats = [
+            stat for stat in current.compare_to(self._baseline, key_type)
+            if stat.traceback[-1].filename not in IGNORED_FILES
+        ]
+        traced_delta = sum(stat.size_diff for stat in stats)
+
+        # 同じ箇所に集約し直す（スタックが違うだけの確保は同じ行として数える）
+        sites: Dict[str, List[int]] = {}
+        for stat in stats:
+            if stat.size_diff <= 0:
+                continue
+            entry = sites.setdefault(_trace_site(stat.traceback), [0, 0])
+            entry[0] += stat.size_diff
+            entry[1] += stat.count_diff
+        top_sites = sorted(
+            ((site, size, count) for site, (size, count) in sites.items()), key=lambda item: -item[1]
+        )[:self.top_n]
+
+        types = count_objects_by_type()
+        type_deltas = sorted(
+            ((name, types[name], types[name] - self._baseline_types.get(name, 0))
+             for name in set(types) | set(self._baseline_types)),
+            key=lambda item: -item[2]
+        )
+        top_types = [item for item in type_deltas if item[2] > 0][:self.top_n]
+
+        gauges = self.read_gauges()
+        gauge_deltas = [
+            (label, value, value - self._baseline_gauges.get(label, 0)) for label, value in gauges.items()
+        ]
+
+        rss = read_rss_bytes()
+        rss_delta = rss - self._baseline_rss if rss is not None and self._baseline_rss is not None else None
+        return MemoryDiff(
+            time.time() - self.baseline_at, rss_delta, traced_delta, top_sites, top_types, gauge_deltas
+        )
+
+    def stop_tracing(self) -> None:
+        """基準を破棄し、このクラスが開始した `tracemalloc` を止める。"""
+        self._baseline = None
+        self._baseline_types = Counter()
+        self._baseline_gauges = {}
+        self._baseline_rss = None
+        self.baseline_at = None
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc を停止しました。")
+        self._started_tracing = False
+
+    def traced_memory(self) -> Optional[Tuple[int, int]]:
+        """`tracemalloc` が追跡している (現在, 最大) のバイト数。追跡していなければNone。"""
+        if not tracemalloc.is_tracing():
+            return None
+        return tracemalloc.get_traced_memory()
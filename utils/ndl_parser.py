@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+国立国会図書館サーチ OpenSearch (RSS) 応答のパーサー。
+
+- parse_xml_item: パース済みのitem要素を辞書に変換する（従来方式）。
+- parse_document: 応答全体をツリー化し、総件数とitemの辞書のリストを返す（従来方式）。
+- NDLRecord: 1件分の資料データを保持する、スロット化された軽量レコード。
+- NDLStreamParser: 受信したチャンクを順次読み込み、必要な項目だけを抽出する逐次パーサー。
+"""
+
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional, Tuple
+
+NAMESPACES = {
+    'dc': 'http://purl.org/dc/elements/1.1/',
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'openSearch': 'http://a9.com/-/spec/opensearchrss/1.0/'
+}
+
+
+def parse_xml_item(item: ET.Element) -> Dict[str, Any]:
+    """XMLのitem要素をパースして辞書に変換する。"""
+    thumbnail_elem = item.find('rdfs:seeAlso', namespaces=NAMESPACES)
+    thumbnail_url = thumbnail_elem.get(f"{{{NAMESPACES['rdf']}}}resource") if thumbnail_elem is not None else None
+
+    return {
+        'title': item.findtext('title', default='タイトル不明'),
+        'link': item.findtext('link', default=''),
+        'author': item.findtext('author', default='著者不明'),
+        'pubDate': item.findtext('pubDate', default='出版日不明'),
+        'description': item.findtext('description', default='説明なし'),
+        'publisher': item.findtext('dc:publisher', namespaces=NAMESPACES, default='出版社不明'),
+        'thumbnail_url': thumbnail_url
+    }
+
+
+def parse_document(xml_text: str) -> Tuple[int, List[Dict[str, Any]]]:
+    """
+    応答全体をツリー化してから、(総件数, itemの辞書のリスト) を返す。
+
+    Raises:
+        ET.ParseError: XMLとして不正なデータだった場合。
+    """
+    root = ET.fromstring(xml_text)
+    total_elem = root.find('channel/openSearch:totalResults', namespaces=NAMESPACES)
+    total = int(total_elem.text) if total_elem is not None and total_elem.text.isdigit() else 0
+    return total, [parse_xml_item(item) for item in root.findall('channel/item')]
+
+
+class NDLRecord:
+    """
+    1件分の資料データ。
+
+    `parse_xml_item` の辞書と同じキーを、`record['title']` や
+    `record.get('thumbnail_url')` の形で参照できるため、既存の処理にそのまま渡せます。
+    """
+    __slots__ = ('title', 'link', 'author', 'pubDate', 'description', 'publisher', 'thumbnail_url')
+
+    # 要素が存在しなかった場合の既定値 (parse_xml_itemと同じ)
+    DEFAULTS = {
+        'title': 'タイトル不明',
+        'link': '',
+        'author': '著者不明',
+        'pubDate': '出版日不明',
+        'description': '説明なし',
+        'publisher': '出版社不明',
+        'thumbnail_url': None,
+    }
+
+    def __init__(self, **fields: Optional[str]):
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, fields.get(name, default))
+
+    def __getitem__(self, key: str) -> Optional[str]:
+        if key not in self.DEFAULTS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default) if key in self.DEFAULTS else default
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"NDLRecord(title={self.title!r})"
+
+
+class NDLStreamParser:
+    """
+    OpenSearch (RSS) 応答を受信したチャンクごとに読み込む逐次パーサー。
+
+    item要素が閉じるたびに必要な項目だけを `NDLRecord` に取り出し、
+    要素自体はツリーから取り除くため、文書全体を保持せずに済みます。
+    各メソッドはスレッドセーフではないため、同時に1つのスレッドからのみ呼び出してください。
+    """
+
+    # item直下の子要素のタグ名 → NDLRecordの属性名
+    _ITEM_FIELDS = {
+        'title': 'title',
+        'link': 'link',
+        'author': 'author',
+        'pubDate': 'pubDate',
+        'description': 'description',
+        f"{{{NAMESPACES['dc']}}}publisher": 'publisher',
+    }
+    _SEE_ALSO_TAG = f"{{{NAMESPACES['rdfs']}}}seeAlso"
+    _RESOURCE_ATTR = f"{{{NAMESPACES['rdf']}}}resource"
+    _TOTAL_RESULTS_TAG = f"{{{NAMESPACES['openSearch']}}}totalResults"
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._channel: Optional[ET.Element] = None
+        self._item: Optional[ET.Element] = None
+        self._fields: Dict[str, Optional[str]] = {}
+        self.total = 0
+        self.records: List[NDLRecord] = []
+        self.bytes_fed = 0
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        受信したデータの一部を読み込み、閉じたitem要素をレコードに変換する。
+
+        Raises:
+            ET.ParseError: XMLとして不正なデータだった場合。
+        """
+        self.bytes_fed += len(chunk)
+        self._parser.feed(chunk)
+        self._drain()
+
+    def close(self) -> Tuple[int, List[NDLRecord]]:
+        """
+        読み込みを終了し、(総件数, レコードのリスト) を返す。
+
+        Raises:
+            ET.ParseError: 文書が途中で終わっているなど、XMLとして不正だった場合。
+        """
+        self._parser.close()
+        self._drain()
+        return self.total, self.records
+
+    def _drain(self) -> None:
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if elem.tag == 'channel':
+                    self._channel = elem
+                elif elem.tag == 'item' and self._item is None:
+                    self._item = elem
+                    self._fields = {}
+                continue
+
+            # --- 'end' イベント ---
+            if self._item is None:
+                if elem.tag == self._TOTAL_RESULTS_TAG:
+                    text = (elem.text or '').strip()
+                    self.total = int(text) if text.isdigit() else 0
+                continue
+
+            if elem is self._item:
+                self.records.append(NDLRecord(**self._fields))
+                # 取り出し終えたitemはツリーから外し、メモリを解放する
+                elem.clear()
+                if self._channel is not None:
+                    self._channel.remove(elem)
+                self._item = None
+            elif elem in self._item:
+                # item直下の子要素のみ対象。同じタグが複数ある場合は最初のものを採用する
+                if (name := self._ITEM_FIELDS.get(elem.tag)) is not None:
+                    self._fields.setdefault(name, elem.text or '')
+                elif elem.tag == self._SEE_ALSO_TAG:
+                    self._fields.setdefault('thumbnail_url', elem.get(self._RESOURCE_ATTR))
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」を動かしたままCPUプロファイルを取るモジュール。
+
+既定ではサンプリング方式で、別スレッドが一定間隔でイベントループのスレッドの
+スタックを採取し、関数ごと・コルーチン（タスク）ごとに集計します。
+サンプリングが使えない環境や、呼び出し回数まで知りたい場合は `cProfile` を使えます。
+プロファイルは管理者の指示で指定秒数だけ動き、それ以外の時間は負荷をかけません。
+"""
+
+import asyncio
+import cProfile
+import inspect
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from types import CodeType, FrameType
+from typing import Dict, List, Optional, Set, Tuple
+
+# このディレクトリからの相対パスで関数の場所を表示する
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# 標準のイベントループが次のイベントを待っている（アイドル状態の）ときに、最も内側にあるファイル
+IDLE_FILES = ('selectors.py', 'windows_events.py')
+# レポートに載せる関数・コルーチンの数
+REPORT_ROWS = 30
+
+MODES = ('sampling', 'cprofile')
+
+
+class ProfilerBusy(Exception):
+    """すでにプロファイルを取得中であることを表す例外。"""
+
+
+def _function_label(code: CodeType) -> str:
+    path = Path(code.co_filename)
+    try:
+        location = path.resolve().relative_to(PROJECT_ROOT).as_posix()
+    except (ValueError, OSError):
+        location = path.name
+    return f"{code.co_name} ({location}:{code.co_firstlineno})"
+
+
+class _SampleCollector:
+    """ループのスレッドのスタックを一定間隔で採取して集計する。"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, thread_id: int, interval: float,
+                 entry_frame: Optional[FrameType] = None):
+        """
+        Args:
+            entry_frame (Optional[FrameType]): uvloop など、待機をCで行うループの場合に、
+                ループを開始した（`run_until_complete` などを呼び出した）フレーム。
+                待機中はこのフレームが最も内側になるため、アイドル状態の判定に使う。
+        """
+        self.loop = loop
+        self.thread_id = thread_id
+        self.interval = interval
+        self.entry_frame = entry_frame
+        self.samples = 0
+        self.idle_samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self.task_counts: Counter = Counter()
+        # パスの解決は重いため、コードオブジェクトごとに表示名を覚えておく
+        self._labels: Dict[CodeType, str] = {}
+
+    def _label(self, frame: FrameType) -> str:
+        label = self._labels.get(frame.f_code)
+        if label is None:
+            label = self._labels[frame.f_code] = _function_label(frame.f_code)
+        return label
+
+    def collect(self, duration: float) -> None:
+        """`duration` 秒間採取する。ワーカースレッドから呼び出すこと。"""
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+            time.sleep(self.interval)
+
+    def _record(self, frame: FrameType) -> None:
+        self.samples += 1
+        if frame is self.entry_frame or Path(frame.f_code.co_filename).name in IDLE_FILES:
+            self.idle_samples += 1
+            return
+        self.self_counts[self._label(frame)] += 1
+        seen: Set[str] = set()
+        current: Optional[FrameType] = frame
+        while current is not None:
+            label = self._label(current)
+            if label not in seen:
+                seen.add(label)
+                self.total_counts[label] += 1
+            current = current.f_back
+        # 採取した瞬間に実行されていたタスク（コルーチン）
+        task = asyncio.current_task(self.loop)
+        if task is not None:
+            coro = task.get_coro()
+            name = getattr(coro, '__qualname__', None) or task.get_name()
+            self.task_counts[name] += 1
+        else:
+            self.task_counts["(タスク外のコールバック)"] += 1
+
+    def report(self, header: str) -> str:
+        busy = self.samples - self.idle_samples
+        lines = [
+            header,
+            f"サンプル数: {self.samples:,} (間隔 {self.interval * 1000:.0f}ms) / "
+            f"ループ稼働中: {busy:,} ({busy / self.samples * 100 if self.samples else 0:.1f}%)",
+            "割合はループが稼働していたサンプルに対する値です。",
+            "",
+        ]
+        lines += self._table("コルーチン (タスク) 別", self.task_counts, busy)
+        lines += self._table("関数別 (自身で実行していた時間)", self.self_counts, busy)
+        lines += self._table("関数別 (呼び出し先を含む時間)", self.total_counts, busy)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _table(title: str, counts: Counter, busy: int) -> List[str]:
+        lines = [f"=== {title} ==="]
+        if not counts:
+            lines.append("  (ループは稼働していませんでした)")
+        for label, count in counts.most_common(REPORT_ROWS):
+            lines.append(f"  {count:>7,}  {count / busy * 100:5.1f}%  {label}")
+        lines.append("")
+        return lines
+
+
+class LoopProfiler:
+    """
+    イベントループのCPUプロファイルを、一度に1つだけ取得するクラス。
+
+    サンプリング方式は別スレッドで採取するため、ループの処理自体には手を加えません。
+    採取の負荷は `interval` ごとのスタック参照だけで、指定した秒数が過ぎると止まります。
+    """
+
+    def __init__(self, max_seconds: float = 60.0, interval: float = 0.005):
+        """
+        Args:
+            max_seconds (float): 1回のプロファイルの最大秒数。
+            interval (float): サンプリング方式の採取間隔（秒）。
+        """
+        self.max_seconds = max_seconds
+        self.interval = interval
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    @staticmethod
+    def available_modes() -> Tuple[str, ...]:
+        """この環境で使えるプロファイル方式。サンプリングはCPythonでのみ使える。"""
+        if hasattr(sys, '_current_frames'):
+            return MODES
+        return ('cprofile',)
+
+    async def run(self, seconds: float, mode: str = 'sampling') -> str:
+        """
+        指定秒数だけプロファイルを取り、テキストのレポートを返す。
+
+        Args:
+            seconds (float): 計測する秒数。`max_seconds` を超える場合は切り詰める。
+            mode (str): 'sampling' または 'cprofile'。サンプリングが使えない環境では
+                自動的に 'cprofile' になる。
+
+        Returns:
+            str: レポート。
+
+        Raises:
+            ProfilerBusy: 他のプロファイルを取得中の場合。
+            ValueError: 不明な方式が指定された場合。
+        """
+        if mode not in MODES:
+            raise ValueError(f"不明なプロファイル方式です: {mode}")
+        if mode not in self.available_modes():
+            mode = 'cprofile'
+        if self._lock.locked():
+            raise ProfilerBusy()
+        seconds = max(1.0, min(float(seconds), self.max_seconds))
+
+        async with self._lock:
+            started_at = datetime.now()
+            header = f"AI犬 CPUプロファイル ({mode}) 開始: {started_at:%Y-%m-%d %H:%M:%S} / 計測: {seconds:.0f}秒"
+            if mode == 'sampling':
+                loop = asyncio.get_running_loop()
+                collector = _SampleCollector(loop, threading.get_ident(), self.interval, self._loop_entry_frame(loop))
+                await asyncio.to_thread(collector.collect, seconds)
+                return collector.report(header)
+            return await self._run_cprofile(seconds, header)
+
+    @staticmethod
+    def _loop_entry_frame(loop: asyncio.AbstractEventLoop) -> Optional[FrameType]:
+        """
+        uvloop のように待機をCで行うループで、ループを開始したPythonのフレームを返す。
+
+        実行中のタスクのコルーチンのフレームを外側へたどり、最初のコルーチンでないフレームを探す。
+        標準のループは待機中に `selectors.py` が最も内側になるため、Noneを返す。
+        """
+        if isinstance(loop, asyncio.BaseEventLoop):
+            return None
+        # 呼び出し元 (run) のコルーチンから外側へたどる
+        frame = sys._getframe(1)
+        while frame is not None and frame.f_code.co_flags & inspect.CO_COROUTINE:
+            frame = frame.f_back
+        return frame
+
+    @staticmethod
+    async def _run_cprofile(seconds: float, header: str) -> str:
+        """ループのスレッドで `cProfile` を有効にし、その間に実行された処理を記録する。"""
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profile.disable()
+        buffer = io.StringIO()
+        buffer.write(header + "\n\n")
+        stats = pstats.Stats(profile, stream=buffer)
+        stats.strip_dirs()
+        buffer.write("=== 関数別 (呼び出し先を含む時間順) ===\n")
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_ROWS)
+        buffer.write("=== 関数別 (自身で実行していた時間順) ===\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(REPORT_ROWS)
+        return buffer.getvalue()
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」を複数プロセスで動かすときの共有状態モジュール。
+
+シャードごとに別プロセスで動かしても制限がユーザー単位で一貫するよう、
+レート制限のバケットをSQLite (WALモード) のファイルに保存して共有します。
+
+- enable_wal: SQLiteファイルをWALモードに切り替える。
+- SharedRateLimiter: バケットを共有DBに保存する RateLimiter。
+"""
+
+import logging
+import math
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+from utils.bot_utils import RateLimiter, _TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# 他のプロセスが書き込み中の場合に待つ秒数
+SHARED_DB_TIMEOUT = 5.0
+
+
+def enable_wal(conn: sqlite3.Connection) -> None:
+    """
+    接続先のDBをWALモードにする。
+
+    WALモードでは読み込みが書き込みを待たないため、複数プロセスから
+    同じファイルを使っても互いの処理を止めにくくなる（設定はファイルに保存される）。
+    """
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+
+class SharedRateLimiter(RateLimiter):
+    """
+    バケットをSQLiteの共有DBに保存する RateLimiter。
+
+    どのプロセス（シャード）がメッセージを受けても、同じユーザー・サーバーには
+    同じバケットが使われます。トークンの判定と消費は1つのトランザクション
+    (`BEGIN IMMEDIATE`) で行うため、同時に判定しても制限を超えません。
+    プロセス間で時刻を比較するため、時刻には `time.time()` を使います。
+    共有DBに障害がある場合は、このプロセスのメモリ上のバケットで判定を続けます。
+    """
+
+    # --- SQLクエリ定義 ---
+    _CREATE_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            tier TEXT NOT NULL CHECK(tier IN ('user', 'guild', 'global')),
+            key INTEGER NOT NULL,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            PRIMARY KEY (tier, key)
+        )
+    """
+    _SELECT_BUCKET_SQL = "SELECT tokens, updated FROM rate_limit_buckets WHERE tier = ? AND key = ?"
+    _UPSERT_BUCKET_SQL = """
+        INSERT INTO rate_limit_buckets (tier, key, tokens, updated) VALUES (?, ?, ?, ?)
+        ON CONFLICT(tier, key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated
+    """
+    # 満タンまで回復したバケットを削除する (容量, 回復速度, 現在時刻, 段階)
+    _SWEEP_SQL = """
+        DELETE FROM rate_limit_buckets
+        WHERE tier = ? AND tokens + (? - updated) * ? >= ?
+    """
+    _DELETE_TIER_SQL = "DELETE FROM rate_limit_buckets WHERE tier = ?"
+    _COUNT_SQL = "SELECT COUNT(*) FROM rate_limit_buckets"
+
+    def __init__(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        guild_max_requests: int = 0,
+        global_max_requests: int = 0,
+        sweep_interval: float = 300.0,
+        db_path: str = 'ai_dog_shared_state.sqlite3',
+        init_db: bool = True
+    ):
+        """
+        SharedRateLimiterを初期化します。
+
+        Args:
+            max_requests (int): 制限時間内に1ユーザーが行えるリクエストの最大数。
+            window_seconds (int): 制限時間を秒単位で指定。
+            guild_max_requests (int): 制限時間内に1サーバーが行えるリクエストの最大数。0で無効。
+            global_max_requests (int): 制限時間内にBot全体が受け付けるリクエストの最大数。0で無効。
+            sweep_interval (float): アイドル状態のバケットを掃除する間隔（秒）。
+            db_path (str): 全プロセスで共有するSQLiteデータベースファイルのパス。
+            init_db (bool): Falseの場合はDBを初期化せず、後で `initialize` を呼び出す。
+        """
+        super().__init__(
+            max_requests, window_seconds,
+            guild_max_requests=guild_max_requests, global_max_requests=global_max_requests,
+            sweep_interval=sweep_interval
+        )
+        self.db_path = db_path
+        self._last_sweep = time.time()
+        if init_db:
+            self._init_db()
+
+    def initialize(self) -> None:
+        """DBを初期化する。起動時にワーカースレッドから呼び出してもよい。"""
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        # トランザクションを明示的に制御するため、自動のBEGINは無効にする
+        return sqlite3.connect(self.db_path, timeout=SHARED_DB_TIMEOUT, isolation_level=None)
+
+    def _init_db(self) -> None:
+        """データベースファイルとテーブルが存在しない場合に初期化し、WALモードにする。"""
+        try:
+            conn = self._connect()
+            try:
+                enable_wal(conn)
+                conn.execute(self._CREATE_TABLE_SQL)
+            finally:
+                conn.close()
+            logger.info(f"共有状態DB '{self.db_path}' の準備が完了しました。")
+        except sqlite3.Error as e:
+            logger.critical(f"共有状態DBの初期化に失敗しました: {e}", exc_info=True)
+            raise
+
+    def _shared_tiers(self, user_id: int, guild_id: Optional[int]) -> List[Tuple[str, int, int]]:
+        """今回のリクエストに適用する (段階名, キー, 容量) の一覧を返す。"""
+        tiers = [('user', user_id, self.max_requests)]
+        if guild_id is not None and self.guild_max_requests > 0:
+            tiers.append(('guild', guild_id, self.guild_max_requests))
+        if self.global_max_requests > 0:
+            tiers.append(('global', self._GLOBAL_KEY, self.global_max_requests))
+        return tiers
+
+    def is_rate_limited(self, user_id: int, guild_id: Optional[int] = None) -> Tuple[bool, int]:
+        """
+        指定されたユーザーがレート制限に達しているかを、共有DBのバケットで確認します。
+
+        判定の仕様は `RateLimiter.is_rate_limited` と同じです。
+
+        Args:
+            user_id (int): DiscordユーザーのID。
+            guild_id (Optional[int]): サーバーのID。DMの場合はNone。
+
+        Returns:
+            Tuple[bool, int]: (レート制限に達しているか, 待機時間(秒))
+        """
+        now = time.time()
+        tiers = self._shared_tiers(user_id, guild_id)
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                if now - self._last_sweep >= self.sweep_interval:
+                    self._sweep_locked(conn, now)
+
+                current = []
+                wait_time = 0
+                for tier, key, capacity in tiers:
+                    row = conn.execute(self._SELECT_BUCKET_SQL, (tier, key)).fetchone()
+                    tokens = self._current_tokens(_TokenBucket(*row) if row else None, capacity, now)
+                    current.append((tier, key, tokens))
+                    if tokens < 1.0:
+                        refill_rate = capacity / self.window_seconds
+                        wait_time = max(wait_time, max(1, math.ceil((1.0 - tokens) / refill_rate)))
+
+                if not wait_time:
+                    conn.executemany(
+                        self._UPSERT_BUCKET_SQL,
+                        [(tier, key, tokens - 1.0, now) for tier, key, tokens in current]
+                    )
+                conn.execute("COMMIT")
+                return bool(wait_time), wait_time
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"共有状態DBでのレート制限の確認に失敗しました。このプロセス内で判定します: {e}")
+            return super().is_rate_limited(user_id, guild_id)
+
+    def _sweep_locked(self, conn: sqlite3.Connection, now: float) -> int:
+        removed = 0
+        for tier, capacity in (
+            ('user', self.max_requests),
+            ('guild', self.guild_max_requests),
+            ('global', self.global_max_requests),
+        ):
+            if capacity <= 0:
+                removed += conn.execute(self._DELETE_TIER_SQL, (tier,)).rowcount
+            else:
+                refill_rate = capacity / self.window_seconds
+                removed += conn.execute(self._SWEEP_SQL, (tier, now, refill_rate, capacity)).rowcount
+        self._last_sweep = now
+        return removed
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """
+        満タンまで回復したアイドル状態のバケットを共有DBから破棄します。
+
+        Args:
+            now (Optional[float]): 基準時刻（`time.time()`）。省略時は現在時刻。
+
+        Returns:
+            int: 破棄したバケットの数。
+        """
+        now = time.time() if now is None else now
+        removed = super().sweep(time.monotonic())
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                removed += self._sweep_locked(conn, now)
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"共有状態DBの掃除に失敗しました: {e}")
+        return removed
+
+    def reconfigure(
+        self,
+        max_requests: int,
+        window_seconds: int,
+        guild_max_requests: int = 0,
+        global_max_requests: int = 0
+    ) -> None:
+        """
+        制限値をその場で変更します。
+
+        共有DBのバケットは他のプロセスも使っているため、ここでは伸縮させません。
+        容量が減った場合は、次の判定時に新しい容量で頭打ちになります。
+        """
+        super().reconfigure(
+            max_requests, window_seconds,
+            guild_max_requests=guild_max_requests, global_max_requests=global_max_requests
+        )
+
+    def tracked_count(self) -> int:
+        """共有DBに保存されているバケットの総数を返す。"""
+        try:
+            conn = self._connect()
+            try:
+                return conn.execute(self._COUNT_SQL).fetchone()[0]
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"共有状態DBのバケット数の取得に失敗しました: {e}")
+            return super().tracked_count()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の飲食店ローカル索引モジュール。
+
+ホットペッパーAPIで取得したお店の情報をSQLiteに保存し、
+メモリ上の緯度経度グリッドで近くのお店を高速に検索します。
+"""
+
+import json
+import logging
+import math
+import sqlite3
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 地球の半径（メートル）
+EARTH_RADIUS_M = 6_371_000
+
+
+class _ShopPoint:
+    """グリッドに登録する1店舗分の位置情報。詳細データはSQLiteにのみ保持する。"""
+    __slots__ = ('shop_id', 'lat', 'lng', 'cell', 'station')
+
+    def __init__(self, shop_id: str, lat: float, lng: float, cell: Tuple[int, int], station: str):
+        self.shop_id = shop_id
+        self.lat = lat
+        self.lng = lng
+        self.cell = cell
+        self.station = station
+
+
+def distance_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """2地点間の距離（メートル）を、近距離向けの正距円筒近似で求める。"""
+    mean_lat = math.radians((lat1 + lat2) / 2)
+    dx = math.radians(lng2 - lng1) * math.cos(mean_lat)
+    dy = math.radians(lat2 - lat1)
+    return EARTH_RADIUS_M * math.hypot(dx, dy)
+
+
+def normalize_station_name(name: str) -> str:
+    """駅名の表記揺れ（全角/半角、末尾の「駅」、空白）を吸収する。"""
+    name = "".join(unicodedata.normalize('NFKC', name).split()).casefold()
+    return name[:-1] if name.endswith("駅") and len(name) > 1 else name
+
+
+class ShopIndex:
+    """
+    お店の情報をSQLiteに永続化し、緯度経度のグリッドで近傍検索するクラス。
+
+    グリッドと駅名の索引はメモリ上に持つため、検索はDBにアクセスせずに行えます。
+    DBへの書き込み (`save_rows`) はスレッドから呼び出しても安全ですが、
+    メモリ上の索引を変更する `add_shops` はイベントループ上で呼び出してください。
+    """
+    # グリッドの1セルの大きさ（度）。緯度方向で約1.1km
+    CELL_DEGREES = 0.01
+
+    # --- SQLクエリ定義 ---
+    _CREATE_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS shops (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            genre TEXT,
+            budget TEXT,
+            station_name TEXT,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """
+    _UPSERT_SQL = """
+        INSERT INTO shops (id, name, lat, lng, genre, budget, station_name, data, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            name = excluded.name, lat = excluded.lat, lng = excluded.lng,
+            genre = excluded.genre, budget = excluded.budget,
+            station_name = excluded.station_name, data = excluded.data,
+            updated_at = excluded.updated_at
+    """
+    _SELECT_POINTS_SQL = "SELECT id, lat, lng, station_name FROM shops"
+    _SELECT_DATA_SQL = "SELECT id, data FROM shops WHERE id IN ({placeholders})"
+
+    def __init__(self, db_path: str = 'ai_dog_shops.sqlite3'):
+        """
+        ShopIndexを初期化し、保存済みのお店をメモリ上の索引に読み込みます。
+
+        Args:
+            db_path (str): SQLiteデータベースファイルのパス。
+        """
+        self.db_path = db_path
+        self._points: Dict[str, _ShopPoint] = {}
+        # {(セルx, セルy): {shop_id, ...}}
+        self._grid: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        # {正規化した駅名: {shop_id, ...}}
+        self._stations: Dict[str, Set[str]] = defaultdict(set)
+        self._init_db()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _init_db(self) -> None:
+        """テーブルを作成し、保存済みのお店の位置を索引に読み込む。"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute(self._CREATE_TABLE_SQL)
+                conn.commit()
+                for shop_id, lat, lng, station_name in conn.execute(self._SELECT_POINTS_SQL):
+                    self._add_point(shop_id, lat, lng, station_name or "")
+            logger.info(f"お店の索引DB '{self.db_path}' から {len(self._points)} 件を読み込みました。")
+        except sqlite3.Error as e:
+            logger.critical(f"お店の索引DBの初期化に失敗しました: {e}", exc_info=True)
+            raise
+
+    def _cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.CELL_DEGREES), math.floor(lng / self.CELL_DEGREES))
+
+    def _add_point(self, shop_id: str, lat: float, lng: float, station_name: str) -> None:
+        """メモリ上のグリッドと駅名索引に1店舗を登録する（既存の登録は置き換える）。"""
+        if (old := self._points.get(shop_id)) is not None:
+            self._grid[old.cell].discard(shop_id)
+            self._stations[old.station].discard(shop_id)
+        station = normalize_station_name(station_name) if station_name else ""
+        point = _ShopPoint(shop_id, lat, lng, self._cell_of(lat, lng), station)
+        self._points[shop_id] = point
+        self._grid[point.cell].add(shop_id)
+        if station:
+            self._stations[station].add(shop_id)
+
+    def add_shops(self, shops: Iterable[Dict[str, Any]]) -> List[tuple]:
+        """
+        APIから取得したお店をメモリ上の索引に登録し、DB保存用の行を返す。
+
+        緯度経度を持たないお店は無視します。
+
+        Args:
+            shops (Iterable[Dict[str, Any]]): ホットペッパーAPIの `shop` 要素のリスト。
+
+        Returns:
+            List[tuple]: `save_rows` に渡すDB保存用の行。
+        """
+        rows = []
+        now = time.time()
+        for shop in shops:
+            try:
+                shop_id = shop['id']
+                lat, lng = float(shop['lat']), float(shop['lng'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            station_name = shop.get('station_name') or ""
+            self._add_point(shop_id, lat, lng, station_name)
+            rows.append((
+                shop_id, shop.get('name', '名称不明'), lat, lng,
+                (shop.get('genre') or {}).get('name'), (shop.get('budget') or {}).get('name'),
+                station_name, json.dumps(shop, ensure_ascii=False), now
+            ))
+        return rows
+
+    def save_rows(self, rows: List[tuple]) -> None:
+        """`add_shops` が返した行をDBに保存する。ワーカースレッドから呼び出してもよい。"""
+        if not rows:
+            return
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(self._UPSERT_SQL, rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"お店の索引DBへの保存に失敗しました: {e}", exc_info=True)
+
+    def nearest(self, lat: float, lng: float, radius_m: float, limit: int) -> List[Tuple[float, str]]:
+        """
+        指定地点から半径内のお店を、近い順に返す。
+
+        Args:
+            lat (float): 緯度。
+            lng (float): 経度。
+            radius_m (float): 検索半径（メートル）。
+            limit (int): 返す最大件数。
+
+        Returns:
+            List[Tuple[float, str]]: (距離(m), お店のID) のリスト。
+        """
+        # 半径をカバーするセルの範囲。経度方向のセル幅は緯度によって縮む
+        lat_cells = math.ceil(math.degrees(radius_m / EARTH_RADIUS_M) / self.CELL_DEGREES)
+        lng_degrees = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 0.01)))
+        lng_cells = math.ceil(lng_degrees / self.CELL_DEGREES)
+        center_x, center_y = self._cell_of(lat, lng)
+
+        found: List[Tuple[float, str]] = []
+        for x in range(center_x - lat_cells, center_x + lat_cells + 1):
+            for y in range(center_y - lng_cells, center_y + lng_cells + 1):
+                for shop_id in self._grid.get((x, y), ()):
+                    point = self._points[shop_id]
+                    distance = distance_m(lat, lng, point.lat, point.lng)
+                    if distance <= radius_m:
+                        found.append((distance, shop_id))
+        found.sort()
+        return found[:limit]
+
+    def locate_station(self, station_name: str) -> Optional[Tuple[float, float]]:
+        """
+        駅名に紐づくお店の位置の中心を、その駅のおおよその位置として返す。
+
+        Returns:
+            Optional[Tuple[float, float]]: (緯度, 経度)。該当するお店がなければNone。
+        """
+        shop_ids = self._stations.get(normalize_station_name(station_name))
+        if not shop_ids:
+            return None
+        points = [self._points[shop_id] for shop_id in shop_ids]
+        return (
+            sum(p.lat for p in points) / len(points),
+            sum(p.lng for p in points) / len(points),
+        )
+
+    def load_shops(self, shop_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """お店のIDから、保存済みの詳細データを取得する。"""
+        if not shop_ids:
+            return {}
+        query = self._SELECT_DATA_SQL.format(placeholders=", ".join("?" * len(shop_ids)))
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                return {shop_id: json.loads(data) for shop_id, data in conn.execute(query, shop_ids)}
+        except sqlite3.Error as e:
+            logger.error(f"お店の索引DBからの読み込みに失敗しました: {e}", exc_info=True)
+            return {}
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」に同梱した画像などの静的ファイルを管理するモジュール。
+
+ファイルは最初に使われたときに1度だけ（別スレッドで）メモリに読み込み、1度アップロードした後は
+DiscordのCDN上のURLを覚えておいて再利用します。
+"""
+
+import asyncio
+import io
+import logging
+import time
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class StaticAsset:
+    """メモリに読み込んだ1ファイル分のデータと、アップロード済みのURL。"""
+    __slots__ = ('name', 'filename', 'data', 'url', 'url_expires_at')
+
+    def __init__(self, name: str, filename: str, data: bytes):
+        self.name = name
+        self.filename = filename
+        self.data = data
+        self.url: Optional[str] = None
+        # URLの有効期限（UNIX時刻）
+        self.url_expires_at = 0.0
+
+
+class StaticAssetManager:
+    """
+    静的ファイルをメモリ上に保持し、アップロード済みのCDN URLを管理するクラス。
+
+    DiscordのCDN URLには有効期限（クエリの `ex`、16進数のUNIX時刻）が付くため、
+    期限が近づいたURLは使わず、メモリ上のデータから再アップロードさせます。
+    """
+    # 期限の何秒前からURLを使わないか
+    EXPIRY_MARGIN = 600.0
+    # `ex` が付いていないURLを使い続ける秒数
+    DEFAULT_URL_TTL = 12 * 3600.0
+
+    def __init__(self):
+        self._assets: Dict[str, StaticAsset] = {}
+        # {名前: まだ読み込んでいないファイルのパス}
+        self._paths: Dict[str, Path] = {}
+
+    def register(self, name: str, path: Path) -> None:
+        """ファイルを登録する。読み込みは最初の `load_lazily` で行う。"""
+        self._paths[name] = path
+
+    async def load_lazily(self, name: str) -> Optional[StaticAsset]:
+        """
+        登録したファイルを返す。まだ読み込んでいなければ、イベントループを止めないよう別スレッドで読み込む。
+
+        Returns:
+            Optional[StaticAsset]: 読み込んだファイル。登録されていないか、読み込めなければNone。
+        """
+        if (asset := self._assets.get(name)) is not None:
+            return asset
+        if (path := self._paths.get(name)) is None:
+            return None
+        await asyncio.to_thread(self.load, name, path)
+        return self._assets.get(name)
+
+    def load(self, name: str, path: Path) -> bool:
+        """
+        ファイルをメモリに読み込んで登録する。
+
+        Args:
+            name (str): 参照に使う名前。
+            path (Path): ファイルのパス。
+
+        Returns:
+            bool: 読み込めたか。ファイルがなければFalse。
+        """
+        try:
+            data = path.read_bytes()
+        except OSError as e:
+            logger.warning(f"静的ファイルを読み込めませんでした ({path}): {e}")
+            return False
+        self._assets[name] = StaticAsset(name, path.name, data)
+        logger.info(f"静的ファイル '{name}' ({path}, {len(data):,} bytes) をメモリに読み込みました。")
+        return True
+
+    def get(self, name: str) -> Optional[StaticAsset]:
+        return self._assets.get(name)
+
+    def open(self, name: str) -> io.BytesIO:
+        """
+        アップロード用に、メモリ上のデータを読み出すストリームを返す。
+
+        Raises:
+            KeyError: 登録されていない名前の場合。
+        """
+        return io.BytesIO(self._assets[name].data)
+
+    def cached_url(self, name: str) -> Optional[str]:
+        """アップロード済みで、まだ期限に余裕のあるURLを返す。なければNone。"""
+        asset = self._assets.get(name)
+        if asset is None or asset.url is None:
+            return None
+        if asset.url_expires_at - self.EXPIRY_MARGIN <= time.time():
+            return None
+        return asset.url
+
+    def remember_url(self, name: str, url: str) -> None:
+        """アップロードで得られたURLと、その有効期限を記録する。"""
+        asset = self._assets.get(name)
+        if asset is None:
+            return
+        asset.url = url
+        asset.url_expires_at = self._expiry_of(url)
+
+    def forget_url(self, name: str) -> None:
+        """URLが使えなかった場合に、次回は再アップロードさせる。"""
+        if (asset := self._assets.get(name)) is not None:
+            asset.url = None
+            asset.url_expires_at = 0.0
+
+    @classmethod
+    def _expiry_of(cls, url: str) -> float:
+        """CDN URLの `ex` パラメータから有効期限を求める。"""
+        expiry_hex = parse_qs(urlparse(url).query).get('ex', [None])[0]
+        if expiry_hex:
+            try:
+                return float(int(expiry_hex, 16))
+            except ValueError:
+                pass
+        return time.time() + cls.DEFAULT_URL_TTL
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」のGPU使用量クォータ管理モジュール。
+
+Ollamaが応答ごとに返すトークン数（または推論時間）をユーザー・サーバー単位で
+SQLiteに記録し、スライディングウィンドウ内の合計が予算を超えたユーザーを制限します。
+"""
+
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from utils.shared_state import enable_wal
+
+logger = logging.getLogger(__name__)
+
+
+class TokenQuotaManager:
+    """
+    ユーザー・サーバーごとのGPU使用量をSQLiteデータベースで管理するクラス。
+
+    使用量は `BUCKET_SECONDS` 秒単位のバケットに集計して保存するため、
+    1ユーザーあたりの行数はウィンドウ幅 / バケット幅 で頭打ちになります。
+    Bot再起動後も使用量は引き継がれます。
+    """
+    # 使用量を集計するバケットの幅（秒）
+    BUCKET_SECONDS = 60
+    # 課金単位として指定できる値
+    UNITS = ('tokens', 'duration')
+
+    # --- SQLクエリ定義 ---
+    _CREATE_TABLE_SQL = """
+        CREATE TABLE IF NOT EXISTS token_usage (
+            scope TEXT NOT NULL CHECK(scope IN ('user', 'guild')),
+            scope_id INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            cost INTEGER NOT NULL,
+            PRIMARY KEY (scope, scope_id, bucket)
+        )
+    """
+    _UPSERT_USAGE_SQL = """
+        INSERT INTO token_usage (scope, scope_id, bucket, cost)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(scope, scope_id, bucket) DO UPDATE SET cost = cost + excluded.cost
+    """
+    _SELECT_USAGE_SQL = """
+        SELECT bucket, cost FROM token_usage
+        WHERE scope = ? AND scope_id = ? AND bucket >= ?
+        ORDER BY bucket
+    """
+    _PURGE_SQL = "DELETE FROM token_usage WHERE bucket < ?"
+
+    def __init__(
+        self,
+        user_budget: int,
+        guild_budget: int,
+        window_seconds: int,
+        unit: str = 'tokens',
+        db_path: str = 'ai_dog_quota.sqlite3',
+        init_db: bool = True
+    ):
+        """
+        TokenQuotaManagerを初期化します。
+
+        Args:
+            user_budget (int): ウィンドウ内に1ユーザーが消費できる量。0で無効。
+            guild_budget (int): ウィンドウ内に1サーバーが消費できる量。0で無効。
+            window_seconds (int): 予算を計算するスライディングウィンドウの幅（秒）。
+            unit (str): 課金単位。'tokens'（トークン数）または 'duration'（推論時間ms）。
+            db_path (str): SQLiteデータベースファイルのパス。
+            init_db (bool): Falseの場合はDBを初期化せず、後で `initialize` を呼び出す。
+        """
+        self.user_budget = user_budget
+        self.guild_budget = guild_budget
+        self.window_seconds = window_seconds
+        self.unit = unit if unit in self.UNITS else 'tokens'
+        self.db_path = db_path
+        self._last_purge_bucket = 0
+        if init_db:
+            self._init_db()
+
+    def initialize(self) -> None:
+        """DBを初期化する。起動時にワーカースレッドから呼び出してもよい。"""
+        self._init_db()
+
+    def _init_db(self) -> None:
+        """データベースファイルとテーブルが存在しない場合に初期化する。"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                enable_wal(conn)
+                conn.execute(self._CREATE_TABLE_SQL)
+                conn.commit()
+            logger.info(f"クォータDB '{self.db_path}' の準備が完了しました。")
+        except sqlite3.Error as e:
+            logger.critical(f"クォータDBの初期化に失敗しました: {e}", exc_info=True)
+            raise
+
+    @property
+    def enabled(self) -> bool:
+        """ユーザー・サーバーいずれかの予算が設定されているか。"""
+        return self.user_budget > 0 or self.guild_budget > 0
+
+    def reconfigure(self, user_budget: int, guild_budget: int, window_seconds: int, unit: str) -> None:
+        """記録済みの使用量を保持したまま、予算とウィンドウ幅を変更する。"""
+        self.user_budget = user_budget
+        self.guild_budget = guild_budget
+        self.window_seconds = window_seconds
+        self.unit = unit if unit in self.UNITS else 'tokens'
+
+    def cost_from_response(self, response_data: Dict[str, Any]) -> int:
+        """
+        Ollamaの応答データから、今回のリクエストで消費した量を算出する。
+
+        Args:
+            response_data (Dict[str, Any]): `/api/generate` の応答JSON。
+
+        Returns:
+            int: 'tokens' ならプロンプト+生成トークン数、'duration' なら推論時間(ms)。
+        """
+        if self.unit == 'duration':
+            # Ollamaの*_durationはナノ秒単位
+            nanoseconds = (response_data.get('prompt_eval_duration') or 0) + (response_data.get('eval_duration') or 0)
+            return int(nanoseconds // 1_000_000)
+        return int((response_data.get('prompt_eval_count') or 0) + (response_data.get('eval_count') or 0))
+
+    def _current_bucket(self, now: float) -> int:
+        return int(now // self.BUCKET_SECONDS)
+
+    def _window_start_bucket(self, now: float) -> int:
+        return self._current_bucket(now - self.window_seconds) + 1
+
+    def _fetch_usage(self, conn: sqlite3.Connection, scope: str, scope_id: int, now: float) -> list:
+        return conn.execute(self._SELECT_USAGE_SQL, (scope, scope_id, self._window_start_bucket(now))).fetchall()
+
+    def _seconds_until_under_budget(self, rows: list, budget: int, now: float) -> int:
+        """古いバケットから順にウィンドウ外へ出たとして、予算内に戻るまでの秒数を求める。"""
+        used = sum(cost for _, cost in rows)
+        for bucket, cost in rows:
+            used -= cost
+            if used < budget:
+                # このバケットがウィンドウから外れる時刻（_window_start_bucket が bucket を超える時刻）
+                expires_at = bucket * self.BUCKET_SECONDS + self.window_seconds
+                return max(1, int(expires_at - now) + 1)
+        return self.window_seconds
+
+    def check_budget(self, user_id: int, guild_id: Optional[int] = None) -> Tuple[bool, int]:
+        """
+        ユーザー（およびサーバー）が予算を使い切っているかを確認します。
+
+        Args:
+            user_id (int): DiscordユーザーのID。
+            guild_id (Optional[int]): サーバーのID。DMの場合はNone。
+
+        Returns:
+            Tuple[bool, int]: (予算超過しているか, 予算内に戻るまでの待機時間(秒))
+        """
+        if not self.enabled:
+            return False, 0
+
+        now = time.time()
+        wait_time = 0
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                targets = []
+                if self.user_budget > 0:
+                    targets.append(('user', user_id, self.user_budget))
+                if guild_id is not None and self.guild_budget > 0:
+                    targets.append(('guild', guild_id, self.guild_budget))
+
+                for scope, scope_id, budget in targets:
+                    rows = self._fetch_usage(conn, scope, scope_id, now)
+                    if sum(cost for _, cost in rows) >= budget:
+                        wait_time = max(wait_time, self._seconds_until_under_budget(rows, budget, now))
+        except sqlite3.Error as e:
+            # クォータDBの障害で会話機能全体を止めないよう、制限なしとして扱う
+            logger.error(f"クォータの確認中にDBエラーが発生しました (User: {user_id}): {e}", exc_info=True)
+            return False, 0
+
+        return wait_time > 0, wait_time
+
+    def charge(self, user_id: int, guild_id: Optional[int], cost: int) -> None:
+        """
+        今回のリクエストで消費した量を、ユーザーとサーバーに計上する。
+
+        Args:
+            user_id (int): DiscordユーザーのID。
+            guild_id (Optional[int]): サーバーのID。DMの場合はNone。
+            cost (int): 消費量（`cost_from_response` の戻り値）。
+        """
+        if not self.enabled or cost <= 0:
+            return
+
+        now = time.time()
+        bucket = self._current_bucket(now)
+        rows = [('user', user_id, bucket, cost)]
+        if guild_id is not None:
+            rows.append(('guild', guild_id, bucket, cost))
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(self._UPSERT_USAGE_SQL, rows)
+                # ウィンドウ外の古いバケットは、バケットが切り替わるたびに掃除する
+                if bucket != self._last_purge_bucket:
+                    conn.execute(self._PURGE_SQL, (self._window_start_bucket(now),))
+                    self._last_purge_bucket = bucket
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.error(f"使用量のDB記録に失敗しました (User: {user_id}): {e}", exc_info=True)
+
+    def get_remaining(self, user_id: int, guild_id: Optional[int] = None) -> Dict[str, Dict[str, int]]:
+        """
+        ユーザー（およびサーバー）の予算の残量を取得する。
+
+        Args:
+            user_id (int): DiscordユーザーのID。
+            guild_id (Optional[int]): サーバーのID。DMの場合はNone。
+
+        Returns:
+            Dict[str, Dict[str, int]]: {'user'|'guild': {'budget', 'used', 'remaining', 'reset_in'}}
+                予算が無効な段階は含まれない。
+        """
+        now = time.time()
+        result: Dict[str, Dict[str, int]] = {}
+        targets = []
+        if self.user_budget > 0:
+            targets.append(('user', user_id, self.user_budget))
+        if guild_id is not None and self.guild_budget > 0:
+            targets.append(('guild', guild_id, self.guild_budget))
+
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                for scope, scope_id, budget in targets:
+                    rows = self._fetch_usage(conn, scope, scope_id, now)
+                    used = sum(cost for _, cost in rows)
+                    result[scope] = {
+                        'budget': budget,
+                        'used': used,
+                        'remaining': max(0, budget - used),
+                        'reset_in': self._seconds_until_under_budget(rows, budget, now) if used >= budget else 0,
+                    }
+        except sqlite3.Error as e:
+            logger.error(f"クォータ残量の取得中にDBエラーが発生しました (User: {user_id}): {e}", exc_info=True)
+
+        return result
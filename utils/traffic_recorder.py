@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」が受け取ったイベント（メッセージとボタン・モーダルの操作）を記録するモジュール。
+
+記録は `benchmarks/replay_traffic.py` で再生し、実際のピーク時と同じ種類・間隔の
+負荷をオフラインで再現するために使います。個人を特定できる情報は残さず、
+IDは記録ごとに異なる鍵でハッシュ化し、本文は文字の種類と長さだけを残して置き換えます。
+コマンド名と、ボタンの表示名（「▶️ 次へ」など）はBot側の文字列のため、そのまま残します。
+
+記録は1行1JSONをgzipで圧縮したファイルに、専用のスレッドから書き込みます。
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RECORD_VERSION = 1
+# この件数ごとに圧縮データをファイルに書き出す（途中で止まっても失う記録を抑える）
+FLUSH_EVERY = 100
+# 本文中のメンション (<@123>, <@!123>, <@&123>, <#123>)
+MENTION_PATTERN = re.compile(r'<(@[!&]?|#)(\d+)>')
+
+_STOP = object()
+
+
+def mask_text(text: str) -> str:
+    """
+    文字の種類と長さだけを残して本文を置き換える。
+
+    空白と改行はそのまま残し、英字は "a"、数字は "0"、それ以外（かな・漢字・記号など）は "あ" にする。
+    """
+    return "".join(
+        char if char.isspace()
+        else "0" if char.isdigit()
+        else "a" if char.isascii() and char.isalpha()
+        else "あ"
+        for char in text
+    )
+
+
+class TrafficRecorder:
+    """
+    受け取ったイベントを匿名化して記録するクラス。
+
+    記録は `start` で開始し、`close` で残りを書き出して終了します。
+    記録する側（イベントループ）はキューに積むだけで、圧縮と書き込みは専用のスレッドで行います。
+    """
+
+    def __init__(self, directory: str, command_prefix: str, is_command: Callable[[str], bool], label: str = ""):
+        """
+        TrafficRecorderを初期化します。
+
+        Args:
+            directory (str): 記録ファイルを置くディレクトリ。起動ごとに新しいファイルを作る。
+            command_prefix (str): コマンドの接頭辞。
+            is_command (Callable[[str], bool]): 文字列がBotのコマンド名（別名を含む）かを返す関数。
+                コマンド名でない文字列は、本文と同じく置き換える。
+            label (str): ファイル名に加える識別子（担当シャードなど）。
+                同じディレクトリに複数のプロセスが記録しても別のファイルになるよう、プロセスIDも加える。
+        """
+        name_parts = [f"traffic_{datetime.now():%Y%m%d_%H%M%S}", label, f"pid{os.getpid()}"]
+        self.path = Path(directory) / f"{'_'.join(part for part in name_parts if part)}.jsonl.gz"
+        self.command_prefix = command_prefix
+        self.is_command = is_command
+        # IDのハッシュ化に使う鍵。記録ごとに作り直すため、別の記録とは照合できない
+        self._key = secrets.token_bytes(16)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._started = time.monotonic()
+        self.recorded = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """書き込み用のスレッドを開始する。"""
+        if self.running:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._started = time.monotonic()
+        self._queue.put({
+            'version': RECORD_VERSION,
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'command_prefix': self.command_prefix,
+        })
+        self._thread = threading.Thread(target=self._write, name="traffic-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"トラフィックの記録を開始しました: {self.path}")
+
+    def close(self) -> None:
+        """キューに残った記録を書き出し、書き込み用のスレッドを止める。ワーカースレッドから呼び出してもよい。"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logger.info(f"トラフィックの記録を終了しました ({self.recorded:,}件): {self.path}")
+
+    def _write(self) -> None:
+        """書き込み用のスレッド。キューから取り出した記録を圧縮して書き込む。"""
+        try:
+            # 既存の記録を上書きしないよう、新しいファイルとしてだけ開く
+            with gzip.open(self.path, 'xt', encoding='utf-8') as f:
+                pending = 0
+                while (entry := self._queue.get()) is not _STOP:
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + "\n")
+                    pending += 1
+                    if pending >= FLUSH_EVERY:
+                        f.flush()
+                        pending = 0
+        except OSError as e:
+            logger.error(f"トラフィックの記録を書き込めませんでした: {e}")
+
+    # --- 匿名化 ---
+    def anonymize_id(self, value: Optional[int]) -> Optional[int]:
+        """IDを、この記録の中でだけ一貫する別の数値に置き換える。"""
+        if value is None:
+            return None
+        digest = hmac.new(self._key, str(value).encode(), hashlib.sha256).digest()
+        # JSONで扱いやすいよう、48ビットに収める
+        return int.from_bytes(digest[:6], 'big')
+
+    def _mask_content(self, content: str, bot_id: Optional[int]) -> str:
+        """メンションを残して（Bot宛ては <@BOT>、それ以外は <@USER> など）、本文を置き換える。"""
+        parts: List[str] = []
+        position = 0
+        for match in MENTION_PATTERN.finditer(content):
+            parts.append(mask_text(content[position:match.start()]))
+            kind, target = match.groups()
+            if kind.startswith('@') and bot_id is not None and int(target) == bot_id:
+                parts.append("<@BOT>")
+            else:
+                parts.append({'@&': "<@&ROLE>", '#': "<#CHANNEL>"}.get(kind, "<@USER>"))
+            position = match.end()
+        parts.append(mask_text(content[position:]))
+        return "".join(parts)
+
+    # --- 記録 ---
+    def _record(self, entry: Dict[str, Any]) -> None:
+        entry['t'] = round(time.monotonic() - self._started, 3)
+        self._queue.put(entry)
+        self.recorded += 1
+
+    def record_message(self, message: Any, bot_id: Optional[int]) -> None:
+        """
+        受け取ったメッセージを記録する。
+
+        Args:
+            message (nextcord.Message): 受け取ったメッセージ。
+            bot_id (Optional[int]): BotのユーザーID。Bot宛てのメンションを区別するために使う。
+        """
+        if not self.running:
+            return
+        content = message.content
+        entry: Dict[str, Any] = {
+            'type': 'message',
+            'user': self.anonymize_id(message.author.id),
+            'guild': self.anonymize_id(message.guild.id) if message.guild else None,
+            'channel': self.anonymize_id(message.channel.id),
+            'attachments': len(message.attachments),
+        }
+        if content.startswith(self.command_prefix):
+            # コマンド名は残し、引数だけを置き換える
+            name, separator, arguments = content[len(self.command_prefix):].partition(" ")
+            entry['kind'] = 'command'
+            if self.is_command(name):
+                entry['command'] = name
+            else:
+                name = mask_text(name)
+            entry['content'] = self.command_prefix + name + separator + self._mask_content(arguments, bot_id)
+        else:
+            mentioned = bot_id is not None and any(user.id == bot_id for user in message.mentions)
+            entry['kind'] = 'mention' if mentioned else 'message'
+            entry['content'] = self._mask_content(content, bot_id)
+        self._record(entry)
+
+    def record_interaction(self, interaction: Any) -> None:
+        """
+        ボタンの操作とモーダルの送信を記録する。
+
+        ボタンは表示名で記録し、再生時には同じチャンネルに直前に送られた、
+        同じ表示名のボタンを押したものとして扱う。
+        """
+        if not self.running:
+            return
+        data = interaction.data or {}
+        entry: Dict[str, Any] = {
+            'type': 'interaction',
+            'user': self.anonymize_id(interaction.user.id if interaction.user else None),
+            'guild': self.anonymize_id(interaction.guild_id),
+            'channel': self.anonymize_id(interaction.channel_id),
+        }
+        if 'custom_id' in data and 'components' not in data:
+            entry['kind'] = 'component'
+            entry['label'] = self._component_label(interaction, data['custom_id'])
+        elif 'components' in data:
+            entry['kind'] = 'modal'
+            entry['values'] = [
+                mask_text(component.get('value', ''))
+                for row in data['components'] for component in row.get('components', [])
+            ]
+        else:
+            entry['kind'] = 'command'
+            entry['command'] = data.get('name')
+        self._record(entry)
+
+    @staticmethod
+    def _component_label(interaction: Any, custom_id: str) -> Optional[str]:
+        """押されたボタンの表示名を、操作されたメッセージのコンポーネントから探す。"""
+        message = getattr(interaction, 'message', None)
+        for row in getattr(message, 'components', None) or []:
+            for component in getattr(row, 'children', []):
+                if getattr(component, 'custom_id', None) == custom_id:
+                    return getattr(component, 'label', None)
+        return None
+
+    def describe(self) -> str:
+        """統計表示用に、記録件数と記録先を整形した文字列を返す。"""
+        return f"{self.recorded:,}件 → {self.path.name}"
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    """
+    記録ファイルを読み込み、イベントを時刻順に返す（先頭のヘッダー行は除く）。
+
+    Raises:
+        ValueError: 対応していない形式の記録の場合。
+    """
+    events: List[Dict[str, Any]] = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                entry = json.loads(line)
+                if 'version' in entry:
+                    if entry['version'] != RECORD_VERSION:
+                        raise ValueError(f"対応していない記録の形式です (version {entry['version']})")
+                    continue
+                events.append(entry)
+        except (EOFError, json.JSONDecodeError):
+            # Botが強制終了した記録は末尾が欠けているため、読めたところまでを使う
+            logger.warning(f"記録 {path} の末尾が欠けているため、読めた {len(events)} 件を使います。")
+    events.sort(key=lambda entry: entry['t'])
+    return events
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Discord Bot「AI犬」の応答生成ワーカー。
+
+ゲートウェイ（`bot_main.py`、JOB_QUEUE_ENABLED=true）がジョブキューに積んだ
+会話の生成依頼を取り出し、会話履歴から文脈を組み立ててOllamaに問い合わせ、
+結果をキューに書き戻します。ゲートウェイとは独立して台数を増減できます。
+
+使い方:
+    python worker.py [--processes 2]
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from typing import Any, Dict, Set
+
+from config import BotConfig, load_and_validate_config
+from utils.conversation_manager import ConversationManager
+from utils.fast_runtime import install_event_loop, load_json_codec
+from utils.generation import OllamaGenerator
+from utils.http_client import HTTPClient
+from utils.job_queue import Job, JobQueue
+from utils.logging_setup import setup_logging, setup_logging_from_config
+from utils.token_quota import TokenQuotaManager
+
+logger = logging.getLogger("worker")
+
+# --- 定数定義 ---
+WORKER_LOG_FILE = "ai_dog_worker.log"
+# キューが空のときに次の確認まで待つ秒数
+IDLE_POLL_SECONDS = 0.5
+# 取り出し回数の上限に達したジョブに書き込む結果
+ABANDONED_RESULT: Dict[str, Any] = {
+    "reply": "ごめんね、何度考えてもうまくまとまらなかったワン…。もう一度話しかけてみてね！",
+    "success": False,
+    "response_time": 0.0,
+}
+
+
+class GenerationWorker:
+    """ジョブキューから依頼を取り出し、同時に `worker_concurrency` 件まで生成する。"""
+
+    def __init__(self, config: BotConfig, worker_id: str):
+        self.config = config
+        self.worker_id = worker_id
+        self.queue = JobQueue(
+            config.job_queue_db_path, lease_seconds=config.job_lease_seconds,
+            max_attempts=config.job_max_attempts, init_db=False
+        )
+        self.http_client = HTTPClient(
+            default_timeout=config.request_timeout,
+            limit_per_host=config.http_limit_per_host,
+            max_retries=config.http_max_retries,
+            host_timeouts=config.http_host_timeouts,
+            json_codec=load_json_codec(config.accelerated_runtime)
+        )
+        self.conversation_manager = ConversationManager(
+            config.max_conversation_history, db_path=config.conversation_db_path, init_db=False
+        )
+        self.token_quota = TokenQuotaManager(
+            config.token_quota_user_budget, config.token_quota_guild_budget,
+            config.token_quota_window, unit=config.token_quota_unit, db_path=config.quota_db_path, init_db=False
+        )
+        self.generator = OllamaGenerator(config, self.http_client, self.conversation_manager, self.token_quota)
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """終了の指示があるまでジョブを処理し、処理中のジョブが終わってから戻る。"""
+        await asyncio.gather(
+            asyncio.to_thread(self.queue.initialize),
+            asyncio.to_thread(self.conversation_manager.initialize),
+            asyncio.to_thread(self.token_quota.initialize),
+            self.http_client.start(),
+        )
+        logger.info(f"ワーカー {self.worker_id} を開始しました (同時実行数: {self.config.worker_concurrency})")
+
+        running: Set[asyncio.Task] = set()
+        try:
+            while not self._stopping.is_set():
+                if len(running) >= self.config.worker_concurrency:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                try:
+                    job = await asyncio.to_thread(self.queue.lease, self.worker_id, ABANDONED_RESULT)
+                except Exception as e:
+                    logger.error(f"ジョブの取り出しに失敗しました: {e}", exc_info=True)
+                    job = None
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self._stopping.wait(), timeout=IDLE_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                task = asyncio.create_task(self._process(job))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        finally:
+            if running:
+                logger.info(f"処理中の {len(running)} 件のジョブが終わるのを待っています...")
+                await asyncio.gather(*running, return_exceptions=True)
+            await self.http_client.close()
+            logger.info(f"ワーカー {self.worker_id} を停止しました。")
+
+    async def _keep_lease(self, job: Job) -> None:
+        """生成が終わるまで、リースの期限を定期的に延ばす。"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                extended = await asyncio.to_thread(self.queue.extend_lease, job.job_id, self.worker_id)
+            except Exception as e:
+                logger.error(f"ジョブ {job.job_id} のリースの延長に失敗しました: {e}")
+                continue
+            if not extended:
+                logger.warning(f"ジョブ {job.job_id} のリースが他のワーカーに移りました。")
+                return
+
+    async def _process(self, job: Job) -> None:
+        payload = job.payload
+        keeper = asyncio.create_task(self._keep_lease(job))
+        try:
+            reply_text, success, response_time = await self.generator.generate(
+                payload["question"], payload["user_id"], payload.get("guild_id")
+            )
+        finally:
+            keeper.cancel()
+
+        if success:
+            # 文脈は会話履歴DBを通じて、次の依頼を処理するワーカーにも共有される
+            await asyncio.to_thread(
+                self.conversation_manager.add_message, payload["user_id"], payload["question"], reply_text
+            )
+        result = {"reply": reply_text, "success": success, "response_time": response_time}
+        try:
+            if not await asyncio.to_thread(self.queue.complete, job.job_id, self.worker_id, result):
+                logger.warning(f"ジョブ {job.job_id} はリースが切れていたため、結果を書き込みませんでした。")
+        except Exception as e:
+            # 結果を書き込めなかったジョブは、リースの期限切れ後に再配布される
+            logger.error(f"ジョブ {job.job_id} の結果の書き込みに失敗しました: {e}", exc_info=True)
+
+
+def run_worker(index: int, log_file: str) -> None:
+    """1つのワーカープロセスを実行する。"""
+    setup_logging(log_file)
+    config = load_and_validate_config()
+    # ローテーションがぶつからないよう、ワーカープロセスごとに別のファイルに書き込む
+    setup_logging_from_config(config, log_file=log_file)
+    worker = GenerationWorker(config, f"{socket.gethostname()}:{os.getpid()}:{index}")
+    install_event_loop(config.accelerated_runtime)
+
+    async def main() -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, worker.stop)
+        except (NotImplementedError, RuntimeError):
+            # Windowsではシグナルハンドラを登録できないため、Ctrl+Cでの停止に任せる
+            pass
+        await worker.run()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    """指定された数のワーカープロセスを起動し、すべてが終了するまで待つ。"""
+    parser = argparse.ArgumentParser(description="AI犬の応答生成ワーカーを起動します。")
+    parser.add_argument("--processes", type=int, default=1, help="起動するワーカープロセス数 (既定: 1)")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(0, WORKER_LOG_FILE)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=run_worker, args=(index, WORKER_LOG_FILE.replace(".log", f"-{index}.log")), name=f"worker-{index}"
+        )
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == '__main__':
+    main()